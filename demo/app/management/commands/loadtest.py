@@ -0,0 +1,290 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+
+from mizdb_watchlist.manager import WATCHLIST_SESSION_KEY, SessionModelManager, _get_manager_class
+from mizdb_watchlist.models import SessionWatchlist, Watchlist
+
+from ...models import Company, Person
+
+USERNAME_PREFIX = "loadtest-"
+
+# The steps of the scenario and how often they are picked relative to each other.
+STEPS = {"browse": 4, "toggle": 4, "overview": 2, "bulk_add": 1}
+
+# The number of companies added with each bulk_add step.
+BULK_SIZE = 5
+
+
+def _percentile(values, percent):
+    """Return the given percentile of the sorted values (nearest rank)."""
+    index = max(0, int(round(percent / 100 * len(values))) - 1)
+    return values[index]
+
+
+class Tab(threading.Thread):
+    """
+    A browser tab of a virtual user that runs random steps of the scenario.
+
+    Every tab toggles its own share of the persons, so that the state the tab
+    expects for these persons is well-defined: it is the state confirmed by
+    the last toggle response. The companies are shared by the tabs of a user
+    and are only ever added (with the admin action).
+    """
+
+    def __init__(self, client, persons, companies, staff, iterations, seed, barrier):
+        super().__init__()
+        self.client = client
+        self.persons = persons
+        self.companies = companies
+        self.staff = staff
+        self.iterations = iterations
+        self.random = random.Random(seed)
+        self.barrier = barrier
+        # The expected watchlist state of the persons toggled by this tab.
+        self.expected = {}
+        # The companies that were added with the admin action.
+        self.added = set()
+        self.timings = defaultdict(list)
+        self.errors = Counter()
+
+    def run(self):
+        steps, weights = list(STEPS), list(STEPS.values())
+        try:
+            self.barrier.wait()
+            for _ in range(self.iterations):
+                step = self.random.choices(steps, weights)[0]
+                if step == "bulk_add" and not self.staff:
+                    # Anonymous users cannot use the admin.
+                    step = "browse"
+                start = time.perf_counter()
+                try:
+                    getattr(self, step)()
+                except Exception as e:
+                    self.errors[f"{step}: {type(e).__name__}: {e}"] += 1
+                else:
+                    self.timings[step].append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+
+    def _check(self, response, *status_codes):
+        if response.status_code not in status_codes:
+            raise AssertionError(f"status code {response.status_code}")
+        return response
+
+    def browse(self):
+        self._check(self.client.get("/"), 200)
+
+    def overview(self):
+        self._check(self.client.get("/watchlist/"), 200)
+
+    def toggle(self):
+        pk = self.random.choice(self.persons)
+        requested = not self.expected.get(pk, False)
+        data = {"object_id": pk, "model_label": "app.person", "on_watchlist": "true" if requested else "false"}
+        response = self._check(self.client.post("/mizdb_watchlist/toggle/", data), 200)
+        self.expected[pk] = json.loads(response.content)["on_watchlist"]
+
+    def bulk_add(self):
+        selected = self.random.sample(self.companies, BULK_SIZE)
+        data = {"action": "add_to_watchlist", "_selected_action": selected}
+        self._check(self.client.post("/admin/app/company/", data), 302)
+        self.added.update(selected)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent virtual users against the demo project and report the "
+        "throughput, latencies, lost updates and duplicate watchlist rows. Each "
+        "user runs several tabs (threads) at the same time, which browse the "
+        "changelist, toggle persons, open the watchlist overview and add "
+        "companies with the admin action. The requests are handled in-process "
+        "with Django's test client. The users and sessions created for the test "
+        "are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=4, help="number of authenticated users (default: 4)")
+        parser.add_argument("--anonymous", type=int, default=4, help="number of anonymous users (default: 4)")
+        parser.add_argument("--tabs", type=int, default=2, help="number of concurrent tabs per user (default: 2)")
+        parser.add_argument("--iterations", type=int, default=100, help="number of steps per tab (default: 100)")
+        parser.add_argument("--seed", type=int, default=0, help="seed for the random steps (default: 0)")
+
+    def handle(self, **options):
+        persons = list(Person.objects.values_list("pk", flat=True))
+        companies = list(Company.objects.values_list("pk", flat=True))
+        if len(persons) < options["tabs"] or len(companies) < BULK_SIZE:
+            raise CommandError("Not enough persons or companies. Did you run the migrations of the demo?")
+
+        users = self._create_users(options["users"])
+        tabs = []
+        barrier = threading.Barrier(options["tabs"] * (options["users"] + options["anonymous"]))
+        seed = options["seed"]
+        for user in [*users, *[None] * options["anonymous"]]:
+            clients = self._get_clients(user, options["tabs"])
+            for i, client in enumerate(clients):
+                seed += 1
+                tabs.append(
+                    Tab(
+                        client,
+                        # Every tab toggles its own share of the persons:
+                        persons[i :: options["tabs"]],
+                        companies,
+                        staff=user is not None,
+                        iterations=options["iterations"],
+                        seed=seed,
+                        barrier=barrier,
+                    )
+                )
+
+        start = time.perf_counter()
+        for tab in tabs:
+            tab.start()
+        for tab in tabs:
+            tab.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            self._report(options, tabs, users, elapsed)
+        finally:
+            self._cleanup(users, tabs)
+
+    def _create_users(self, count):
+        user_model = get_user_model()
+        user_model.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        return [
+            user_model.objects.create_superuser(username=f"{USERNAME_PREFIX}{i}", password=None) for i in range(count)
+        ]
+
+    def _get_clients(self, user, count):
+        """
+        Return the clients of the tabs of the given user. The tabs of an
+        anonymous user share one session.
+        """
+        clients = [Client(SERVER_NAME="localhost") for _ in range(count)]
+        if user is not None:
+            for client in clients:
+                client.force_login(user)
+        else:
+            session = import_module(settings.SESSION_ENGINE).SessionStore()
+            session.create()
+            for client in clients:
+                client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        return clients
+
+    def _get_session_watchlist(self, session_key, content_type):
+        """
+        Return the pks of the items of the given content type on the watchlist
+        of the session.
+
+        With SessionModelManager, the items are stored in the SessionWatchlist
+        table instead of in the session data.
+        """
+        if issubclass(_get_manager_class(None), SessionModelManager):
+            items = SessionWatchlist.objects.filter(session_key=session_key, content_type=content_type)
+            return set(items.values_list("object_id", flat=True))
+        session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+        items = session.get(WATCHLIST_SESSION_KEY, {}).get(f"{content_type.app_label}.{content_type.model}", [])
+        return {item["object_id"] if isinstance(item, dict) else item for item in items}
+
+    def _count_lost_updates(self, tabs, users):
+        """
+        Return the number of items, per user type, whose stored state differs
+        from the state confirmed to the tabs.
+        """
+        person_ct = ContentType.objects.get_for_model(Person)
+        company_ct = ContentType.objects.get_for_model(Company)
+        lost = Counter(authenticated=0, anonymous=0)
+        tabs_by_owner = defaultdict(list)
+        for tab in tabs:
+            if tab.staff:
+                owner = int(tab.client.session["_auth_user_id"])
+            else:
+                owner = tab.client.cookies[settings.SESSION_COOKIE_NAME].value
+            tabs_by_owner[owner].append(tab)
+        user_pks = {user.pk for user in users}
+        for owner, owner_tabs in tabs_by_owner.items():
+            user_type = "authenticated" if owner in user_pks else "anonymous"
+            if owner in user_pks:
+                items = Watchlist.objects.filter(user_id=owner)
+                persons = set(items.filter(content_type=person_ct).values_list("object_id", flat=True))
+                companies = set(items.filter(content_type=company_ct).values_list("object_id", flat=True))
+            else:
+                persons = self._get_session_watchlist(owner, person_ct)
+                companies = set()
+            for tab in owner_tabs:
+                lost[user_type] += sum(expected != (pk in persons) for pk, expected in tab.expected.items())
+            lost[user_type] += len(set().union(*(tab.added for tab in owner_tabs)) - companies)
+        return lost
+
+    def _count_duplicates(self, users):
+        """Return the number of duplicate watchlist rows of the given users."""
+        duplicates = (
+            Watchlist.objects.filter(user__in=users)
+            .values("user", "content_type", "object_id")
+            .annotate(rows=Count("pk"))
+            .filter(rows__gt=1)
+        )
+        return sum(row["rows"] - 1 for row in duplicates)
+
+    def _report(self, options, tabs, users, elapsed):
+        timings = defaultdict(list)
+        errors = Counter()
+        for tab in tabs:
+            for step, values in tab.timings.items():
+                timings[step].extend(values)
+            errors.update(tab.errors)
+        requests = sum(len(values) for values in timings.values()) + sum(errors.values())
+
+        self.stdout.write(
+            f"{options['users']} authenticated and {options['anonymous']} anonymous user(s) with "
+            f"{options['tabs']} tab(s) each, {options['iterations']} steps per tab"
+        )
+        self.stdout.write(f"{requests} requests in {elapsed:.2f} s: {requests / elapsed:.1f} requests/s\n\n")
+        self.stdout.write(
+            f"{'step':<10} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for step in STEPS:
+            values = sorted(timings[step])
+            step_errors = sum(count for error, count in errors.items() if error.startswith(f"{step}:"))
+            if not values:
+                self.stdout.write(f"{step:<10} {0:>8} {step_errors:>6}")
+                continue
+            p50, p90, p99 = (_percentile(values, p) * 1000 for p in (50, 90, 99))
+            self.stdout.write(
+                f"{step:<10} {len(values) + step_errors:>8} {step_errors:>6} "
+                f"{p50:>8.1f} {p90:>8.1f} {p99:>8.1f} {values[-1] * 1000:>8.1f}"
+            )
+        if errors:
+            self.stdout.write("\nErrors:")
+            for error, count in errors.most_common():
+                self.stdout.write(f"  {count:>5}x {error}")
+        self.stdout.write("")
+        lost = self._count_lost_updates(tabs, users)
+        self.stdout.write(
+            f"Lost updates: {sum(lost.values())} ({lost['authenticated']} authenticated, {lost['anonymous']} anonymous)"
+        )
+        self.stdout.write(f"Duplicate rows: {self._count_duplicates(users)}")
+
+    def _cleanup(self, users, tabs):
+        session_keys = {
+            tab.client.cookies[settings.SESSION_COOKIE_NAME].value
+            for tab in tabs
+            if settings.SESSION_COOKIE_NAME in tab.client.cookies
+        }
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        for session_key in session_keys:
+            store_class(session_key).delete()
+        for user in users:
+            user.delete()
@@ -0,0 +1,272 @@
+import random
+import time
+from bisect import bisect_left
+from datetime import timedelta
+from importlib import import_module
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mizdb_watchlist.manager import (
+    WATCHLIST_SESSION_KEY,
+    CompactSessionManager,
+    SessionModelManager,
+    _get_manager_class,
+)
+from mizdb_watchlist.models import SessionWatchlist, Watchlist
+
+from ...models import Company, Person
+
+USERNAME_PREFIX = "seed-"
+# Session keys may only contain lowercase letters and digits.
+SESSION_KEY_PREFIX = "seed"
+SESSION_KEY_CHARS = "abcdefghijklmnopqrstuvwxyz0123456789"
+PERSON_PREFIX = "Seed "
+COMPANY_PREFIX = "Seed Company "
+
+FIRST_NAMES = ["Alice", "Bob", "Carol", "Dave", "Erin", "Frank", "Grace", "Heidi", "Ivan", "Judy", "Mallory", "Oscar"]
+
+
+def _chunked(iterable, size):
+    """Yield lists of at most `size` items of the iterable."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Popularity:
+    """
+    Draw distinct objects of a model, with the popularity of the objects
+    following Zipf's law: the i-th object is drawn with a weight of 1/i.
+    """
+
+    def __init__(self, objects):
+        # objects: a list of (pk, object_repr) tuples
+        self.objects = objects
+        self.cum_weights = list(accumulate(1 / i for i in range(1, len(objects) + 1)))
+
+    def sample(self, rng, k):
+        """Return k distinct objects."""
+        k = min(k, len(self.objects))
+        if k > len(self.objects) // 2:
+            # Most of the objects are drawn anyway.
+            return rng.sample(self.objects, k)
+        total = self.cum_weights[-1]
+        indexes = {}
+        # Drawing by weight takes longer and longer to find objects that have
+        # not been drawn yet; draw the remainder uniformly.
+        for _ in range(2 * k):
+            indexes.setdefault(bisect_left(self.cum_weights, rng.random() * total), None)
+            if len(indexes) == k:
+                break
+        while len(indexes) < k:
+            indexes.setdefault(rng.randrange(len(self.objects)), None)
+        return [self.objects[i] for i in indexes]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the demo database with a large synthetic dataset: users, persons "
+        "and companies, Watchlist rows for the users and watchlists for "
+        "anonymous sessions. The watchlist sizes are exponentially distributed "
+        "around --items, with a fraction of power users that watch around "
+        "--power-items objects; popular objects are watched more often. The "
+        "sessions store their watchlists in the form of the configured session "
+        "manager. The data of a previous run is removed first, so the same seed "
+        "produces the same dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000, help="number of users (default: 1000)")
+        parser.add_argument("--sessions", type=int, default=1_000, help="number of anonymous sessions (default: 1000)")
+        parser.add_argument(
+            "--objects", type=int, default=10_000, help="number of persons and of companies (default: 10000)"
+        )
+        parser.add_argument("--items", type=int, default=50, help="mean watchlist size (default: 50)")
+        parser.add_argument("--power-users", type=float, default=0.01, help="fraction of power users (default: 0.01)")
+        parser.add_argument(
+            "--power-items", type=int, default=2_000, help="mean watchlist size of power users (default: 2000)"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="seed for the random generator (default: 0)")
+        parser.add_argument(
+            "--chunk-size", type=int, default=10_000, help="number of rows per bulk_create (default: 10000)"
+        )
+        parser.add_argument("--clear", action="store_true", help="only remove the data of a previous run")
+
+    def handle(self, **options):
+        start = time.perf_counter()
+        self.chunk_size = options["chunk_size"]
+        with transaction.atomic():
+            self._clear()
+            if options["clear"]:
+                return
+            rng = random.Random(options["seed"])
+            persons = self._create_persons(rng, options["objects"])
+            companies = self._create_companies(options["objects"])
+            users = self._create_users(options["users"])
+            watchlists = self._generate_watchlists(
+                rng, options, len(users) + options["sessions"], {Person: persons, Company: companies}
+            )
+            rows = self._create_watchlist_rows(users, watchlists)
+            session_rows = self._create_sessions(rng, options["sessions"], watchlists)
+        self.stdout.write(
+            f"Created {len(users)} users, {len(persons)} persons, {len(companies)} companies, "
+            f"{rows} watchlist rows and {options['sessions']} sessions with {session_rows} watchlist items "
+            f"in {time.perf_counter() - start:.1f} s."
+        )
+
+    def _bulk_create(self, model, objs):
+        """Create the objects in chunks and return the number of objects created."""
+        count = 0
+        for chunk in _chunked(objs, self.chunk_size):
+            model.objects.bulk_create(chunk)
+            count += len(chunk)
+        return count
+
+    def _insert(self, model, fields, rows):
+        """
+        Insert the rows (tuples of the values of the given fields) in chunks
+        and return the number of rows inserted.
+
+        Unlike bulk_create, this does not instantiate the model, which is the
+        bulk of the work for millions of small rows.
+        """
+        opts = model._meta
+        columns = ", ".join(connection.ops.quote_name(opts.get_field(name).column) for name in fields)
+        placeholders = ", ".join(["%s"] * len(fields))
+        sql = f"INSERT INTO {connection.ops.quote_name(opts.db_table)} ({columns}) VALUES ({placeholders})"
+        count = 0
+        with connection.cursor() as cursor:
+            for chunk in _chunked(rows, self.chunk_size):
+                cursor.executemany(sql, chunk)
+                count += len(chunk)
+        return count
+
+    def _clear(self):
+        """Remove the data of a previous run."""
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        if hasattr(store_class, "get_model_class"):
+            store_class.get_model_class().objects.filter(session_key__startswith=SESSION_KEY_PREFIX).delete()
+        SessionWatchlist.objects.filter(session_key__startswith=SESSION_KEY_PREFIX).delete()
+        users = get_user_model().objects.filter(username__startswith=USERNAME_PREFIX)
+        # Delete the watchlist rows in one query instead of through the cascade.
+        Watchlist.objects.filter(user__in=users).delete()
+        users.delete()
+        Person.objects.filter(last_name__startswith=PERSON_PREFIX).delete()
+        Company.objects.filter(name__startswith=COMPANY_PREFIX).delete()
+
+    def _create_persons(self, rng, count):
+        """Create the persons and return them as (pk, object_repr) tuples."""
+        self._bulk_create(
+            Person, (Person(first_name=rng.choice(FIRST_NAMES), last_name=f"{PERSON_PREFIX}{i}") for i in range(count))
+        )
+        queryset = Person.objects.filter(last_name__startswith=PERSON_PREFIX).order_by("pk")
+        return [(pk, f"{first_name} {last_name}") for pk, first_name, last_name in queryset.values_list()]
+
+    def _create_companies(self, count):
+        """Create the companies and return them as (pk, object_repr) tuples."""
+        self._bulk_create(Company, (Company(name=f"{COMPANY_PREFIX}{i}") for i in range(count)))
+        return list(Company.objects.filter(name__startswith=COMPANY_PREFIX).order_by("pk").values_list("pk", "name"))
+
+    def _create_users(self, count):
+        # Hashing a password is slow: all users share one unusable password.
+        password = make_password(None)
+        user_model = get_user_model()
+        self._bulk_create(
+            user_model, (user_model(username=f"{USERNAME_PREFIX}{i}", password=password) for i in range(count))
+        )
+        return list(user_model.objects.filter(username__startswith=USERNAME_PREFIX).order_by("pk"))
+
+    def _generate_watchlists(self, rng, options, count, objects):
+        """
+        Return `count` watchlists: dicts of model to a list of (pk, object_repr)
+        tuples of the watched objects.
+        """
+        popularity = {model: Popularity(model_objects) for model, model_objects in objects.items()}
+        watchlists = []
+        for _ in range(count):
+            if rng.random() < options["power_users"]:
+                size = rng.expovariate(1 / options["power_items"]) if options["power_items"] else 0
+            else:
+                size = rng.expovariate(1 / options["items"]) if options["items"] else 0
+            # Split the items between the models:
+            share = rng.random()
+            sizes = {Person: round(size * share), Company: round(size * (1 - share))}
+            watchlists.append({model: popularity[model].sample(rng, sizes[model]) for model in objects})
+        return watchlists
+
+    def _create_watchlist_rows(self, users, watchlists):
+        content_types = ContentType.objects.get_for_models(Person, Company)
+        time_added = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows = (
+            (user.pk, content_types[model].pk, pk, object_repr, time_added)
+            for user, watchlist in zip(users, watchlists)
+            for model, items in watchlist.items()
+            for pk, object_repr in items
+        )
+        return self._insert(Watchlist, ["user", "content_type", "object_id", "object_repr", "time_added"], rows)
+
+    def _create_sessions(self, rng, count, watchlists):
+        """
+        Create the sessions with their watchlist in the form of the configured
+        session manager and return the number of watchlist items created.
+        """
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        manager_class = _get_manager_class(None)
+        session_keys = [
+            SESSION_KEY_PREFIX + "".join(rng.choices(SESSION_KEY_CHARS, k=32 - len(SESSION_KEY_PREFIX)))
+            for _ in range(count)
+        ]
+        watchlists = watchlists[-count:] if count else []
+        now = timezone.now()
+        time_added = now.isoformat()
+
+        items = 0
+        payloads = []
+        if issubclass(manager_class, SessionModelManager):
+            content_types = ContentType.objects.get_for_models(Person, Company)
+            adapted_time_added = connection.ops.adapt_datetimefield_value(now)
+            rows = (
+                (session_key, content_types[model].pk, pk, object_repr, adapted_time_added)
+                for session_key, watchlist in zip(session_keys, watchlists)
+                for model, model_items in watchlist.items()
+                for pk, object_repr in model_items
+            )
+            fields = ["session_key", "content_type", "object_id", "object_repr", "time_added"]
+            items = self._insert(SessionWatchlist, fields, rows)
+            payloads = [{} for _ in session_keys]
+        else:
+            for watchlist in watchlists:
+                payload = {}
+                for model, model_items in watchlist.items():
+                    if issubclass(manager_class, CompactSessionManager):
+                        payload[model._meta.label_lower] = sorted(pk for pk, _ in model_items)
+                    else:
+                        payload[model._meta.label_lower] = [
+                            {"object_id": pk, "object_repr": object_repr, "time_added": time_added}
+                            for pk, object_repr in model_items
+                        ]
+                    items += len(model_items)
+                payloads.append({WATCHLIST_SESSION_KEY: payload})
+
+        if hasattr(store_class, "get_model_class"):
+            # Database backed sessions: create the sessions with bulk_create.
+            session_model = store_class.get_model_class()
+            store = store_class()
+            expire_date = now + timedelta(seconds=settings.SESSION_COOKIE_AGE)
+            self._bulk_create(
+                session_model,
+                (
+                    session_model(session_key=session_key, session_data=store.encode(payload), expire_date=expire_date)
+                    for session_key, payload in zip(session_keys, payloads)
+                ),
+            )
+        elif count:
+            raise CommandError(f"Cannot create sessions with the session engine {settings.SESSION_ENGINE!r}.")
+        return items
@@ -4,7 +4,7 @@ from django.urls import path
 from django.utils.translation import gettext
 
 from mizdb_watchlist.models import Watchlist
-from mizdb_watchlist.views import WatchlistViewMixin, annotate_view_queryset
+from mizdb_watchlist.views import WatchlistViewMixin, annotate_view_queryset, get_watchlist_ordering
 
 
 @admin.register(Watchlist)
@@ -14,18 +14,24 @@ class WatchlistAdmin(WatchlistViewMixin, admin.ModelAdmin):
 
     def get_urls(self):
         urls = super().get_urls()
-        urls.insert(0, path("_watchlist/", self.admin_site.admin_view(self.watchlist), name="watchlist"))
+        # The watchlist view handles its own caching headers (see WatchlistViewMixin).
+        view = self.admin_site.admin_view(self.watchlist, cacheable=True)
+        urls.insert(0, path("_watchlist/", view, name="watchlist"))
         return urls
 
     def watchlist(self, request):
         """The overview of the user's watchlist items."""
+        etag = self.get_watchlist_etag(request)
+        if response := self.get_not_modified_response(request, etag):
+            return self.update_watchlist_response(request, response)
         context = {
             "media": self.media,
             "title": gettext("My watchlist"),
             **self.get_watchlist_context(request),
             **self.admin_site.each_context(request),
         }
-        return TemplateResponse(request, "admin/watchlist.html", context)
+        response = self.add_watchlist_etag(TemplateResponse(request, "admin/watchlist.html", context), etag)
+        return self.update_watchlist_response(request, response)
 
 
 class WatchlistMixin:
@@ -40,13 +46,35 @@ class WatchlistMixin:
     Set ``add_watchlist_annotations`` to ``False`` to skip adding annotations
     and disable filtering.
 
+    Set ``add_watchlist_added`` to ``True`` to add the 'watchlist_added'
+    annotation with the time each object was added to the watchlist.
+
+    Set ``watched_first`` to ``True`` to put the objects that are on the
+    watchlist first, and ``order_by_watchlist_added`` to ``True`` to order the
+    objects by the time they were added to the watchlist (most recent first).
+    Sorting by a column of the changelist overrides this ordering.
+
+    Set ``watchlist_relations`` to a list of lookup paths (e.g. ``["author"]``)
+    to add '<path>__on_watchlist' annotations for related objects.
+
     Add this mixin to your model admins for models that use the watchlist.
     """
 
     add_watchlist_annotations = True
+    add_watchlist_added = False
+    watched_first = False
+    order_by_watchlist_added = False
+    watchlist_relations = ()
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)  # noqa
         if self.add_watchlist_annotations:
-            queryset = annotate_view_queryset(request, queryset)
+            added = self.add_watchlist_added or self.order_by_watchlist_added
+            queryset = annotate_view_queryset(request, queryset, added=added, relations=self.watchlist_relations)
         return queryset
+
+    def get_ordering(self, request):
+        ordering = list(super().get_ordering(request) or [])  # noqa
+        if self.add_watchlist_annotations:
+            ordering = [*get_watchlist_ordering(self.watched_first, self.order_by_watchlist_added), *ordering]
+        return ordering
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class MIZDBWatchlistConfig(AppConfig):
     name = "mizdb_watchlist"
     verbose_name = "Watchlist"
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_in
+
+        from mizdb_watchlist.manager import move_session_watchlist
+
+        user_logged_in.connect(move_session_watchlist, dispatch_uid="mizdb_watchlist_move_session_watchlist")
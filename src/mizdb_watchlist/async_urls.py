@@ -0,0 +1,21 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import path
+
+from mizdb_watchlist.views import (
+    ASYNC_VIEWS_SUPPORTED,
+    awatchlist_remove,
+    awatchlist_remove_all,
+    awatchlist_summary,
+    awatchlist_toggle,
+)
+
+if not ASYNC_VIEWS_SUPPORTED:  # pragma: no cover
+    raise ImproperlyConfigured("mizdb_watchlist.async_urls requires Django 5.0 or later.")
+
+app_name = "watchlist"
+urlpatterns = [
+    path("remove/", awatchlist_remove, name="remove"),
+    path("remove_all/", awatchlist_remove_all, name="remove_all"),
+    path("toggle/", awatchlist_toggle, name="toggle"),
+    path("summary/", awatchlist_summary, name="summary"),
+]
@@ -0,0 +1,127 @@
+"""
+Tools to detect toggle buttons that query the watchlist one object at a time.
+
+If the `on_watchlist` argument of the `toggle_button` tag is missing, the tag
+has to look up the watchlist status of its object by itself ("fallback
+lookup"). With managers that use the Watchlist model this is one query per
+button. Set the `fallback_lookup_threshold` setting to be notified when a
+request makes more fallback lookups than that:
+
+    MIZDB_WATCHLIST = {
+        "fallback_lookup_threshold": 0,
+        "fallback_lookup_action": "raise",  # or "warn" (the default)
+    }
+"""
+
+import logging
+from contextlib import contextmanager
+
+from django.dispatch import Signal
+
+from mizdb_watchlist.manager import _get_watchlist_settings
+
+logger = logging.getLogger(__name__)
+
+# Sent for every fallback lookup with the arguments request, obj and
+# template_name. The sender is the model class of the object.
+fallback_lookup = Signal()
+
+# Where a toggle button got the watchlist status of its object from: the
+# on_watchlist argument (usually the queryset annotation), a watchlist_prefetch
+# tag or a fallback lookup.
+ANNOTATION = "annotation"
+PREFETCH = "prefetch"
+FALLBACK = "fallback"
+
+# Sent for every toggle button with the arguments request, obj, source (one of
+# the above) and template_name. The sender is the model class of the object.
+membership_check = Signal()
+
+# The name of the request attribute that holds the number of fallback lookups.
+COUNT_ATTR = "_watchlist_fallback_lookups"
+
+WARN = "warn"
+RAISE = "raise"
+
+
+class FallbackLookupError(Exception):
+    """Raised when a request exceeds the fallback lookup threshold."""
+
+
+def _get_threshold():
+    """
+    Return the number of fallback lookups a request may make, or None if the
+    lookups are not counted.
+    """
+    return _get_watchlist_settings().get("fallback_lookup_threshold")
+
+
+def _get_action():
+    """Return what to do when a request exceeds the fallback lookup threshold."""
+    return _get_watchlist_settings().get("fallback_lookup_action", WARN)
+
+
+def record_fallback_lookup(request, obj, template_name=None):
+    """
+    Record that the watchlist status of `obj` was looked up by itself.
+
+    Sends the `fallback_lookup` signal. If a threshold is set, count the lookups
+    of the request, and log a warning or raise a FallbackLookupError when the
+    count first exceeds the threshold.
+    """
+    fallback_lookup.send(sender=obj.__class__, request=request, obj=obj, template_name=template_name)
+    threshold = _get_threshold()
+    if threshold is None:
+        return
+    count = getattr(request, COUNT_ATTR, 0) + 1
+    setattr(request, COUNT_ATTR, count)
+    if count != threshold + 1:
+        return
+    msg = (
+        f"toggle_button looked up the watchlist status of more than {threshold} object(s) one at a time "
+        f"(model: {obj._meta.label_lower}, template: {template_name or 'unknown'}). "
+        "Pass the on_watchlist argument or use the watchlist_prefetch tag."
+    )
+    if _get_action() == RAISE:
+        raise FallbackLookupError(msg)
+    logger.warning(msg)
+
+
+@contextmanager
+def capture_fallback_lookups():
+    """
+    Capture the fallback lookups made in the context.
+
+    Yields a list that is filled with a (model label, object pk, template name)
+    tuple for every fallback lookup.
+    """
+    lookups = []
+
+    def receiver(sender, obj, template_name, **kwargs):
+        lookups.append((sender._meta.label_lower, obj.pk, template_name))
+
+    fallback_lookup.connect(receiver, weak=False)
+    try:
+        yield lookups
+    finally:
+        fallback_lookup.disconnect(receiver)
+
+
+@contextmanager
+def assert_no_fallback_lookups():
+    """
+    Assert that no toggle button in the context had to look up the watchlist
+    status of its object by itself.
+
+    Example:
+        def test_changelist(client):
+            with assert_no_fallback_lookups():
+                client.get("/persons/")
+    """
+    with capture_fallback_lookups() as lookups:
+        yield
+    if lookups:
+        details = ", ".join(
+            f"{label} {pk} in {template_name or 'unknown template'}" for label, pk, template_name in lookups
+        )
+        raise AssertionError(f"{len(lookups)} fallback lookup(s): {details}")
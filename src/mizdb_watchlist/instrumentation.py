@@ -0,0 +1,220 @@
+"""
+Record metrics about the watchlist manager operations.
+
+Enable the instrumentation with the `instrumentation` setting:
+
+    MIZDB_WATCHLIST = {
+        # Use the default InMemoryCollector:
+        "instrumentation": True,
+        # Or the python path to a collector class:
+        "instrumentation": "myapp.metrics.StatsdCollector",
+    }
+
+When enabled, `get_manager` returns managers of an instrumented subclass of
+the manager class. Each call of an operation is timed, and the number of
+database queries and of the rows written by these queries is recorded. The
+`manager_operation` signal is sent and the collector's `record` method is
+called with the results. The rows are counted as reported by the database
+driver (`cursor.rowcount`); note that SQLite does not report the rows of
+`INSERT ... RETURNING` statements. Operations that are called by another operation
+(e.g. `on_watchlist` called by `toggle`) are not recorded separately.
+
+`annotate_queryset` and `filter` are not instrumented: they only build a lazy
+queryset, and their cost is paid where the queryset is evaluated (e.g. by the
+view that renders it).
+
+When disabled, the manager classes are used as they are.
+"""
+
+import threading
+import time
+from functools import lru_cache, wraps
+from importlib import import_module
+
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import Signal, receiver
+
+from mizdb_watchlist.manager import _get_watchlist_settings
+
+# The manager methods that are instrumented.
+OPERATIONS = (
+    "on_watchlist",
+    "add",
+    "remove",
+    "toggle",
+    "bulk_add",
+    "as_dict",
+    "prune",
+)
+
+# Sent after every recorded operation with the arguments manager, operation,
+# duration (seconds), queries, rows and sql (a list of the (sql, params) of the
+# queries). The sender is the manager class.
+manager_operation = Signal()
+
+
+class Collector:
+    """Base class for collectors of manager operation metrics."""
+
+    def record(self, manager, operation, duration, queries, rows):
+        """
+        Record a call of a manager operation.
+
+        Args:
+            manager (BaseManager): the manager instance
+            operation (str): the name of the operation (e.g. 'add')
+            duration (float): the wall time of the call in seconds
+            queries (int): the number of database queries made
+            rows (int): the number of rows inserted, updated or deleted
+        """
+        raise NotImplementedError  # pragma: no cover
+
+
+class InMemoryCollector(Collector):
+    """
+    Keep running totals per manager class and operation in memory.
+
+    The totals are kept per process. Use `export_prometheus` (or the view
+    `mizdb_watchlist.views.watchlist_metrics`) to export them.
+    """
+
+    metrics = (
+        ("calls", "counter", "Number of calls of watchlist manager operations."),
+        ("seconds", "counter", "Total wall time of watchlist manager operations."),
+        ("queries", "counter", "Number of database queries made by watchlist manager operations."),
+        ("rows", "counter", "Number of rows written by watchlist manager operations."),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, manager, operation, duration, queries, rows):
+        key = (manager.__class__.__name__, operation)
+        with self._lock:
+            totals = self._totals.setdefault(key, {"calls": 0, "seconds": 0.0, "queries": 0, "rows": 0})
+            totals["calls"] += 1
+            totals["seconds"] += duration
+            totals["queries"] += queries
+            totals["rows"] += rows
+
+    def get_totals(self):
+        """Return a copy of the totals, keyed by (manager class name, operation)."""
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._totals.items()}
+
+    def reset(self):
+        """Discard all recorded totals."""
+        with self._lock:
+            self._totals.clear()
+
+    def export_prometheus(self):
+        """Return the totals in the Prometheus text exposition format."""
+        totals = sorted(self.get_totals().items())
+        lines = []
+        for name, metric_type, help_text in self.metrics:
+            metric = f"mizdb_watchlist_operation_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} {metric_type}")
+            for (manager_name, operation), values in totals:
+                lines.append(f'{metric}{{manager="{manager_name}",operation="{operation}"}} {values[name]}')
+        return "\n".join(lines) + "\n"
+
+
+def _get_setting():
+    return _get_watchlist_settings().get("instrumentation", False)
+
+
+@lru_cache(maxsize=None)
+def get_collector():
+    """
+    Return the collector declared by the `instrumentation` setting, or None if
+    the instrumentation is disabled.
+    """
+    setting = _get_setting()
+    if not setting:
+        return None
+    if setting is True:
+        return InMemoryCollector()
+    module, cls = setting.rsplit(".", 1)
+    return getattr(import_module(module), cls)()
+
+
+@receiver(setting_changed)
+def _clear_collector(setting, **kwargs):
+    if setting == "MIZDB_WATCHLIST":
+        get_collector.cache_clear()
+
+
+class _QueryCounter:
+    """
+    Database execute wrapper that counts the queries and the rows written by
+    them, and keeps the SQL of the queries.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.sql = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        self.sql.append((sql, params))
+        result = execute(sql, params, many, context)
+        if sql.lstrip()[:6].upper() != "SELECT":
+            self.rows += max(context["cursor"].rowcount, 0)
+        return result
+
+
+def _instrument_method(func, operation):
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if self._instrumented_call:
+            # Called by another operation; it is recorded as part of that one.
+            return func(self, *args, **kwargs)
+        counter = _QueryCounter()
+        self._instrumented_call = True
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                return func(self, *args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            self._instrumented_call = False
+            record(self, operation, duration, counter.queries, counter.rows, counter.sql)
+
+    return wrapper
+
+
+def record(manager, operation, duration, queries, rows, sql=()):
+    """Send the manager_operation signal and pass the results to the collector."""
+    manager_operation.send(
+        sender=manager.__class__,
+        manager=manager,
+        operation=operation,
+        duration=duration,
+        queries=queries,
+        rows=rows,
+        sql=list(sql),
+    )
+    if (collector := get_collector()) is not None:
+        collector.record(manager, operation, duration, queries, rows)
+
+
+@lru_cache(maxsize=None)
+def instrument(manager_class):
+    """Return a subclass of the given manager class with instrumented operations."""
+    attrs = {
+        operation: _instrument_method(getattr(manager_class, operation), operation)
+        for operation in OPERATIONS
+        if hasattr(manager_class, operation)
+    }
+    attrs.update(
+        {
+            "__module__": manager_class.__module__,
+            "__qualname__": manager_class.__qualname__,
+            "_instrumented_call": False,
+        }
+    )
+    return type(manager_class.__name__, (manager_class,), attrs)
@@ -0,0 +1,37 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mizdb_watchlist.manager import _check_session_engine
+from mizdb_watchlist.models import SessionWatchlist
+
+
+class Command(BaseCommand):
+    help = (
+        "Can be run as a cronjob or directly (after clearsessions) to remove the "
+        "watchlist items of sessions that have expired."
+    )
+
+    def handle(self, **options):
+        try:
+            # Signed cookie sessions cannot be checked for expiry: every
+            # session would be considered expired.
+            _check_session_engine()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e)) from e
+        store_class = import_module(settings.SESSION_ENGINE).SessionStore
+        items = SessionWatchlist.objects.all()
+        if hasattr(store_class, "get_model_class"):
+            # Database backed sessions: remove the items in a single query.
+            active_sessions = store_class.get_model_class().objects.filter(expire_date__gt=timezone.now())
+            items = items.exclude(session_key__in=active_sessions.values("session_key"))
+        else:
+            session_keys = items.values_list("session_key", flat=True).order_by().distinct()
+            store = store_class()
+            items = items.filter(session_key__in=[key for key in session_keys if not store.exists(key)])
+        deleted, _ = items.delete()
+        if options["verbosity"] > 1:
+            self.stdout.write(f"Removed {deleted} watchlist item(s) of expired sessions.")
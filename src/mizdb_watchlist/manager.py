@@ -1,16 +1,55 @@
+import hashlib
+import json
+from bisect import bisect_left, insort
+from contextvars import ContextVar
 from importlib import import_module
 from operator import itemgetter
 
+from asgiref.sync import sync_to_async
 from django.apps import apps
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends import signed_cookies
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
-from django.db.models import ExpressionWrapper, Q, QuerySet
-
-from mizdb_watchlist.models import Watchlist
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    Max,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.constants import LOOKUP_SEP
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from mizdb_watchlist.models import SessionWatchlist, Watchlist
 
 WATCHLIST_SESSION_KEY = "watchlist"
+WATCHLIST_COOKIE_NAME = "mizdb_watchlist"
 ANNOTATION_FIELD = "on_watchlist"
+ADDED_ANNOTATION_FIELD = "watchlist_added"
+
+# Sent by get_manager and aget_manager for every manager they create, with the
+# arguments request and manager. The sender is the manager class.
+manager_created = Signal()
+
+# Whether to instrument the managers regardless of the instrumentation
+# setting. Set by the debug toolbar panel for the requests it records.
+_instrument_managers = ContextVar("mizdb_watchlist_instrument_managers", default=False)
+
+# Apps whose models can not be put on a watchlist.
+UNWATCHABLE_APPS = {"admin", "auth", "contenttypes", "sessions", "mizdb_watchlist"}
 
 
 def _get_watchlist_settings():
@@ -23,6 +62,69 @@ def _get_manager_settings():
     return _get_watchlist_settings().get("manager", {})
 
 
+def _get_session_max_items():
+    """
+    Return the maximum number of items a compact session watchlist may hold, or
+    None if the number of items is not capped.
+    """
+    return _get_watchlist_settings().get("session_max_items")
+
+
+def _get_cache_alias():
+    """Return the alias of the cache that is used to store watchlist data."""
+    return _get_watchlist_settings().get("cache", DEFAULT_CACHE_ALIAS)
+
+
+def _get_cache():
+    """Return the cache that is used to store watchlist data such as item counts."""
+    return caches[_get_cache_alias()]
+
+
+def _get_cache_timeout():
+    """Return the timeout for values stored in the watchlist cache."""
+    return _get_watchlist_settings().get("cache_timeout", DEFAULT_TIMEOUT)
+
+
+def _get_watchable_model(model_label):
+    """
+    Return the model for the given model label, or None if the label does not
+    refer to a model that can be put on a watchlist.
+
+    Models of the apps in UNWATCHABLE_APPS and the user model are not
+    watchable: their objects are not meant to be listed on a watchlist.
+    """
+    try:
+        model = apps.get_model(model_label)
+    except (LookupError, ValueError):
+        return None
+    if model._meta.app_label in UNWATCHABLE_APPS or model is get_user_model():
+        return None
+    return model
+
+
+def _group_by_model(objects):
+    """Return a mapping of model to the primary keys of the given objects."""
+    objects_by_model = {}
+    for obj in objects:
+        objects_by_model.setdefault(obj._meta.model, []).append(obj.pk)
+    return objects_by_model
+
+
+def _get_related_model(model, path):
+    """
+    Return the model at the end of the given lookup path.
+
+    Raise a ValueError if the path does not follow relations to a single
+    object (i.e. forward foreign keys or one-to-one relations).
+    """
+    for name in path.split(LOOKUP_SEP):
+        field = model._meta.get_field(name)
+        if not (field.is_relation and (field.many_to_one or field.one_to_one)):
+            raise ValueError(f"Lookup path '{path}' must only follow relations to a single object.")
+        model = field.related_model
+    return model
+
+
 def _get_manager_from_settings(manager_type):
     """
     Return the manager for the given type (session or model) as specified by
@@ -44,6 +146,22 @@ def _get_manager_from_settings(manager_type):
         return None
 
 
+def _get_manager_class(user):
+    """Return the manager class for the given user."""
+    manager_class = _get_manager_from_settings("session") or SessionManager
+    try:
+        if user.is_authenticated:
+            manager_class = _get_manager_from_settings("model") or ModelManager
+    except AttributeError:
+        # request.user was not set or request.user was None
+        pass
+    if _get_watchlist_settings().get("instrumentation") or _instrument_managers.get():
+        from mizdb_watchlist.instrumentation import instrument
+
+        manager_class = instrument(manager_class)
+    return manager_class
+
+
 def get_manager(request):
     """
     Return a watchlist manager for the given request.
@@ -51,19 +169,37 @@ def get_manager(request):
     If the user is authenticated, return a ModelManager instance. Otherwise,
     return a SessionManager instance.
     """
-    manager_class = _get_manager_from_settings("session") or SessionManager
-    try:
-        if request.user.is_authenticated:
-            manager_class = _get_manager_from_settings("model") or ModelManager
-    except AttributeError:
-        # request.user was not set or request.user was None
-        pass
-    return manager_class(request)
+    manager = _get_manager_class(getattr(request, "user", None))(request)
+    manager_created.send(sender=manager.__class__, request=request, manager=manager)
+    return manager
+
+
+async def aget_manager(request):
+    """
+    Return a watchlist manager for the given request.
+
+    Async version of ``get_manager``: the user is resolved with
+    ``request.auser()`` (if available), so that the manager can be used in
+    async views without making synchronous queries.
+    """
+    if hasattr(request, "auser"):
+        user = await request.auser()
+    else:
+        user = getattr(request, "user", None)
+    manager = _get_manager_class(user)(request, user=user)
+    manager_created.send(sender=manager.__class__, request=request, manager=manager)
+    return manager
 
 
 class BaseManager:
-    def __init__(self, request):
+    # Whether the watchlist is stored and modified by the client (the browser).
+    client_side = False
+
+    def __init__(self, request, user=None):
         self.request = request
+        if user is None:
+            user = getattr(request, "user", None)
+        self.user = user
 
     def get_watchlist(self):
         """Return the watchlist for the current request."""
@@ -83,6 +219,34 @@ class BaseManager:
     def _on_watchlist(self, obj):
         raise NotImplementedError  # pragma: no cover
 
+    def membership(self, objects):
+        """
+        Return whether the given model objects are on the watchlist.
+
+        The objects can be of different models. Returns a dictionary that maps
+        (model_label, pk) of each object to a boolean.
+        """
+        result = {}
+        for model, pks in _group_by_model(objects).items():
+            watchlist_pks = set(self.pks(self.get_model_watchlist(model)))
+            for pk in pks:
+                result[(model._meta.label_lower, pk)] = pk in watchlist_pks
+        return result
+
+    def annotate_objects(self, objects):
+        """
+        Set an 'on_watchlist' attribute on each of the given model objects that
+        denotes whether the object is on the watchlist.
+
+        Like ``annotate_queryset``, but for lists of objects of different
+        models. Returns the objects as a list.
+        """
+        objects = list(objects)
+        membership = self.membership(objects)
+        for obj in objects:
+            setattr(obj, ANNOTATION_FIELD, membership[(obj._meta.label_lower, obj.pk)])
+        return objects
+
     def add(self, obj):
         """Add the given model object to the watchlist."""
         raise NotImplementedError  # pragma: no cover
@@ -107,22 +271,71 @@ class BaseManager:
             self.add(obj)
             return True
 
+    def set_on_watchlist(self, obj, on_watchlist):
+        """
+        Add the given model object to the watchlist if `on_watchlist` is True,
+        otherwise remove it. Return whether the object is on the watchlist.
+
+        Unlike `toggle`, repeating the call does not change the result.
+        """
+        if on_watchlist:
+            self.add(obj)
+            # The item may not have been added if the watchlist is full:
+            return self.on_watchlist(obj)
+        self.remove(obj)
+        return False
+
     def as_dict(self):
         """Return the watchlist as a dictionary."""
         raise NotImplementedError  # pragma: no cover
 
+    def update_response(self, response):
+        """
+        Add changes to the watchlist that must be sent back to the client to
+        the given response.
+        """
+        return response
+
     def pks(self, model_watchlist):
         """Return the primary keys of the items of the given model watchlist."""
         raise NotImplementedError  # pragma: no cover
 
-    def annotate_queryset(self, queryset):
+    def annotate_queryset(self, queryset, added=False, relations=()):
         """
         Add an 'on_watchlist' attribute to each object in the given queryset
         that denotes whether the object is on a watchlist.
+
+        If `added` is True, also add a 'watchlist_added' attribute with the
+        time the object was added to the watchlist (or None).
+
+        For every lookup path in `relations` (e.g. 'author' or
+        'publisher__parent'), add a '<path>__on_watchlist' attribute that
+        denotes whether the related object is on the watchlist.
+        """
+        queryset = queryset.annotate(**{ANNOTATION_FIELD: self._get_on_watchlist_expression(queryset.model)})
+        if added:
+            queryset = queryset.annotate(**{ADDED_ANNOTATION_FIELD: self._get_added_expression(queryset.model)})
+        for path in relations:
+            related_model = _get_related_model(queryset.model, path)
+            expression = self._get_on_watchlist_expression(related_model, lookup=path)
+            queryset = queryset.annotate(**{f"{path}{LOOKUP_SEP}{ANNOTATION_FIELD}": expression})
+        return queryset
+
+    def _get_on_watchlist_expression(self, model, lookup="pk"):
+        """
+        Return the expression that denotes whether the objects of the given
+        model, referenced by `lookup`, are on the watchlist.
         """
-        watchlist_pks = self.pks(self.get_model_watchlist(queryset.model))
-        expression = ExpressionWrapper(Q(pk__in=watchlist_pks), output_field=models.BooleanField())
-        return queryset.annotate(**{ANNOTATION_FIELD: expression})
+        watchlist_pks = self.pks(self.get_model_watchlist(model))
+        return ExpressionWrapper(Q(**{f"{lookup}__in": watchlist_pks}), output_field=models.BooleanField())
+
+    def _get_added_expression(self, model):
+        """
+        Return the expression for the time the objects of the given model were
+        added to the watchlist.
+        """
+        # The time is not known:
+        return Value(None, output_field=models.DateTimeField())
 
     def prune(self):
         """
@@ -159,6 +372,52 @@ class BaseManager:
         """Remove all watchlist items of the given model."""
         raise NotImplementedError  # pragma: no cover
 
+    def count(self, model=None):
+        """
+        Return the number of items on the watchlist, or the number of items of
+        the given model.
+        """
+        counts = self.get_counts()
+        if model is None:
+            return sum(counts.values())
+        return counts.get(self._get_count_label(model), 0)
+
+    def _get_count_label(self, model):
+        """Return the label under which the items of the given model are counted."""
+        return model._meta.label_lower
+
+    def get_counts(self):
+        """Return the number of watchlist items per model label."""
+        raise NotImplementedError  # pragma: no cover
+
+    def summary(self):
+        """
+        Return the number of watchlist items per model label, without loading
+        the watchlist items themselves.
+
+        Same as ``get_counts``.
+        """
+        return self.get_counts()
+
+    def get_version(self):
+        """
+        Return a string that changes whenever the watchlist changes, or None if
+        the watchlist cannot be versioned.
+
+        The watchlist overview uses the version to build its ETag.
+        """
+        return None
+
+    def get_model_versions(self):
+        """
+        Return a mapping of model label to a string that changes whenever the
+        watchlist items of that model change.
+
+        The watchlist overview uses these versions to cache the rendered HTML
+        of each model group.
+        """
+        raise NotImplementedError  # pragma: no cover
+
     def filter(self, queryset):
         """
         Filter the given queryset to only include items that are on the
@@ -168,6 +427,75 @@ class BaseManager:
             queryset = self.annotate_queryset(queryset)
         return queryset.filter(**{ANNOTATION_FIELD: True})
 
+    # Async API. By default, the synchronous methods are run in a thread.
+
+    async def aon_watchlist(self, obj):
+        """Return whether the given model object is on the watchlist."""
+        return await sync_to_async(self.on_watchlist)(obj)
+
+    async def aadd(self, obj):
+        """Add the given model object to the watchlist."""
+        await sync_to_async(self.add)(obj)
+
+    async def aremove(self, obj):
+        """Remove the given model object from the watchlist."""
+        await sync_to_async(self.remove)(obj)
+
+    async def atoggle(self, obj):
+        """
+        Add the given model object to the watchlist, if it is not already on it.
+        Otherwise, remove it.
+        """
+        return await sync_to_async(self.toggle)(obj)
+
+    async def aset_on_watchlist(self, obj, on_watchlist):
+        """
+        Add the given model object to the watchlist if `on_watchlist` is True,
+        otherwise remove it. Return whether the object is on the watchlist.
+        """
+        return await sync_to_async(self.set_on_watchlist)(obj, on_watchlist)
+
+    async def abulk_add(self, objects):
+        """Add the objects in `objects` to the watchlist."""
+        await sync_to_async(self.bulk_add)(objects)
+
+    async def aremove_model(self, model):
+        """Remove all watchlist items of the given model."""
+        await sync_to_async(self.remove_model)(model)
+
+    async def aas_dict(self):
+        """Return the watchlist as a dictionary."""
+        return await sync_to_async(self.as_dict)()
+
+    async def acount(self, model=None):
+        """
+        Return the number of items on the watchlist, or the number of items of
+        the given model.
+        """
+        counts = await self.aget_counts()
+        if model is None:
+            return sum(counts.values())
+        return counts.get(self._get_count_label(model), 0)
+
+    async def aget_counts(self):
+        """Return the number of watchlist items per model label."""
+        return await sync_to_async(self.get_counts)()
+
+    async def asummary(self):
+        """Async version of ``summary``."""
+        return await self.aget_counts()
+
+    async def aget_version(self):
+        """Async version of ``get_version``."""
+        return await sync_to_async(self.get_version)()
+
+    async def aprune(self):
+        """
+        Remove watchlist items that reference stale models or stale model
+        objects.
+        """
+        await sync_to_async(self.prune)()
+
 
 class SessionManager(BaseManager):
     """
@@ -176,13 +504,24 @@ class SessionManager(BaseManager):
     Watchlist items are stored as dicts in a list under their respective model
     label:
         session[WATCHLIST_SESSION_KEY] = {<model_label>: <model_watchlist>}
-        model_watchlist = [{"object_id": 1, "object_repr": "foo"}, ...]
+        model_watchlist = [{"object_id": 1, "object_repr": "foo", "time_added": ...}]
+
+    The time the item was added is stored as an ISO 8601 string.
     """
 
     def get_watchlist(self):
-        if WATCHLIST_SESSION_KEY not in self.request.session:
-            self.request.session[WATCHLIST_SESSION_KEY] = {}
-        return self.request.session[WATCHLIST_SESSION_KEY]
+        # Do not store an empty watchlist here: reading the watchlist must not
+        # mark the session as modified, or every request of an anonymous user
+        # would save the session and set a session cookie.
+        return self.request.session.get(WATCHLIST_SESSION_KEY, {})
+
+    def _set_watchlist(self, watchlist):
+        """Store the given watchlist."""
+        self.request.session[WATCHLIST_SESSION_KEY] = watchlist
+
+    def _set_modified(self):
+        """Mark the watchlist storage as modified, so that the changes are saved."""
+        self.request.session.modified = True
 
     def _get_watchlist_label(self, model):
         """Return the label to use for a watchlist for the given model."""
@@ -197,6 +536,7 @@ class SessionManager(BaseManager):
         label = self._get_watchlist_label(model)
         if label not in watchlist:
             watchlist[label] = []
+            self._set_watchlist(watchlist)
 
     def _get_model_watchlist(self, model):
         watchlist = self.get_watchlist()
@@ -209,8 +549,10 @@ class SessionManager(BaseManager):
         if not self.on_watchlist(obj):
             self._add_model_watchlist(obj)
             model_watchlist = self.get_model_watchlist(obj)
-            model_watchlist.append({"object_id": obj.pk, "object_repr": str(obj)})
-            self.request.session.modified = True
+            model_watchlist.append(
+                {"object_id": obj.pk, "object_repr": str(obj), "time_added": timezone.now().isoformat()}
+            )
+            self._set_modified()
 
     def remove(self, obj):
         if self.on_watchlist(obj):
@@ -218,15 +560,42 @@ class SessionManager(BaseManager):
             self.remove_object_id(model_watchlist, obj.pk)
             if not model_watchlist:
                 self.remove_model(obj)
-            self.request.session.modified = True
+            self._set_modified()
 
     def remove_object_id(self, model_watchlist, object_id):
         model_watchlist.pop(self.pks(model_watchlist).index(object_id))
-        self.request.session.modified = True
+        self._set_modified()
 
     def as_dict(self):
         return self.get_watchlist()  # pragma: no cover
 
+    def get_counts(self):
+        return {model_label: len(items) for model_label, items in self.get_watchlist().items() if items}
+
+    def _get_added_expression(self, model):
+        whens = [
+            When(pk=item["object_id"], then=Value(parse_datetime(item["time_added"])))
+            for item in self.get_model_watchlist(model)
+            # Items added by older versions do not have a timestamp:
+            if item.get("time_added")
+        ]
+        if not whens:
+            return super()._get_added_expression(model)
+        return Case(*whens, default=None, output_field=models.DateTimeField())
+
+    def get_version(self):
+        # The session watchlist is loaded anyway; hashing its contents is
+        # cheaper than keeping track of a version number on every change.
+        return self._hash(self.get_watchlist())
+
+    def get_model_versions(self):
+        return {model_label: self._hash(items) for model_label, items in self.get_watchlist().items() if items}
+
+    @staticmethod
+    def _hash(data):
+        data = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.md5(data.encode(), usedforsecurity=False).hexdigest()
+
     def pks(self, model_watchlist):
         return list(map(itemgetter("object_id"), model_watchlist))
 
@@ -235,7 +604,7 @@ class SessionManager(BaseManager):
         for model_label in list(watchlist.keys()):
             try:
                 apps.get_model(model_label)
-            except LookupError:
+            except (LookupError, ValueError):
                 self._remove_model(model_label)
 
     def _prune_model_objects(self):
@@ -253,14 +622,251 @@ class SessionManager(BaseManager):
 
     def _remove_model(self, model_label):
         del self.get_watchlist()[model_label]
-        self.request.session.modified = True
+        self._set_modified()
+
+    async def _aload(self):
+        """
+        Load the session data asynchronously, so that the synchronous methods
+        can access the watchlist without querying the session store.
+        """
+        session = self.request.session
+        if hasattr(session, "aget"):  # Django >= 5.1
+            await session.aget(WATCHLIST_SESSION_KEY)
+        else:
+            # Accessing _session fills the session cache; session.load() would
+            # only return the data.
+            await sync_to_async(lambda: session._session)()
+
+    async def aon_watchlist(self, obj):
+        await self._aload()
+        return self.on_watchlist(obj)
+
+    async def aadd(self, obj):
+        await self._aload()
+        self.add(obj)
+
+    async def aremove(self, obj):
+        await self._aload()
+        self.remove(obj)
+
+    async def atoggle(self, obj):
+        await self._aload()
+        return self.toggle(obj)
+
+    async def aset_on_watchlist(self, obj, on_watchlist):
+        await self._aload()
+        return self.set_on_watchlist(obj, on_watchlist)
+
+    async def abulk_add(self, objects):
+        await self._aload()
+        if isinstance(objects, QuerySet):
+            objects = [obj async for obj in objects]
+        self.bulk_add(objects)
+
+    async def aremove_model(self, model):
+        await self._aload()
+        if self._get_watchlist_label(model) in self.get_watchlist():
+            self.remove_model(model)
+
+    async def aas_dict(self):
+        await self._aload()
+        return self.as_dict()
+
+    async def aget_counts(self):
+        await self._aload()
+        return self.get_counts()
+
+    async def aget_version(self):
+        await self._aload()
+        return self.get_version()
+
+    async def aprune(self):
+        await self._aload()
+        self._prune_models()
+        for model_label in self.get_watchlist():
+            model = apps.get_model(model_label)
+            model_watchlist = self.get_model_watchlist(model)
+            pks = self.pks(model_watchlist)
+            existing = [pk async for pk in model.objects.filter(pk__in=pks).values_list("pk", flat=True)]
+            for orphan_pk in set(pks) - set(existing):
+                self.remove_object_id(model_watchlist, orphan_pk)
+
+
+class CompactSessionManager(SessionManager):
+    """
+    Manager for watchlists stored in local session in a compact form.
+
+    Only the primary keys of the watchlist items are stored, as a sorted list
+    under their respective model label:
+        session[WATCHLIST_SESSION_KEY] = {<model_label>: [1, 5, 42, ...]}
+
+    The object representations are not stored; they are resolved from the
+    database when the watchlist is requested in dictionary form (i.e. when
+    rendering the watchlist overview).
+
+    The total number of items can be capped with the ``session_max_items``
+    setting. Items beyond the cap are not added to the watchlist.
+    """
+
+    def get_watchlist(self):
+        watchlist = super().get_watchlist()
+        for model_label, model_watchlist in watchlist.items():
+            if model_watchlist and isinstance(model_watchlist[0], dict):
+                # Convert a watchlist that was stored by SessionManager.
+                watchlist[model_label] = sorted(map(itemgetter("object_id"), model_watchlist))
+                self._set_modified()
+        return watchlist
+
+    def _on_watchlist(self, obj):
+        model_watchlist = self.get_model_watchlist(obj)
+        i = bisect_left(model_watchlist, obj.pk)
+        return i < len(model_watchlist) and model_watchlist[i] == obj.pk
+
+    def _is_full(self):
+        """Return whether the watchlist has reached the maximum number of items."""
+        max_items = _get_session_max_items()
+        if max_items is None:
+            return False
+        return sum(map(len, self.get_watchlist().values())) >= max_items
+
+    def add(self, obj):
+        if not self.on_watchlist(obj) and not self._is_full():
+            self._add_model_watchlist(obj)
+            insort(self.get_model_watchlist(obj), obj.pk)
+            self._set_modified()
+
+    def toggle(self, obj):
+        if self.on_watchlist(obj):
+            self.remove(obj)
+            return False
+        self.add(obj)
+        # The item may not have been added if the watchlist is full:
+        return self.on_watchlist(obj)
+
+    def remove_object_id(self, model_watchlist, object_id):
+        i = bisect_left(model_watchlist, object_id)
+        if i < len(model_watchlist) and model_watchlist[i] == object_id:
+            del model_watchlist[i]
+            self._set_modified()
+
+    def _get_models(self):
+        """Return (model_label, model, pks) for every model on the watchlist."""
+        for model_label, pks in self.get_watchlist().items():
+            try:
+                yield model_label, apps.get_model(model_label), pks
+            except (LookupError, ValueError):
+                continue
+
+    def as_dict(self):
+        result = {}
+        for model_label, model, pks in self._get_models():
+            objects = model.objects.in_bulk(pks)
+            result[model_label] = [{"object_id": pk, "object_repr": str(objects[pk])} for pk in pks if pk in objects]
+        return result
+
+    async def aas_dict(self):
+        await self._aload()
+        result = {}
+        for model_label, model, pks in self._get_models():
+            objects = await model.objects.ain_bulk(pks)
+            result[model_label] = [{"object_id": pk, "object_repr": str(objects[pk])} for pk in pks if pk in objects]
+        return result
+
+    def pks(self, model_watchlist):
+        return list(model_watchlist)
+
+    def _get_added_expression(self, model):
+        # Only the primary keys are stored; the time is not known.
+        return BaseManager._get_added_expression(self, model)
+
+
+class ClientManager(CompactSessionManager):
+    """
+    Manager for watchlists stored by the client.
+
+    The watchlist is kept in the browser's local storage by watchlist.js, which
+    toggles items without making any requests. The script mirrors the
+    watchlist in a cookie, so that the server can annotate and filter
+    querysets, and render the watchlist overview. The cookie value lists the
+    primary keys of the items under their model label:
+        "<model_label>:<pk>-<pk>-...|<model_label>:<pk>-..."
+
+    The cookie is not signed since it is written by the browser. Its content
+    only affects the watchlist of the client that sent it, and labels of models
+    that are not watchable are ignored (see ``_get_watchable_model``).
+
+    Changes made on the server are sent back with the cookie of the response
+    (see ``update_response``).
+    """
+
+    client_side = True
+
+    def get_watchlist(self):
+        if not hasattr(self, "_watchlist"):
+            self._watchlist = self._decode(self.request.COOKIES.get(WATCHLIST_COOKIE_NAME, ""))
+            self._modified = False
+        return self._watchlist
+
+    def _set_watchlist(self, watchlist):
+        self._watchlist = watchlist
+
+    def _set_modified(self):
+        self._modified = True
+
+    async def _aload(self):
+        # The watchlist is read from the cookies; there is nothing to load.
+        pass
+
+    @staticmethod
+    def _decode(value):
+        """
+        Return the watchlist described by the given cookie value.
+
+        Items of labels that do not refer to a watchable model are dropped.
+        """
+        watchlist = {}
+        for model_watchlist in value.split("|"):
+            model_label, _, pks = model_watchlist.partition(":")
+            try:
+                pks = sorted({int(pk) for pk in pks.split("-")})
+            except ValueError:
+                continue
+            model = _get_watchable_model(model_label)
+            if model is not None:
+                watchlist[model._meta.label_lower] = pks
+        return watchlist
+
+    @staticmethod
+    def _encode(watchlist):
+        """Return the cookie value for the given watchlist."""
+        return "|".join(f"{model_label}:{'-'.join(map(str, pks))}" for model_label, pks in watchlist.items() if pks)
+
+    def update_response(self, response):
+        if getattr(self, "_modified", False):
+            response.set_cookie(
+                WATCHLIST_COOKIE_NAME,
+                self._encode(self.get_watchlist()),
+                max_age=settings.SESSION_COOKIE_AGE,
+                samesite="Lax",
+            )
+        return response
 
 
 class ModelManager(BaseManager):
     """Manager for watchlists stored via the Watchlist model."""
 
+    model = Watchlist
+
     def get_watchlist(self):
-        return Watchlist.objects.filter(user=self.request.user)
+        return self.model.objects.filter(**self._get_owner_kwargs())
+
+    def _get_owner_kwargs(self):
+        """Return the field values that assign a watchlist item to its owner."""
+        return {"user": self.user}
+
+    async def _aget_owner_kwargs(self):
+        """Async version of ``_get_owner_kwargs``."""
+        return self._get_owner_kwargs()
 
     def _get_model_watchlist(self, model):
         return self.get_watchlist().filter(content_type=self.get_content_type(model))
@@ -271,20 +877,54 @@ class ModelManager(BaseManager):
     def _on_watchlist(self, obj):
         return self.get_model_watchlist(obj).filter(object_id=obj.pk).exists()
 
+    def membership(self, objects):
+        objects_by_model = _group_by_model(objects)
+        if not objects_by_model:
+            return {}
+        content_types = ContentType.objects.get_for_models(*objects_by_model)
+        # Query the watchlist items of all models at once:
+        lookup = Q()
+        for model, pks in objects_by_model.items():
+            lookup |= Q(content_type=content_types[model], object_id__in=pks)
+        watched = set(self.get_watchlist().filter(lookup).values_list("content_type", "object_id"))
+        return {
+            (model._meta.label_lower, pk): (content_types[model].pk, pk) in watched
+            for model, pks in objects_by_model.items()
+            for pk in pks
+        }
+
     def add(self, obj):
         if not self.on_watchlist(obj):
             self._create(obj).save()
+            self._clear_counts()
 
     def remove(self, obj):
-        self.remove_object_id(self.get_model_watchlist(obj), obj.pk)
+        if self.remove_object_id(self.get_model_watchlist(obj), obj.pk):
+            self._clear_counts()
+
+    def set_on_watchlist(self, obj, on_watchlist):
+        if on_watchlist:
+            self.add(obj)
+            return True
+        self.remove(obj)
+        return False
 
     def remove_object_id(self, model_watchlist, object_id):
-        model_watchlist.filter(object_id=object_id).delete()
+        deleted, _ = model_watchlist.filter(object_id=object_id).delete()
+        return deleted
+
+    def _get_on_watchlist_expression(self, model, lookup="pk"):
+        return Exists(self.get_model_watchlist(model).filter(object_id=OuterRef(lookup)))
+
+    def _get_added_expression(self, model):
+        model_watchlist = self.get_model_watchlist(model).filter(object_id=OuterRef("pk"))
+        return Subquery(model_watchlist.order_by().values("time_added")[:1])
 
     def as_dict(self):
         watchlist = self.get_watchlist()
         result = {}
-        for ct_id in watchlist.values_list("content_type", flat=True).distinct():
+        # Clear the default ordering; its fields would be part of the DISTINCT.
+        for ct_id in watchlist.values_list("content_type", flat=True).order_by().distinct():
             ct = ContentType.objects.get(pk=ct_id)
             model = ct.model_class()
             model_watchlist = self.get_model_watchlist(model)
@@ -300,6 +940,7 @@ class ModelManager(BaseManager):
         for content_type in ContentType.objects.filter(pk__in=ct_pks):
             if content_type.model_class() is None:
                 watchlist.filter(content_type=content_type).delete()
+                self._clear_counts()
 
     def _prune_model_objects(self):
         ct_pks = self.get_watchlist().values("content_type").order_by("content_type").distinct()
@@ -309,12 +950,14 @@ class ModelManager(BaseManager):
             pks = self.pks(model_watchlist)
             existing = model.objects.filter(pk__in=pks).values_list("pk", flat=True)
             orphaned = set(pks) - set(existing)
-            model_watchlist.filter(object_id__in=orphaned).delete()
+            if orphaned:
+                model_watchlist.filter(object_id__in=orphaned).delete()
+                self._clear_counts()
 
     def _create(self, obj):
         """Create a Watchlist item instance for the given object."""
-        return Watchlist(
-            user=self.request.user,
+        return self.model(
+            **self._get_owner_kwargs(),
             content_type=self.get_content_type(obj),
             object_id=obj.pk,
             object_repr=str(obj),
@@ -329,12 +972,287 @@ class ModelManager(BaseManager):
             _models = set(obj._meta.model for obj in objects)
 
         existing = {model: self.get_model_watchlist(model).values_list("object_id", flat=True) for model in _models}
-        new = []
-        for obj in objects:
-            if obj.pk not in existing[obj._meta.model]:
-                new.append(self._create(obj))
-        Watchlist.objects.bulk_create(new)
+        new = [self._create(obj) for obj in objects if obj.pk not in existing[obj._meta.model]]
+        if new:
+            self.model.objects.bulk_create(new)
+            self._clear_counts()
 
     def remove_model(self, model):
         content_type = self.get_content_type(model)
-        self.get_watchlist().filter(content_type=content_type).delete()
+        deleted, _ = self.get_watchlist().filter(content_type=content_type).delete()
+        if deleted:
+            self._clear_counts()
+
+    def _get_cache_key(self, name):
+        """
+        Return the cache key for the watchlist data with the given name.
+
+        Subclasses may return None if the watchlist has no owner yet; the data
+        is then not cached.
+        """
+        return f"mizdb_watchlist:{name}:user:{self.user.pk}"
+
+    def get_counts(self):
+        key = self._get_cache_key("counts")
+        counts = _get_cache().get(key) if key else None
+        if counts is None:
+            counts = self._count_items()
+            if key:
+                _get_cache().set(key, counts, _get_cache_timeout())
+        return counts
+
+    def get_version(self):
+        # Items are only ever added (which raises the latest time_added) or
+        # removed (which lowers the count), so the combination of both changes
+        # with every change to the watchlist.
+        aggregate = self.get_watchlist().aggregate(count=Count("pk"), last=Max("time_added"))
+        last = aggregate["last"].timestamp() if aggregate["last"] else 0
+        return f"{aggregate['count']}-{last}"
+
+    def get_model_versions(self):
+        # Same as get_version, but per content type in a single query.
+        items = self.get_watchlist().values_list("content_type__app_label", "content_type__model")
+        items = items.annotate(Count("pk"), Max("time_added")).order_by()
+        return {
+            f"{app_label}.{model_name}": f"{count}-{last.timestamp()}" for app_label, model_name, count, last in items
+        }
+
+    def _get_count_label(self, model):
+        # The items are stored and counted under the content type of the
+        # concrete model, also for proxy models.
+        return model._meta.concrete_model._meta.label_lower
+
+    def _count_items(self):
+        """Count the watchlist items per model label in a single query."""
+        items = self.get_watchlist().values_list("content_type__app_label", "content_type__model")
+        items = items.annotate(Count("pk")).order_by()
+        return {f"{app_label}.{model_name}": count for app_label, model_name, count in items}
+
+    def _clear_counts(self):
+        """
+        Discard the cached item counts after a change to the watchlist.
+
+        The counts are counted again on the next request for them. Deleting the
+        cache entry (instead of updating the cached counts) cannot lose
+        concurrent updates.
+        """
+        if key := self._get_cache_key("counts"):
+            _get_cache().delete(key)
+
+    async def aget_content_type(self, model):
+        """Return the ContentType for the given model."""
+        opts = model._meta.concrete_model._meta
+        content_type, _created = await ContentType.objects.aget_or_create(
+            app_label=opts.app_label, model=opts.model_name
+        )
+        return content_type
+
+    def _aget_model_watchlist(self, model):
+        """
+        Return the watchlist for the given model.
+
+        Filters by the natural key of the model's content type instead of
+        fetching the ContentType instance.
+        """
+        opts = model._meta.concrete_model._meta
+        return self.get_watchlist().filter(content_type__app_label=opts.app_label, content_type__model=opts.model_name)
+
+    async def _acreate(self, obj):
+        """Create a Watchlist item instance for the given object."""
+        return self.model(
+            **await self._aget_owner_kwargs(),
+            content_type=await self.aget_content_type(obj),
+            object_id=obj.pk,
+            object_repr=str(obj),
+        )
+
+    async def aon_watchlist(self, obj):
+        return await self._aget_model_watchlist(obj).filter(object_id=obj.pk).aexists()
+
+    async def aadd(self, obj):
+        if not await self.aon_watchlist(obj):
+            await (await self._acreate(obj)).asave()
+            await self._aclear_counts()
+
+    async def aremove(self, obj):
+        deleted, _ = await self._aget_model_watchlist(obj).filter(object_id=obj.pk).adelete()
+        if deleted:
+            await self._aclear_counts()
+
+    async def atoggle(self, obj):
+        if await self.aon_watchlist(obj):
+            await self.aremove(obj)
+            return False
+        await self.aadd(obj)
+        return True
+
+    async def aset_on_watchlist(self, obj, on_watchlist):
+        if on_watchlist:
+            await self.aadd(obj)
+            return True
+        await self.aremove(obj)
+        return False
+
+    async def abulk_add(self, objects):
+        if isinstance(objects, QuerySet):
+            objects = [obj async for obj in objects]
+        if not objects:
+            return
+        objects_by_model = {}
+        for obj in objects:
+            objects_by_model.setdefault(obj._meta.model, []).append(obj)
+        owner_kwargs = await self._aget_owner_kwargs()
+        new = []
+        for model, model_objects in objects_by_model.items():
+            model_watchlist = self._aget_model_watchlist(model).values_list("object_id", flat=True)
+            existing = {object_id async for object_id in model_watchlist}
+            new_objects = []
+            for obj in model_objects:
+                if obj.pk not in existing:
+                    existing.add(obj.pk)
+                    new_objects.append(obj)
+            if not new_objects:
+                continue
+            # Resolve the content type once per model, not once per object:
+            content_type = await self.aget_content_type(model)
+            new.extend(
+                self.model(**owner_kwargs, content_type=content_type, object_id=obj.pk, object_repr=str(obj))
+                for obj in new_objects
+            )
+        if new:
+            await self.model.objects.abulk_create(new)
+            await self._aclear_counts()
+
+    async def aremove_model(self, model):
+        deleted, _ = await self._aget_model_watchlist(model).adelete()
+        if deleted:
+            await self._aclear_counts()
+
+    async def aas_dict(self):
+        result = {}
+        items = self.get_watchlist().values_list(
+            "content_type__app_label", "content_type__model", "object_id", "object_repr"
+        )
+        async for app_label, model_name, object_id, object_repr in items.order_by("content_type", "time_added"):
+            try:
+                model = apps.get_model(app_label, model_name)
+            except LookupError:
+                continue
+            model_items = result.setdefault(model._meta.label_lower, [])
+            model_items.append({"object_id": object_id, "object_repr": object_repr})
+        return result
+
+    async def aprune(self):
+        ct_ids = self.get_watchlist().values_list("content_type", flat=True).order_by("content_type").distinct()
+        async for content_type in ContentType.objects.filter(pk__in=ct_ids):
+            model = content_type.model_class()
+            model_watchlist = self.get_watchlist().filter(content_type=content_type)
+            if model is None:
+                await model_watchlist.adelete()
+                await self._aclear_counts()
+                continue
+            pks = [pk async for pk in model_watchlist.values_list("object_id", flat=True)]
+            existing = [pk async for pk in model.objects.filter(pk__in=pks).values_list("pk", flat=True)]
+            if orphaned := set(pks) - set(existing):
+                await model_watchlist.filter(object_id__in=orphaned).adelete()
+                await self._aclear_counts()
+
+    async def aget_version(self):
+        aggregate = await self.get_watchlist().aaggregate(count=Count("pk"), last=Max("time_added"))
+        last = aggregate["last"].timestamp() if aggregate["last"] else 0
+        return f"{aggregate['count']}-{last}"
+
+    async def aget_counts(self):
+        key = self._get_cache_key("counts")
+        counts = await _get_cache().aget(key) if key else None
+        if counts is None:
+            counts = await sync_to_async(self._count_items)()
+            if key:
+                await _get_cache().aset(key, counts, _get_cache_timeout())
+        return counts
+
+    async def _aclear_counts(self):
+        """Async version of ``_clear_counts``."""
+        if key := self._get_cache_key("counts"):
+            await _get_cache().adelete(key)
+
+
+class SessionModelManager(ModelManager):
+    """
+    Manager for watchlists of anonymous users stored via the SessionWatchlist
+    model.
+
+    Unlike SessionManager, the watchlist items are stored in their own table,
+    keyed by the session key, instead of in the session data. Adding or
+    removing an item does not rewrite the session.
+
+    The items of expired sessions can be removed with the
+    ``clearwatchlistsessions`` management command.
+    """
+
+    model = SessionWatchlist
+
+    def __init__(self, request, user=None):
+        _check_session_engine()
+        super().__init__(request, user)
+
+    def get_watchlist(self):
+        if not self.request.session.session_key:
+            return self.model.objects.none()
+        return super().get_watchlist()
+
+    def _get_cache_key(self, name):
+        if session_key := self.request.session.session_key:
+            return f"mizdb_watchlist:{name}:session:{session_key}"
+        return None
+
+    def _get_owner_kwargs(self):
+        session = self.request.session
+        if not session.session_key:
+            # Create the session so that the item can be assigned to it. Mark
+            # the session as modified so that the session cookie is set.
+            session.save()
+            session.modified = True
+        return {"session_key": session.session_key}
+
+    async def _aget_owner_kwargs(self):
+        session = self.request.session
+        if not session.session_key:
+            if hasattr(session, "asave"):  # Django >= 5.1
+                await session.asave()
+            else:  # pragma: no cover
+                await sync_to_async(session.save)()
+            session.modified = True
+        return {"session_key": session.session_key}
+
+
+def _check_session_engine():
+    """
+    Raise ImproperlyConfigured if the session engine cannot be used with the
+    SessionModelManager.
+
+    With signed cookie sessions, the session key is the signed session data
+    itself: it changes with every write, exceeds the length of the
+    session_key field and cannot be checked for expiry.
+    """
+    store_class = import_module(settings.SESSION_ENGINE).SessionStore
+    if issubclass(store_class, signed_cookies.SessionStore):
+        raise ImproperlyConfigured(
+            f"SessionModelManager cannot be used with the session engine {settings.SESSION_ENGINE!r}."
+        )
+
+
+def move_session_watchlist(sender, request, user, **kwargs):
+    """
+    Move the SessionWatchlist items of the previous session key to the new
+    session key when the session key was cycled during login.
+
+    Connected to the ``user_logged_in`` signal.
+    """
+    manager_class = _get_manager_from_settings("session")
+    if request is None or manager_class is None or not issubclass(manager_class, SessionModelManager):
+        return
+    old_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    new_key = request.session.session_key
+    if old_key and new_key and old_key != new_key:
+        manager_class.model.objects.filter(session_key=old_key).update(session_key=new_key)
@@ -0,0 +1,102 @@
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+from django.db import connection
+from django.http import HttpRequest
+
+from mizdb_watchlist.instrumentation import _QueryCounter
+
+# The name of the request attribute that holds the timings of the request.
+TIMINGS_ATTR = "_watchlist_server_timing"
+
+
+class _Timing:
+    """Add the duration and the queries of the context to the timing `name`."""
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+        self.counter = _QueryCounter()
+
+    def __enter__(self):
+        self.wrapper = connection.execute_wrapper(self.counter)
+        self.wrapper.__enter__()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        self.wrapper.__exit__(*exc_info)
+        timing = self.timings.setdefault(self.name, {"duration": 0.0, "queries": 0})
+        timing["duration"] += duration
+        timing["queries"] += self.counter.queries
+
+
+def server_timing(request, name):
+    """
+    Return a context manager that adds the duration and the number of queries
+    of the context to the Server-Timing entry `name` of the request.
+
+    Does nothing unless the ServerTimingMiddleware is active.
+    """
+    timings = getattr(request, TIMINGS_ATTR, None)
+    if not isinstance(timings, dict):
+        return nullcontext()
+    return _Timing(timings, name)
+
+
+def server_timed(name):
+    """
+    Decorate a view, or a method that takes the request as its first argument,
+    to add the duration and the number of queries of each call to the
+    Server-Timing entry `name` of the request.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            request = next((arg for arg in args[:2] if isinstance(arg, HttpRequest)), None)
+            with server_timing(request, name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class ServerTimingMiddleware:
+    """
+    Add Server-Timing entries for the work done by the watchlist to the
+    responses.
+
+    Each entry gives the total duration and the number of database queries of
+    one kind of work:
+
+        - watchlist-membership: checks of the toggle_button and
+          watchlist_prefetch tags
+        - watchlist-overview: building the context of the watchlist overview,
+          with the sub-entries watchlist-prune, watchlist-as-dict and
+          watchlist-urls
+        - watchlist-toggle, watchlist-remove, watchlist-remove-all: the views
+          that change the watchlist (the async views are not timed)
+
+    Query counts only include the queries made on the default database in the
+    request's thread.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = {}
+        setattr(request, TIMINGS_ATTR, timings)
+        response = self.get_response(request)
+        if timings:
+            entries = [
+                f'{name};dur={timing["duration"] * 1000:.3f};desc="{timing["queries"]} queries"'
+                for name, timing in timings.items()
+            ]
+            if existing := response.headers.get("Server-Timing"):
+                entries.insert(0, existing)
+            response.headers["Server-Timing"] = ", ".join(entries)
+        return response
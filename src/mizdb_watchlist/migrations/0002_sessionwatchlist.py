@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("mizdb_watchlist", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SessionWatchlist",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("session_key", models.CharField(max_length=40, verbose_name="Session key")),
+                ("object_id", models.IntegerField(verbose_name="Object ID")),
+                ("object_repr", models.CharField(max_length=200, verbose_name="Object representation")),
+                ("time_added", models.DateTimeField(auto_now_add=True, verbose_name="Added at")),
+                (
+                    "content_type",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="contenttypes.contenttype"),
+                ),
+            ],
+            options={
+                "verbose_name": "Session Watchlist Item",
+                "verbose_name_plural": "Session Watchlist Items",
+                "ordering": ["session_key", "content_type", "time_added"],
+                "indexes": [
+                    models.Index(
+                        fields=["session_key", "content_type", "object_id"], name="mizdb_watch_session_cb7a0d_idx"
+                    )
+                ],
+            },
+        ),
+    ]
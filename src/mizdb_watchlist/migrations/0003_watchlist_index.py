@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("mizdb_watchlist", "0002_sessionwatchlist"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="watchlist",
+            index=models.Index(fields=["user", "content_type", "object_id"], name="mizdb_watch_user_id_a8a522_idx"),
+        ),
+    ]
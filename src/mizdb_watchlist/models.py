@@ -16,5 +16,25 @@ class Watchlist(models.Model):
 
     class Meta:
         ordering = ["user", "content_type", "time_added"]
+        indexes = [models.Index(fields=["user", "content_type", "object_id"])]
         verbose_name = _("Watchlist Item")
         verbose_name_plural = _("Watchlist Items")
+
+
+class SessionWatchlist(models.Model):
+    """Watchlist items of anonymous users, stored by the key of their session."""
+
+    session_key = models.CharField(max_length=40, verbose_name=_("Session key"))
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.IntegerField(verbose_name=_("Object ID"))
+    object_repr = models.CharField(max_length=200, verbose_name=_("Object representation"))
+    time_added = models.DateTimeField(auto_now_add=True, verbose_name=_("Added at"))
+
+    def __str__(self):
+        return f"{self.content_type.name}: {self.object_repr}"  # pragma: no cover
+
+    class Meta:
+        ordering = ["session_key", "content_type", "time_added"]
+        indexes = [models.Index(fields=["session_key", "content_type", "object_id"])]
+        verbose_name = _("Session Watchlist Item")
+        verbose_name_plural = _("Session Watchlist Items")
@@ -0,0 +1,166 @@
+"""
+A panel for the Django Debug Toolbar that shows the watchlist work of a request.
+
+Add it to the panels of the toolbar:
+
+    DEBUG_TOOLBAR_PANELS = [
+        ...,
+        "mizdb_watchlist.panels.WatchlistPanel",
+    ]
+
+The panel lists the managers created with `get_manager`, the watchlist status
+lookups of the toggle buttons, the manager operations with their SQL, and the
+size of the session data read and written. While the panel records a request,
+the managers are instrumented regardless of the `instrumentation` setting.
+"""
+
+import inspect
+import traceback
+from collections import Counter
+
+from debug_toolbar.panels import Panel
+from django.dispatch import Signal
+from django.utils.translation import gettext, ngettext
+from django.utils.translation import gettext_lazy as _
+
+from mizdb_watchlist.debug import ANNOTATION, FALLBACK, PREFETCH, membership_check
+from mizdb_watchlist.instrumentation import manager_operation
+from mizdb_watchlist.manager import SessionManager, _instrument_managers, manager_created
+
+# Frames of these files are skipped when looking for the caller of get_manager.
+_SKIP_FILES = (__file__, inspect.getfile(SessionManager), inspect.getfile(Signal))
+
+
+def _get_caller():
+    """Return a description of the code that called get_manager."""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename in _SKIP_FILES:
+            continue
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return ""  # pragma: no cover
+
+
+def _get_session_size(session):
+    """Return the size in bytes of the encoded session data."""
+    return len(session.encode(dict(session.items())))
+
+
+class WatchlistPanel(Panel):
+    """Show the managers, status lookups and operations of the watchlist."""
+
+    title = _("Watchlist")
+    template = "mizdb_watchlist/debug_toolbar/panel.html"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._managers = []
+        self._checks = []
+        self._operations = []
+        self._session_read = None
+        self._session_manager_created = False
+
+    @property
+    def nav_subtitle(self):
+        stats = self.get_stats()
+        if not stats:
+            return ""
+        return ngettext("%(count)d operation", "%(count)d operations", len(stats["operations"])) % {
+            "count": len(stats["operations"])
+        }
+
+    def enable_instrumentation(self):
+        self._instrument_token = _instrument_managers.set(True)
+        manager_created.connect(self._record_manager)
+        membership_check.connect(self._record_check)
+        manager_operation.connect(self._record_operation)
+
+    def disable_instrumentation(self):
+        manager_operation.disconnect(self._record_operation)
+        membership_check.disconnect(self._record_check)
+        manager_created.disconnect(self._record_manager)
+        _instrument_managers.reset(self._instrument_token)
+
+    def _record_manager(self, sender, request, manager, **kwargs):
+        if request is not self.toolbar.request:
+            return
+        self._managers.append({"manager": sender.__name__, "caller": _get_caller()})
+        if isinstance(manager, SessionManager) and not manager.client_side:
+            self._session_manager_created = True
+            self._record_session_read(request)
+
+    def _record_session_read(self, request):
+        """
+        Record the size of the session data as it was read from the session
+        store.
+
+        The size can only be taken while the session data is loaded and not
+        yet modified. The panel does not load the session by itself, so that
+        it does not add a read to the request.
+        """
+        session = getattr(request, "session", None)
+        if (
+            self._session_read is None
+            and self._session_manager_created
+            and session is not None
+            and hasattr(session, "_session_cache")
+            and not session.modified
+        ):
+            self._session_read = _get_session_size(session)
+
+    def _record_check(self, sender, request, obj, source, template_name, **kwargs):
+        if request is not self.toolbar.request:
+            return
+        self._checks.append(
+            {
+                "model": sender._meta.label_lower,
+                "pk": str(obj.pk),
+                "source": source,
+                "template": template_name or "",
+            }
+        )
+
+    def _record_operation(self, sender, manager, operation, duration, queries, rows, sql=(), **kwargs):
+        if manager.request is not self.toolbar.request:
+            return
+        self._record_session_read(manager.request)
+        self._operations.append(
+            {
+                "manager": sender.__name__,
+                "operation": operation,
+                "duration": duration * 1000,
+                "queries": queries,
+                "rows": rows,
+                "sql": [f"{statement} -- {params!r}" if params else statement for statement, params in sql],
+            }
+        )
+
+    def generate_stats(self, request, response):
+        self._record_session_read(request)
+        session = getattr(request, "session", None)
+        session_written = None
+        if session is not None and session.modified:
+            session_written = _get_session_size(session)
+        sources = Counter(check["source"] for check in self._checks)
+        warnings = []
+        if sources[FALLBACK]:
+            warnings.append(
+                gettext(
+                    "%(count)d toggle button(s) looked up the watchlist status by themselves. Use WatchlistMixin, "
+                    "annotate the queryset or use the watchlist_prefetch tag."
+                )
+                % {"count": sources[FALLBACK]}
+            )
+        if session_written is not None and request.method in ("GET", "HEAD"):
+            warnings.append(gettext("The session was written on a %(method)s request.") % {"method": request.method})
+        self.record_stats(
+            {
+                "managers": self._managers,
+                "checks": self._checks,
+                "check_counts": {source: sources[source] for source in (ANNOTATION, PREFETCH, FALLBACK)},
+                "operations": self._operations,
+                "prunes": [operation for operation in self._operations if operation["operation"] == "prune"],
+                "session_read": self._session_read,
+                "session_written": session_written,
+                "warnings": warnings,
+            }
+        )
@@ -5,6 +5,133 @@
  */
 
 const WatchlistButton = (() => {
+  /**
+   * The watchlist of an anonymous user in client-side storage mode.
+   *
+   * The watchlist is kept in a cookie as a mapping of model label to a list of
+   * object ids, so that the server can annotate and filter querysets, render
+   * the watchlist overview and make changes of its own (e.g. removing items
+   * of deleted objects, see mizdb_watchlist.manager.ClientManager). The
+   * cookie is the source of truth; the watchlist is copied to the browser's
+   * local storage, which is only used if the cookie is missing.
+   */
+  const ClientStorage = (() => {
+    const storageKey = 'mizdb_watchlist'
+    const cookieName = 'mizdb_watchlist'
+    const cookieMaxAge = 60 * 60 * 24 * 365
+
+    /**
+     * Return the watchlist stored in the cookie, or null if there is no
+     * cookie.
+     *
+     * Cookie format: <model_label>:<id>-<id>-...|<model_label>:<id>-...
+     */
+    function readCookie () {
+      const cookie = document.cookie.split(';').map(c => c.trim()).find(c => c.startsWith(cookieName + '='))
+      if (cookie === undefined) return null
+      const watchlist = {}
+      cookie.substring(cookieName.length + 1).split('|').forEach((modelWatchlist) => {
+        const [modelLabel, ids] = modelWatchlist.split(':')
+        if (modelLabel && ids) watchlist[modelLabel] = ids.split('-').map(Number).filter(Number.isInteger)
+      })
+      return watchlist
+    }
+
+    /**
+     * Return the watchlist from the cookie, or from the local storage if
+     * there is no cookie (e.g. because it has expired).
+     */
+    function load () {
+      const watchlist = readCookie()
+      if (watchlist !== null) return watchlist
+      try {
+        const stored = window.localStorage.getItem(storageKey)
+        if (stored !== null) return JSON.parse(stored)
+      } catch (error) {
+        console.log(`could not read watchlist from local storage: ${error}`)
+      }
+      return {}
+    }
+
+    /**
+     * Save the watchlist to the local storage and update the cookie.
+     */
+    function save (watchlist) {
+      try {
+        window.localStorage.setItem(storageKey, JSON.stringify(watchlist))
+      } catch (error) {
+        console.log(`could not save watchlist to local storage: ${error}`)
+      }
+      const value = Object.entries(watchlist)
+        .filter(([, ids]) => ids.length)
+        .map(([modelLabel, ids]) => `${modelLabel}:${ids.join('-')}`)
+        .join('|')
+      document.cookie = `${cookieName}=${value}; path=/; max-age=${cookieMaxAge}; SameSite=Lax`
+    }
+
+    function has (modelLabel, objectId) {
+      return (load()[modelLabel] || []).includes(Number(objectId))
+    }
+
+    /**
+     * Add the object to the watchlist, or remove it if it is already on the
+     * watchlist. Return whether the object is now on the watchlist.
+     *
+     * If maxItems is given, the object is not added if the watchlist already
+     * holds that many items (see the ``session_max_items`` setting), so that
+     * the cookie stays below the browser's size limit.
+     */
+    function toggle (modelLabel, objectId, maxItems) {
+      const watchlist = load()
+      const ids = watchlist[modelLabel] || []
+      const index = ids.indexOf(Number(objectId))
+      if (index === -1) {
+        if (maxItems !== undefined && total(watchlist) >= Number(maxItems)) return false
+        ids.push(Number(objectId))
+      } else {
+        ids.splice(index, 1)
+      }
+      watchlist[modelLabel] = ids
+      save(watchlist)
+      return index === -1
+    }
+
+    function remove (modelLabel, objectId) {
+      const watchlist = load()
+      watchlist[modelLabel] = (watchlist[modelLabel] || []).filter(id => id !== Number(objectId))
+      save(watchlist)
+    }
+
+    function removeModel (modelLabel) {
+      const watchlist = load()
+      delete watchlist[modelLabel]
+      save(watchlist)
+    }
+
+    function total (watchlist) {
+      return Object.values(watchlist).reduce((sum, ids) => sum + ids.length, 0)
+    }
+
+    /**
+     * Return the total number of items on the watchlist.
+     */
+    function count () {
+      return total(load())
+    }
+
+    return { load, save, has, toggle, remove, removeModel, count }
+  })()
+
+  /**
+   * Return whether the button acts on the client-side watchlist instead of
+   * making requests to the server.
+   *
+   * @param {HTMLButtonElement} btn the watchlist button
+   */
+  function isClientSide (btn) {
+    return btn.dataset.storage === 'client'
+  }
+
   /**
    * Return the CSRF token.
    *
@@ -42,12 +169,14 @@ const WatchlistButton = (() => {
    * The model object is described by the attributes set in the button's dataset.
    *
    * @param {HTMLButtonElement} btn the watchlist button
+   * @param {Object} data optional additional form data
    * @returns a new Request instance
    */
-  function getRequest (btn) {
+  function getRequest (btn, data = {}) {
     const form = new FormData()
     form.append('object_id', btn.dataset.objectId)
     form.append('model_label', btn.dataset.modelLabel)
+    Object.entries(data).forEach(([name, value]) => form.append(name, value))
     return new Request(btn.dataset.url, {
       method: 'POST',
       headers: {
@@ -84,15 +213,303 @@ const WatchlistButton = (() => {
   }
 
   /**
-   * Initialize a watchlist button, adding a click event handler.
+   * Remove the watchlist item of the clicked button from the overview.
+   *
+   * @param {HTMLButtonElement} btn the 'remove' button that was clicked
+   */
+  function removeItem (btn) {
+    if (btn.closest('.watchlist-items-list').children.length === 1) {
+      // This is the only watchlist item for that model - remove the
+      // model container.
+      removeModel(btn)
+    } else {
+      // Remove just this watchlist item.
+      btn.closest('.watchlist-item').remove()
+    }
+  }
+
+  /**
+   * Set or unset the 'on-watchlist' class of a toggle button.
+   *
+   * @param {HTMLButtonElement} btn the toggle button
+   * @param {Boolean} onWatchlist whether the button's object is on the watchlist
+   */
+  function setOnWatchlist (btn, onWatchlist) {
+    if (onWatchlist) {
+      btn.classList.add('on-watchlist')
+    } else {
+      btn.classList.remove('on-watchlist')
+    }
+  }
+
+  /**
+   * Return the CSS selector for the watchlist buttons of the given class and
+   * model, and, if given, object.
+   *
+   * @param {String} cls the class of the buttons (e.g. 'watchlist-toggle-btn')
+   * @param {String} modelLabel the model label of the buttons
+   * @param {String} objectId an optional object id
+   */
+  function selector (cls, modelLabel, objectId) {
+    let selector = `.${cls}[data-model-label="${modelLabel}"]`
+    if (objectId !== undefined) selector += `[data-object-id="${objectId}"]`
+    return selector
+  }
+
+  /**
+   * Set or unset the 'on-watchlist' class of the given toggle button and of
+   * all other toggle buttons for the same object on the page.
+   *
+   * @param {HTMLButtonElement} btn the toggle button
+   * @param {Boolean} onWatchlist whether the button's object is on the watchlist
+   */
+  function setObjectOnWatchlist (btn, onWatchlist) {
+    setOnWatchlist(btn, onWatchlist)
+    const { modelLabel, objectId } = btn.dataset
+    document.querySelectorAll(selector('watchlist-toggle-btn', modelLabel, objectId)).forEach((other) => {
+      setOnWatchlist(other, onWatchlist)
+    })
+  }
+
+  /**
+   * Update the watchlist item count badges (see the watchlist_link template
+   * tag) with the count included in the response data.
+   *
+   * @param {Object} data the data returned by a watchlist view
+   */
+  function updateCount (data) {
+    if (!data || data.count === undefined) return
+    document.querySelectorAll('.watchlist-count').forEach((badge) => { badge.textContent = data.count })
+  }
+
+  /**
+   * Synchronize the watchlist buttons of all tabs (of the same origin).
+   *
+   * Every change to the watchlist is broadcast to the other tabs, which then
+   * update their toggle buttons, overview items and count badges in place,
+   * without making requests to the server. Uses a BroadcastChannel, or,
+   * where that is not available, 'storage' events of the local storage.
+   *
+   * Messages have a ``type`` ('toggle', 'remove' or 'removeModel'), the
+   * ``modelLabel``, the ``objectId`` (except for 'removeModel'), the new
+   * ``onWatchlist`` state (for 'toggle') and the new item ``count``.
+   */
+  const TabSync = (() => {
+    const channelName = 'mizdb_watchlist'
+    const storageKey = 'mizdb_watchlist_sync'
+    const channel = typeof BroadcastChannel === 'function' ? new BroadcastChannel(channelName) : null
+
+    /**
+     * Update the buttons and overview items of this tab according to the
+     * given message.
+     */
+    function apply (message) {
+      const { type, modelLabel, objectId } = message
+      if (type === 'toggle' || type === 'remove') {
+        const onWatchlist = type === 'toggle' && message.onWatchlist
+        document.querySelectorAll(selector('watchlist-toggle-btn', modelLabel, objectId)).forEach((btn) => {
+          // Leave buttons with a pending request of this tab alone:
+          if (!toggleStates.has(`${modelLabel}:${objectId}`)) setOnWatchlist(btn, onWatchlist)
+        })
+        if (!onWatchlist) {
+          document.querySelectorAll(selector('watchlist-remove-btn', modelLabel, objectId)).forEach(removeItem)
+        }
+      } else if (type === 'removeModel') {
+        document.querySelectorAll(selector('watchlist-toggle-btn', modelLabel)).forEach((btn) => setOnWatchlist(btn, false))
+        document.querySelectorAll(selector('watchlist-remove-all-btn', modelLabel)).forEach(removeModel)
+      }
+      updateCount(message)
+    }
+
+    /**
+     * Send the message to the other tabs.
+     */
+    function post (message) {
+      if (channel) {
+        channel.postMessage(message)
+        return
+      }
+      try {
+        // Add a timestamp so that repeated messages still change the value:
+        window.localStorage.setItem(storageKey, JSON.stringify({ ...message, timestamp: Date.now() }))
+      } catch (error) {
+        console.log(`could not broadcast watchlist change: ${error}`)
+      }
+    }
+
+    if (channel) {
+      channel.addEventListener('message', (event) => apply(event.data))
+    } else {
+      window.addEventListener('storage', (event) => {
+        if (event.key === storageKey && event.newValue) apply(JSON.parse(event.newValue))
+      })
+    }
+
+    return { apply, post }
+  })()
+
+  /**
+   * Handle a click on a watchlist button that acts on the client-side
+   * watchlist.
+   *
+   * Calls ``handleClick`` with the clicked button instead of making a
+   * request. Then, if provided, ``callback`` will be called with the button
+   * and the data returned by ``handleClick``.
+   *
+   * @param {HTMLButtonElement} btn the button that was clicked
+   * @param {CallableFunction} handleClick a function that updates the client-side watchlist
+   * @param {CallableFunction} callback an optional function called at the end of the click event handling
+   */
+  function clickClientButton (btn, handleClick, callback) {
+    const data = handleClick(btn)
+    updateCount(data)
+    if (callback) callback(btn, data)
+  }
+
+  /**
+   * Handle a click on a watchlist button.
+   *
+   * Makes a request against the URL declared in the button's dataset
+   * property. ``handleResponse`` will be called with the clicked button and
+   * the response to act on the response. Then, if provided, ``callback`` will
+   * be called with the button and the data returned by ``handleResponse``.
+   *
+   * @param {HTMLButtonElement} btn the button that was clicked
+   * @param {CallableFunction} handleResponse a function that handles the response
+   * @param {CallableFunction} callback an optional function called at the end of the click event handling
+   */
+  function clickButton (btn, handleResponse, callback) {
+    fetch(getRequest(btn))
+      .then(response => handleResponse(btn, response))
+      .then(data => {
+        updateCount(data)
+        if (callback) { callback(btn, data) }
+      })
+      .catch((error) => console.log(`watchlist button ${btn} error: ${error}`))
+  }
+
+  /**
+   * The state of the toggle requests per object ('<model_label>:<object_id>').
+   *
+   * ``confirmed`` is the last state confirmed by the server, ``desired`` the
+   * state that the user wants after their last click. ``inFlight`` is true
+   * while a request for the object is pending.
+   */
+  const toggleStates = new Map()
+
+  /**
+   * Toggle the button's object on the server, updating the button and the
+   * other toggle buttons of the same object on the page right away.
+   *
+   * Clicks made while a request for the object is pending are coalesced:
+   * when the request completes, at most one more request is sent with the
+   * state the user wants after their last click. The requests ask for that
+   * state explicitly instead of toggling, so they cannot cancel each other
+   * out. If a request fails, the buttons are reset to the last state
+   * confirmed by the server.
+   *
+   * @param {HTMLButtonElement} btn the toggle button that was clicked
+   * @param {CallableFunction} callback an optional function called with the button and the response data
+   */
+  function toggleOptimistically (btn, callback) {
+    const key = `${btn.dataset.modelLabel}:${btn.dataset.objectId}`
+    const onWatchlist = btn.classList.contains('on-watchlist')
+    const state = toggleStates.get(key) || { confirmed: onWatchlist, inFlight: false }
+    state.desired = !onWatchlist
+    toggleStates.set(key, state)
+    setObjectOnWatchlist(btn, state.desired)
+    if (!state.inFlight) sendToggleState(btn, key, state, callback)
+  }
+
+  /**
+   * Request the desired state of the object, unless the server already
+   * confirmed it. See ``toggleOptimistically``.
+   */
+  function sendToggleState (btn, key, state, callback) {
+    if (state.desired === state.confirmed) {
+      toggleStates.delete(key)
+      return
+    }
+    state.inFlight = true
+    const requested = state.desired
+    fetch(getRequest(btn, { on_watchlist: requested }))
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`Toggle response was not ok (status code: ${response.status})`)
+        }
+        return response.json()
+      })
+      .then(data => {
+        state.inFlight = false
+        state.confirmed = data.on_watchlist
+        updateCount(data)
+        TabSync.post({
+          type: 'toggle',
+          modelLabel: btn.dataset.modelLabel,
+          objectId: btn.dataset.objectId,
+          onWatchlist: data.on_watchlist,
+          count: data.count
+        })
+        if (state.confirmed !== requested) {
+          // The server did not apply the requested state (e.g. because the
+          // watchlist is full): discard any pending clicks.
+          state.desired = state.confirmed
+          setObjectOnWatchlist(btn, state.confirmed)
+        }
+        if (state.desired !== state.confirmed) {
+          sendToggleState(btn, key, state, callback)
+          return
+        }
+        toggleStates.delete(key)
+        if (callback) callback(btn, data)
+      })
+      .catch((error) => {
+        toggleStates.delete(key)
+        setObjectOnWatchlist(btn, state.confirmed)
+        console.log(`watchlist button ${btn} error: ${error}`)
+      })
+  }
+
+  /**
+   * Handle a click on a watchlist button with the click handlers of its
+   * button type.
    *
-   * The event handler will make a request against the URL declared in
-   * the button's dataset property. The second argument ``handleResponse``
-   * will be called with the clicked button and the response to act on the
-   * response.
+   * @param {HTMLButtonElement} btn the button that was clicked
+   * @param {Object} handlers the click handlers of the button type
+   */
+  function clickWithHandlers (btn, handlers) {
+    if (isClientSide(btn)) {
+      clickClientButton(btn, handlers.handleClick, handlers.callback)
+    } else if (handlers.click) {
+      handlers.click(btn)
+    } else {
+      clickButton(btn, handlers.handleResponse, handlers.callback)
+    }
+  }
+
+  /**
+   * Initialize a watchlist button that acts on the client-side watchlist,
+   * adding a click event handler (see ``clickClientButton``).
    *
-   * Then, if provided, the third argument ``callback`` will be called with
-   * the button and the data returned by ``handleResponse``.
+   * @param {HTMLButtonElement} btn the button to initialize
+   * @param {CallableFunction} handleClick a function that updates the client-side watchlist
+   * @param {CallableFunction} callback an optional function called at the end of the click event handling
+   */
+  function initClientButton (btn, handleClick, callback) {
+    if (btn.initialized) {
+      console.log(`${btn} already initialized.`)
+      return
+    }
+    btn.addEventListener('click', (event) => {
+      event.preventDefault()
+      clickClientButton(btn, handleClick, callback)
+    })
+    btn.initialized = true
+  }
+
+  /**
+   * Initialize a watchlist button, adding a click event handler (see
+   * ``clickButton``).
    *
    * @param {HTMLButtonElement} btn the button to initialize
    * @param {CallableFunction} handleResponse a function that handles the response
@@ -105,10 +522,105 @@ const WatchlistButton = (() => {
     }
     btn.addEventListener('click', (event) => {
       event.preventDefault()
-      fetch(getRequest(btn))
-        .then(response => handleResponse(btn, response))
-        .then(data => { if (callback) { callback(btn, data) } })
-        .catch((error) => console.log(`watchlist button ${btn} error: ${error}`))
+      clickButton(btn, handleResponse, callback)
+    })
+    btn.initialized = true
+  }
+
+  /**
+   * Return the click handlers of a 'toggle' button that adds an item to the
+   * watchlist, or removes an item from the watchlist if it is already on the
+   * watchlist. Server-side toggles are handled by ``click`` (see
+   * ``toggleOptimistically``), client-side toggles by ``handleClick``.
+   *
+   * @param {CallableFunction} callback an optional function called at the end of the click event handling
+   */
+  function getToggleHandlers (callback) {
+    return {
+      click: (btn) => toggleOptimistically(btn, callback),
+      handleClick: (btn) => {
+        const { modelLabel, objectId, maxItems } = btn.dataset
+        const onWatchlist = ClientStorage.toggle(modelLabel, objectId, maxItems)
+        const count = ClientStorage.count()
+        TabSync.post({ type: 'toggle', modelLabel, objectId, onWatchlist, count })
+        setObjectOnWatchlist(btn, onWatchlist)
+        return { on_watchlist: onWatchlist, count }
+      },
+      callback
+    }
+  }
+
+  /**
+   * Return the click handlers of a 'remove' button that removes a single item
+   * from the watchlist. Used on the watchlist overview.
+   *
+   * @param {CallableFunction} callback an optional function called at the end of the click event handling
+   */
+  function getRemoveHandlers (callback) {
+    return {
+      handleClick: (btn) => {
+        const { modelLabel, objectId } = btn.dataset
+        ClientStorage.remove(modelLabel, objectId)
+        removeItem(btn)
+        const count = ClientStorage.count()
+        TabSync.post({ type: 'remove', modelLabel, objectId, count })
+        return { count }
+      },
+      handleResponse: (btn, response) => {
+        if (!response.ok) return response.json()
+        removeItem(btn)
+        return response.json().then((data) => {
+          const { modelLabel, objectId } = btn.dataset
+          TabSync.post({ type: 'remove', modelLabel, objectId, count: data.count })
+          return data
+        })
+      },
+      callback
+    }
+  }
+
+  /**
+   * Return the click handlers of a 'remove all' button that removes all items
+   * of a model from the watchlist. Used on the watchlist overview.
+   *
+   * @param {CallableFunction} callback an optional function called at the end of the click event handling
+   */
+  function getRemoveAllHandlers (callback) {
+    return {
+      handleClick: (btn) => {
+        const { modelLabel } = btn.dataset
+        ClientStorage.removeModel(modelLabel)
+        removeModel(btn)
+        const count = ClientStorage.count()
+        TabSync.post({ type: 'removeModel', modelLabel, count })
+        return { count }
+      },
+      handleResponse: (btn, response) => {
+        if (!response.ok) return response.json()
+        removeModel(btn)
+        return response.json().then((data) => {
+          TabSync.post({ type: 'removeModel', modelLabel: btn.dataset.modelLabel, count: data.count })
+          return data
+        })
+      },
+      callback
+    }
+  }
+
+  /**
+   * Initialize the button with the given click handlers.
+   *
+   * @param {HTMLButtonElement} btn the button to initialize
+   * @param {Object} handlers the click handlers of the button type
+   */
+  function initWithHandlers (btn, handlers) {
+    if (btn.initialized) {
+      console.log(`${btn} already initialized.`)
+      return
+    }
+    btn.addEventListener('click', (event) => {
+      event.preventDefault()
+      clickWithHandlers(btn, handlers)
     })
     btn.initialized = true
   }
@@ -118,24 +630,8 @@ const WatchlistButton = (() => {
    * removes an item from the watchlist if it is already on the watchlist.
    */
   function initToggleButton (btn, callback) {
-    const _callback = (btn, data) => {
-      // always toggle the 'on-watchlist' class
-      if (data) {
-        if (data.on_watchlist) {
-          btn.classList.add('on-watchlist')
-        } else {
-          btn.classList.remove('on-watchlist')
-        }
-      }
-      if (callback) callback(btn, data)
-    }
-    const handleResponse = (btn, response) => {
-      if (!response.ok) {
-        throw new Error(`Toggle response was not ok (status code: ${response.status})`)
-      }
-      return response.json()
-    }
-    initButton(btn, handleResponse, _callback)
+    if (isClientSide(btn)) setOnWatchlist(btn, ClientStorage.has(btn.dataset.modelLabel, btn.dataset.objectId))
+    initWithHandlers(btn, getToggleHandlers(callback))
   }
 
   /**
@@ -143,20 +639,7 @@ const WatchlistButton = (() => {
    * watchlist. Used on the watchlist overview.
    */
   function initRemoveButton (btn, callback) {
-    const handleResponse = (btn, response) => {
-      if (response.ok) {
-        if (btn.closest('.watchlist-items-list').children.length === 1) {
-          // This is the only watchlist item for that model - remove the
-          // model container.
-          removeModel(btn)
-        } else {
-          // Remove just this watchlist item.
-          btn.closest('.watchlist-item').remove()
-        }
-      }
-      return response.json()
-    }
-    initButton(btn, handleResponse, callback)
+    initWithHandlers(btn, getRemoveHandlers(callback))
   }
 
   /**
@@ -164,18 +647,59 @@ const WatchlistButton = (() => {
    * the watchlist. Used on the watchlist overview.
    */
   function initRemoveAllButton (btn, callback) {
-    const handleResponse = (btn, response) => {
-      if (response.ok) removeModel(btn)
-      return response.json()
+    initWithHandlers(btn, getRemoveAllHandlers(callback))
+  }
+
+  /**
+   * Handle the clicks on all watchlist buttons within ``root`` with a single
+   * event listener.
+   *
+   * The buttons do not need to be initialized, and buttons that are added to
+   * the page later (for example by infinite scrolling) are handled as well.
+   * Buttons that were initialized individually are left to their own click
+   * event handlers.
+   *
+   * Client-side toggle buttons are not synced with the local storage when
+   * the page loads; their state is rendered from the watchlist cookie by the
+   * server.
+   *
+   * @param {Node} root the element (or document) that contains the buttons
+   * @param {Object} callbacks optional callbacks per button type: 'toggle', 'remove' and 'removeAll'
+   */
+  function delegate (root = document, callbacks = {}) {
+    if (root.watchlistDelegated) {
+      console.log(`${root} already delegates watchlist button clicks.`)
+      return
     }
-    initButton(btn, handleResponse, callback)
+    const buttonTypes = [
+      ['.watchlist-toggle-btn', getToggleHandlers(callbacks.toggle)],
+      ['.watchlist-remove-btn', getRemoveHandlers(callbacks.remove)],
+      ['.watchlist-remove-all-btn', getRemoveAllHandlers(callbacks.removeAll)]
+    ]
+    root.addEventListener('click', (event) => {
+      if (!(event.target instanceof Element)) return
+      for (const [selector, handlers] of buttonTypes) {
+        const btn = event.target.closest(selector)
+        if (!btn || !root.contains(btn)) continue
+        if (btn.initialized) return
+        event.preventDefault()
+        clickWithHandlers(btn, handlers)
+        return
+      }
+    })
+    root.watchlistDelegated = true
   }
 
   return {
     initToggleButton,
     initRemoveButton,
     initRemoveAllButton,
-    initButton
+    initButton,
+    initClientButton,
+    delegate,
+    updateCount,
+    ClientStorage,
+    TabSync
   }
 })()
 
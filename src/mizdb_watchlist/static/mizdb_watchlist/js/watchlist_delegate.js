@@ -0,0 +1,10 @@
+/**
+ * mizdb_watchlist
+ *
+ * Handle the clicks on all watchlist buttons in this document, including
+ * buttons that are added later, with a single event listener.
+ *
+ * Use instead of watchlist_init.js.
+ */
+
+window.WatchlistButton.delegate(document)
@@ -1,28 +1,203 @@
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, Optional
 
 from django import template
+from django.conf import settings
+from django.core.signals import setting_changed
 from django.db.models import Model
+from django.dispatch import receiver
 from django.http import HttpRequest
-from django.urls import NoReverseMatch, reverse
+from django.template.loader import render_to_string
+from django.urls import NoReverseMatch, get_script_prefix, get_urlconf, reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language, gettext
 
-from mizdb_watchlist.manager import get_manager
+from mizdb_watchlist.debug import ANNOTATION, FALLBACK, PREFETCH, membership_check, record_fallback_lookup
+from mizdb_watchlist.manager import _get_manager_class, _get_session_max_items, get_manager
+from mizdb_watchlist.middleware import server_timing
 
 register = template.Library()
 
+# The name of the request attribute that holds the membership resolved by
+# the watchlist_prefetch tag.
+PREFETCH_ATTR = "_watchlist_membership"
 
-@register.inclusion_tag("mizdb_watchlist/watchlist_link.html")
-def watchlist_link(view_name: str, icon: bool = True) -> dict:
+# The name of the request attribute that marks that the icon sprite was
+# rendered by the watchlist_icons tag.
+SPRITE_ATTR = "_watchlist_icon_sprite"
+
+BOOKMARK_ICON_REF = mark_safe(
+    '<svg width="24" height="24" class="feather feather-bookmark"><use href="#mizdb-watchlist-bookmark"></use></svg>'
+)
+
+
+@lru_cache(maxsize=None)
+def _get_toggle_url(urlconf, script_prefix):
+    """
+    Return the URL of the `watchlist:toggle` view for the given URLconf, or an
+    empty string if the URL cannot be reversed.
+    """
+    try:
+        return reverse("watchlist:toggle", urlconf=urlconf)
+    except NoReverseMatch:
+        return ""
+
+
+@lru_cache(maxsize=None)
+def _get_button_parts(language):
+    """Return the title and the (inline) icon markup of the toggle button."""
+    return gettext("Toggle watchlist"), mark_safe(render_to_string("mizdb_watchlist/watchlist_icon.svg"))
+
+
+def _has_icon_sprite(request):
+    """Return whether the icon sprite was rendered for the given request."""
+    return getattr(request, SPRITE_ATTR, False) is True
+
+
+@receiver(setting_changed)
+def _clear_button_caches(setting, **kwargs):
+    if setting in ("ROOT_URLCONF", "TEMPLATES"):
+        _get_toggle_url.cache_clear()
+        _get_button_parts.cache_clear()
+
+
+def _get_on_watchlist(request, obj, on_watchlist=None, template_name=None):
+    """
+    Return whether the given object is on the watchlist.
+
+    Use the given on_watchlist value or the result of a preceding
+    watchlist_prefetch tag if there is one. Otherwise, look it up with a
+    manager.
+    """
+    source = ANNOTATION
+    if on_watchlist is None:
+        prefetched = getattr(request, PREFETCH_ATTR, None)
+        if isinstance(prefetched, dict):
+            on_watchlist = prefetched.get((obj._meta.label_lower, obj.pk))
+            source = PREFETCH
+    if on_watchlist is None:
+        source = FALLBACK
+        record_fallback_lookup(request, obj, template_name)
+        with server_timing(request, "watchlist-membership"):
+            on_watchlist = get_manager(request).on_watchlist(obj)
+    membership_check.send(sender=obj.__class__, request=request, obj=obj, source=source, template_name=template_name)
+    return on_watchlist
+
+
+def _get_client_side_attrs(request):
+    """
+    Return the data attributes of a toggle button for a watchlist that is
+    stored by the client, or an empty string if it is stored on the server.
+    """
+    if not _get_manager_class(getattr(request, "user", None)).client_side:
+        return ""
+    if (max_items := _get_session_max_items()) is not None:
+        return format_html(' data-storage="client" data-max-items="{}"', max_items)
+    return mark_safe(' data-storage="client"')
+
+
+@register.inclusion_tag("mizdb_watchlist/watchlist_link.html", takes_context=True)
+def watchlist_link(context: template.Context, view_name: str, icon: bool = True, count: bool = False) -> dict:
     """
     Provide an HTML link to the watchlist.
 
     Args:
+        context (Context): the template context; must include the request if
+            `count` is True
         view_name (str): the view name to the watchlist overview
         icon (bool): whether to include an icon with the link
+        count (bool): whether to include a badge with the number of items on
+            the watchlist. The number is read from the watchlist storage;
+            managers that use the Watchlist model keep the counts cached.
+    """
+    watchlist_count = None
+    if count and context.get("request") is not None:
+        watchlist_count = get_manager(context["request"]).count()
+    return {"view_name": view_name, "icon": icon, "count": count, "watchlist_count": watchlist_count}
+
+
+@register.simple_tag(takes_context=True)
+def watchlist_prefetch(
+    context: template.Context,
+    objects: Iterable[Model],
+    request: Optional[HttpRequest] = None,
+) -> str:
+    """
+    Check whether the given objects are on the watchlist and store the result
+    on the request.
+
+    Subsequent toggle_button tags for these objects read the stored result
+    instead of querying the watchlist storage for every button. The objects
+    may be of different models; managers that use the Watchlist model need
+    one query for all objects.
+
+    Args:
+        context (Context): the template context
+        objects (iterable): the model objects to check. Querysets are
+            evaluated and keep their results, so looping over them afterward
+            does not query the database again.
+        request (HttpRequest): the view's request. Defaults to the `request`
+            of the template context.
+
+    Example:
+        {% watchlist_prefetch object_list %}
+        {% for object in object_list %}
+            {{ object }}{% toggle_button request object %}
+        {% endfor %}
     """
-    return {"view_name": view_name, "icon": icon}  # pragma: no cover
+    if request is None:
+        request = context.get("request")
+    if request is None:
+        return ""
+    with server_timing(request, "watchlist-membership"):
+        membership = get_manager(request).membership(objects)
+    if hasattr(request, PREFETCH_ATTR):
+        getattr(request, PREFETCH_ATTR).update(membership)
+    else:
+        setattr(request, PREFETCH_ATTR, membership)
+    return ""
+
+
+@register.simple_tag(takes_context=True)
+def watchlist_icons(context: template.Context) -> str:
+    """
+    Render the SVG sprite with the watchlist icons.
+
+    Toggle buttons rendered after the sprite (for the same request) reference
+    the icon of the sprite instead of including the full SVG markup. The
+    sprite is rendered only once per request; if the context has no request,
+    it is rendered every time.
+
+    Example:
+        <body>
+            {% watchlist_icons %}
+            ...
+            {% for object in object_list %}
+                {% toggle_button request object %}
+            {% endfor %}
+        </body>
+    """
+    request = context.get("request")
+    if request is not None:
+        if _has_icon_sprite(request):
+            return ""
+        setattr(request, SPRITE_ATTR, True)
+    return render_to_string("mizdb_watchlist/icons.svg")
+
+
+@register.inclusion_tag("mizdb_watchlist/toggle_button.html", takes_context=True, name="toggle_button")
+def toggle_button_tag(context: template.Context, *args, **kwargs) -> dict:
+    """
+    Render a watchlist toggle button for the given model object.
+
+    Takes the same arguments as `toggle_button` and passes on the name of the
+    template that renders the button.
+    """
+    current_template = getattr(context.render_context, "template", None)
+    return toggle_button(*args, template_name=getattr(current_template, "name", None), **kwargs)
 
 
-@register.inclusion_tag("mizdb_watchlist/toggle_button.html")
 def toggle_button(
     request: HttpRequest,
     obj: Model,
@@ -30,6 +205,7 @@ def toggle_button(
     url: Optional[str] = None,
     on_watchlist: Optional[bool] = None,
     classes: str = "",
+    template_name: Optional[str] = None,
 ) -> dict:
     """
     Render a watchlist toggle button for the given model object.
@@ -48,10 +224,14 @@ def toggle_button(
         url (str): the URL for the view that handles the toggling. If None, the
             URL with the name `watchlist:toggle` will be used.
         on_watchlist (bool): indicates whether the model object is already on
-            the user's watchlist. If None, the tag will check the watchlist
-            storage. This will generate a database query if the watchlist uses
+            the user's watchlist. If None, the tag will use the result of a
+            preceding watchlist_prefetch tag, or check the watchlist storage.
+            The latter will generate a database query if the watchlist uses
             the Watchlist model!
         classes (str): additional CSS classes for the button
+        template_name (str): the name of the template that renders the
+            button; used in the messages about fallback lookups (see
+            mizdb_watchlist.debug)
 
     Example:
         In the template for a generic ListView:
@@ -74,14 +254,22 @@ def toggle_button(
         {% for object in object_list %}
             {% toggle_button view.request object on_watchlist=object.on_watchlist %}
         {% endfor %}
+
+        Or, if the queryset cannot be annotated, prefetch the watchlist status
+        in the template:
+
+        {% watchlist_prefetch object_list %}
+        {% for object in object_list %}
+            {% toggle_button view.request object %}
+        {% endfor %}
     """
     if url is None:
         try:
             url = reverse("watchlist:toggle")
         except NoReverseMatch:
             url = ""
-    if on_watchlist is None:
-        on_watchlist = get_manager(request).on_watchlist(obj)
+    on_watchlist = _get_on_watchlist(request, obj, on_watchlist, template_name)
+    client_side = _get_manager_class(getattr(request, "user", None)).client_side
     return {
         "object_id": obj.pk,
         "model_label": obj._meta.label_lower,
@@ -89,4 +277,57 @@ def toggle_button(
         "toggle_url": url,
         "on_watchlist": on_watchlist,
         "classes": classes,
+        "client_side": client_side,
+        "max_items": _get_session_max_items() if client_side else None,
+        "icon_sprite": _has_icon_sprite(request),
     }
+
+
+@register.simple_tag(takes_context=True)
+def fast_toggle_button(
+    context: template.Context,
+    request: HttpRequest,
+    obj: Model,
+    text: str = "",
+    url: Optional[str] = None,
+    on_watchlist: Optional[bool] = None,
+    classes: str = "",
+) -> str:
+    """
+    Render a watchlist toggle button for the given model object.
+
+    Takes the same arguments as `toggle_button` and renders the same markup,
+    but much faster: the toggle URL, the button title and the icon are
+    computed once, and the markup is built without rendering a template. Use
+    it on pages with many buttons. Since it does not render the template
+    `mizdb_watchlist/toggle_button.html`, overriding that template does not
+    affect this tag.
+
+    Example:
+        {% watchlist_prefetch object_list %}
+        {% for object in object_list %}
+            {% fast_toggle_button request object %}
+        {% endfor %}
+    """
+    if url is None:
+        url = _get_toggle_url(get_urlconf() or settings.ROOT_URLCONF, get_script_prefix())
+    if not url:
+        return ""
+    current_template = getattr(context.render_context, "template", None)
+    on_watchlist = _get_on_watchlist(request, obj, on_watchlist, getattr(current_template, "name", None))
+    title, icon = _get_button_parts(get_language())
+    if _has_icon_sprite(request):
+        icon = BOOKMARK_ICON_REF
+    return format_html(
+        '<button type="button" class="watchlist-btn watchlist-toggle-btn {} {}" title="{}" data-url="{}" '
+        'data-object-id="{}" data-model-label="{}"{}>{}{}</button>',
+        classes,
+        "on-watchlist" if on_watchlist else "",
+        title,
+        url,
+        obj.pk,
+        obj._meta.label_lower,
+        _get_client_side_attrs(request),
+        icon,
+        text,
+    )
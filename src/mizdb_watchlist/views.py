@@ -1,63 +1,281 @@
+import hashlib
 from collections import OrderedDict
+from functools import partial
 
+import django
 from django.apps import apps
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
 from django.core.exceptions import ObjectDoesNotExist
-from django.http import HttpResponseBadRequest, JsonResponse
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.urls import NoReverseMatch, reverse
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.translation import get_language
 from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.http import require_safe
 from django.views.generic.base import ContextMixin
 
-from mizdb_watchlist.manager import ANNOTATION_FIELD, get_manager
+from mizdb_watchlist.instrumentation import get_collector
+from mizdb_watchlist.manager import (
+    ADDED_ANNOTATION_FIELD,
+    ANNOTATION_FIELD,
+    _get_cache_alias,
+    _get_cache_timeout,
+    _get_watchable_model,
+    aget_manager,
+    get_manager,
+)
+from mizdb_watchlist.middleware import server_timed, server_timing
 
 ON_WATCHLIST_VAR = ANNOTATION_FIELD
 
+# The name of the request attribute that holds the watchlist manager of the
+# watchlist overview.
+MANAGER_ATTR = "_watchlist_manager"
+
+
+def _get_watchable_model_or_raise(model_label):
+    if (model := _get_watchable_model(model_label)) is None:
+        raise LookupError(f"'{model_label}' is not a watchable model.")
+    return model
+
 
 def _get_model_object(model_label, pk):
-    model = apps.get_model(model_label)
+    model = _get_watchable_model_or_raise(model_label)
     return model.objects.get(pk=pk)
 
 
+async def _aget_model_object(model_label, pk):
+    model = _get_watchable_model_or_raise(model_label)
+    return await model.objects.aget(pk=pk)
+
+
+def _get_requested_state(request):
+    """
+    Return the state requested with the optional POST parameter 'on_watchlist'
+    of a toggle request, or None if the parameter is missing.
+
+    Raises ValueError if the value is not 'true' or 'false'.
+    """
+    value = request.POST.get(ON_WATCHLIST_VAR)
+    if value is None:
+        return None
+    try:
+        return {"true": True, "false": False}[value.lower()]
+    except KeyError:
+        raise ValueError(f"Invalid value for {ON_WATCHLIST_VAR}: {value!r}") from None
+
+
+def _make_etag(manager, version):
+    """Return an ETag for the given version of the manager's watchlist."""
+    if version is None:
+        return None
+    user = manager.user
+    key = f"{getattr(user, 'pk', None)}:{get_language()}:{version}"
+    return quote_etag(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+
+
+def _get_not_modified_response(request, etag):
+    """
+    Return a '304 Not Modified' response if the client's copy matches the given
+    ETag. Return None otherwise.
+    """
+    if not etag or request.method not in ("GET", "HEAD"):
+        return None
+    if response := get_conditional_response(request, etag=etag):
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _add_etag(response, etag):
+    """
+    Add the ETag to the response and require clients to revalidate their copy
+    on every request. Without an ETag, the response must not be cached.
+    """
+    if etag and response.status_code == 200:
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        add_never_cache_headers(response)
+    return response
+
+
 class WatchlistViewMixin(ContextMixin):
-    """A view mixin that adds template context items for displaying the watchlist."""
+    """
+    A view mixin that adds template context items for displaying the watchlist.
+
+    Set ``watchlist_etag`` to ``True`` to send an ETag that is derived from the
+    version of the watchlist, and to answer conditional GET requests with
+    '304 Not Modified' without building the watchlist context. Only do this if
+    the template renders nothing else that may change independently of the
+    watchlist. The version does not change when a watched object is deleted
+    or renamed: a revalidated copy of the overview still shows the object
+    until the watchlist itself changes.
+
+    Set ``cache_watchlist_groups`` to ``True`` to cache the rendered HTML of
+    each model group of the overview. A group is only rendered again when the
+    watchlist items of its model change.
+    """
+
+    watchlist_etag = False
+    cache_watchlist_groups = False
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)  # noqa
+        etag = self.get_watchlist_etag(request)
+        if response := self.get_not_modified_response(request, etag):
+            return self.update_watchlist_response(request, response)
+        response = self.add_watchlist_etag(super().dispatch(request, *args, **kwargs), etag)  # noqa
+        return self.update_watchlist_response(request, response)
+
+    def get_watchlist_manager(self, request):
+        """
+        Return the watchlist manager for the given request.
+
+        The manager is created once per response, so that the changes made
+        while building the overview (i.e. pruning) can be added to the response
+        with ``update_watchlist_response``.
+        """
+        manager = getattr(request, MANAGER_ATTR, None)
+        if manager is None:
+            manager = get_manager(request)
+            setattr(request, MANAGER_ATTR, manager)
+        return manager
+
+    def update_watchlist_response(self, request, response):
+        """
+        Pass the response through the ``update_response`` hook of the manager
+        returned by ``get_watchlist_manager`` and discard the manager.
+        """
+        if (manager := request.__dict__.pop(MANAGER_ATTR, None)) is not None:
+            response = manager.update_response(response)
+        return response
+
+    def get_watchlist_etag(self, request):
+        """
+        Return the ETag for the watchlist overview of the given request, or
+        None if no ETag should be used.
+        """
+        if not self.watchlist_etag:
+            return None
+        manager = self.get_watchlist_manager(request)
+        return _make_etag(manager, manager.get_version())
+
+    def get_not_modified_response(self, request, etag):
+        """
+        Return a '304 Not Modified' response if the client's copy of the
+        overview matches the given ETag. Return None otherwise.
+        """
+        return _get_not_modified_response(request, etag)
+
+    def add_watchlist_etag(self, response, etag):
+        """
+        Add the ETag to the response and require clients to revalidate their
+        copy on every request.
+        """
+        return _add_etag(response, etag)
 
     def get_watchlist(self, request, prune=True):
         """Return the watchlist in dictionary form for the given request."""
-        manager = get_manager(request)
+        manager = self.get_watchlist_manager(request)
         if prune:
-            manager.prune()
-        return manager.as_dict()
+            with server_timing(request, "watchlist-prune"):
+                manager.prune()
+        with server_timing(request, "watchlist-as-dict"):
+            return manager.as_dict()
 
+    @server_timed("watchlist-overview")
     def get_watchlist_context(self, request):
         """Return template context items for display the watchlist."""
         context = {}
         watchlist = {}
-        for model_label, watchlist_items in self.get_watchlist(request).items():
-            model_items = []
+        manager = self.get_watchlist_manager(request)
+        items = self.get_watchlist(request)
+        versions = manager.get_model_versions() if self.cache_watchlist_groups else {}
+        for model_label, watchlist_items in items.items():
             try:
                 model = apps.get_model(model_label)
-            except LookupError:
+            except (LookupError, ValueError):
                 continue
 
-            # Add the URL to the change page of each item:
-            for watchlist_item in watchlist_items:
-                try:
-                    watchlist_item["object_url"] = self.get_object_url(request, model, watchlist_item["object_id"])
-                except NoReverseMatch:
-                    continue
-                watchlist_item["model_label"] = model_label
-                watchlist_item["object_repr"] = self.get_object_text(
-                    request, model, watchlist_item["object_id"], watchlist_item["object_repr"]
-                )
-                model_items.append(watchlist_item)
-
-            if model_items:
+            if version := versions.get(model_label):
+                # Only build the items if the group is not in the cache: the
+                # template calls model_items when rendering the group.
+                model_items = partial(self.get_model_items, request, model, model_label, watchlist_items)
+                cache_key = self.get_group_cache_key(request, model_label, version)
+                has_items = self._has_object_url(request, model, watchlist_items)
+            else:
+                model_items = self.get_model_items(request, model, model_label, watchlist_items)
+                cache_key = ""
+                has_items = bool(model_items)
+
+            if has_items:
                 if changelist_url := self.get_changelist_url(request, model):
                     changelist_url = f"{self.get_changelist_url(request, model)}?{ON_WATCHLIST_VAR}=True"
-                data = {"model_items": model_items, "changelist_url": changelist_url, "model_label": model_label}
+                data = {
+                    "model_items": model_items,
+                    "changelist_url": changelist_url,
+                    "model_label": model_label,
+                    "cache_key": cache_key,
+                }
                 watchlist[model._meta.verbose_name.capitalize()] = data
         context["watchlist"] = OrderedDict(sorted(watchlist.items()))
+        context["watchlist_client_side"] = manager.client_side
+        if self.cache_watchlist_groups:
+            alias, timeout = _get_cache_alias(), _get_cache_timeout()
+            if timeout is DEFAULT_TIMEOUT:
+                # The cache template tag requires an explicit timeout.
+                timeout = caches[alias].default_timeout
+            context["watchlist_cache"] = {"alias": alias, "timeout": timeout}
         return context
 
+    @server_timed("watchlist-urls")
+    def get_model_items(self, request, model, model_label, watchlist_items):
+        """
+        Return the watchlist items of the given model with the URL to the
+        change page and the text to display added to each item.
+        """
+        model_items = []
+        for watchlist_item in watchlist_items:
+            try:
+                watchlist_item["object_url"] = self.get_object_url(request, model, watchlist_item["object_id"])
+            except NoReverseMatch:
+                continue
+            watchlist_item["model_label"] = model_label
+            watchlist_item["object_repr"] = self.get_object_text(
+                request, model, watchlist_item["object_id"], watchlist_item["object_repr"]
+            )
+            model_items.append(watchlist_item)
+        return model_items
+
+    def _has_object_url(self, request, model, watchlist_items):
+        """
+        Return whether get_model_items would return any items, without
+        building the items.
+        """
+        for watchlist_item in watchlist_items:
+            try:
+                self.get_object_url(request, model, watchlist_item["object_id"])
+            except NoReverseMatch:
+                continue
+            return True
+        return False
+
+    def get_group_cache_key(self, request, model_label, version):
+        """
+        Return the key that identifies the cached HTML of the model group given
+        by the model label and the version of the group.
+        """
+        user = getattr(request, "user", None)
+        session = getattr(request, "session", None)
+        owner = f"{getattr(user, 'pk', None)}:{getattr(session, 'session_key', None)}"
+        namespace = request.resolver_match.namespace if request.resolver_match else ""
+        return f"{owner}:{namespace}:{get_language()}:{model_label}:{version}"
+
     def _get_url_for_watchlist_link(self, request, viewname, args=None, kwargs=None):
         if app_name := request.resolver_match.app_name:
             viewname = f"{app_name}:{viewname}"
@@ -94,20 +312,43 @@ class WatchlistViewMixin(ContextMixin):
         return object_repr
 
 
-def annotate_view_queryset(request, queryset):
+def annotate_view_queryset(request, queryset, added=False, relations=()):
     """
     Add an 'on_watchlist' attribute to each object in the given queryset that
     denotes whether the object is on a watchlist. If ``ON_WATCHLIST_VAR`` is
     present in the request GET parameters, filter the queryset to only include
     items that are on the watchlist.
+
+    If `added` is True, also add a 'watchlist_added' attribute with the time
+    the object was added to the watchlist. For every lookup path in
+    `relations`, add a '<path>__on_watchlist' attribute for the related object.
     """
     manager = get_manager(request)
-    queryset = manager.annotate_queryset(queryset)
+    queryset = manager.annotate_queryset(queryset, added=added, relations=relations)
     if ON_WATCHLIST_VAR in request.GET:
         queryset = manager.filter(queryset)
     return queryset
 
 
+def get_watchlist_ordering(watched_first=False, recently_added_first=False):
+    """
+    Return the ordering expressions for querysets annotated by
+    ``annotate_view_queryset``.
+
+    Args:
+        watched_first (bool): put the objects that are on the watchlist first
+        recently_added_first (bool): order by the time the objects were added
+            to the watchlist, most recent first. Requires the 'watchlist_added'
+            annotation.
+    """
+    ordering = []
+    if watched_first:
+        ordering.append(F(ANNOTATION_FIELD).desc())
+    if recently_added_first:
+        ordering.append(F(ADDED_ANNOTATION_FIELD).desc(nulls_last=True))
+    return ordering
+
+
 class WatchlistMixin:
     """
     A mixin that adds annotations and filtering specific to the watchlist to
@@ -120,42 +361,76 @@ class WatchlistMixin:
     Set ``add_watchlist_annotations`` to ``False`` to skip adding annotations
     and disable filtering.
 
+    Set ``add_watchlist_added`` to ``True`` to add the 'watchlist_added'
+    annotation with the time each object was added to the watchlist.
+
+    Set ``watched_first`` to ``True`` to put the objects that are on the
+    watchlist first, and ``order_by_watchlist_added`` to ``True`` to order the
+    objects by the time they were added to the watchlist (most recent first).
+    The view's ordering is applied after that.
+
+    Set ``watchlist_relations`` to a list of lookup paths (e.g. ``["author"]``)
+    to add '<path>__on_watchlist' annotations for related objects.
+
     Add this mixin to your list views for models that use the watchlist.
     """
 
     add_watchlist_annotations = True
+    add_watchlist_added = False
+    watched_first = False
+    order_by_watchlist_added = False
+    watchlist_relations = ()
 
     def get_queryset(self):
         queryset = super().get_queryset()  # noqa
         if self.add_watchlist_annotations:
-            queryset = annotate_view_queryset(self.request, queryset)  # noqa
+            added = self.add_watchlist_added or self.order_by_watchlist_added
+            queryset = annotate_view_queryset(
+                self.request,  # noqa
+                queryset,
+                added=added,
+                relations=self.watchlist_relations,
+            )
+            if ordering := get_watchlist_ordering(self.watched_first, self.order_by_watchlist_added):
+                queryset = queryset.order_by(*ordering, *(queryset.query.order_by or queryset.model._meta.ordering))
         return queryset
 
 
 @csrf_protect
+@server_timed("watchlist-toggle")
 def watchlist_toggle(request):
     """
     Add an object to the watchlist, or remove an object if it already exists on
     the watchlist.
 
+    If the POST data includes 'on_watchlist' ('true' or 'false'), add or remove
+    the object according to that value instead of toggling it. Repeated
+    requests then do not cancel each other out.
+
     Used on the change pages of objects.
     """
     try:
         pk = int(request.POST["object_id"])
         model_label = request.POST["model_label"]
+        requested = _get_requested_state(request)
     except (KeyError, ValueError):
         return HttpResponseBadRequest()
+    manager = get_manager(request)
     try:
         obj = _get_model_object(model_label, pk)
     except (LookupError, ObjectDoesNotExist):
         on_watchlist = False
     else:
-        manager = get_manager(request)
-        on_watchlist = manager.toggle(obj)
-    return JsonResponse({"on_watchlist": on_watchlist})
+        if requested is None:
+            on_watchlist = manager.toggle(obj)
+        else:
+            on_watchlist = manager.set_on_watchlist(obj, requested)
+    count = manager.count()
+    return manager.update_response(JsonResponse({"on_watchlist": on_watchlist, "count": count}))
 
 
 @csrf_protect
+@server_timed("watchlist-remove")
 def watchlist_remove(request):
     """
     Remove an object from the watchlist.
@@ -167,20 +442,121 @@ def watchlist_remove(request):
         model_label = request.POST["model_label"]
     except (KeyError, ValueError):
         return HttpResponseBadRequest()
+    manager = get_manager(request)
     try:
-        manager = get_manager(request)
         manager.remove(_get_model_object(model_label, pk))
     except (LookupError, ObjectDoesNotExist):
         pass
-    return JsonResponse({})
+    count = manager.count()
+    return manager.update_response(JsonResponse({"count": count}))
 
 
 @csrf_protect
+@server_timed("watchlist-remove-all")
 def watchlist_remove_all(request):
     """Remove all objects of a given model from the watchlist."""
     try:
         model = apps.get_model(request.POST["model_label"])
-    except (KeyError, LookupError):
+    except (KeyError, LookupError, ValueError):
+        return HttpResponseBadRequest()
+    manager = get_manager(request)
+    manager.remove_model(model)
+    count = manager.count()
+    return manager.update_response(JsonResponse({"count": count}))
+
+
+@require_safe
+def watchlist_summary(request):
+    """
+    Return the number of watchlist items per model label.
+
+    The response is cacheable: clients can revalidate it with the ETag.
+    """
+    manager = get_manager(request)
+    etag = _make_etag(manager, manager.get_version())
+    if response := _get_not_modified_response(request, etag):
+        return response
+    return _add_etag(JsonResponse(manager.summary()), etag)
+
+
+@require_safe
+def watchlist_metrics(request):
+    """
+    Return the metrics of the watchlist manager operations in the Prometheus
+    text format.
+
+    Requires the instrumentation with a collector that can export the metrics
+    in this format (such as the default InMemoryCollector). This view is not
+    part of the watchlist URLs; add it to your URLconf and protect it as
+    needed.
+    """
+    collector = get_collector()
+    if not hasattr(collector, "export_prometheus"):
+        raise Http404("Watchlist metrics are not available.")
+    return HttpResponse(collector.export_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Async versions of the views. Use these with mizdb_watchlist.async_urls.
+# Requires Django 5.0 or later: older versions of csrf_protect and
+# require_safe do not support coroutine functions.
+ASYNC_VIEWS_SUPPORTED = django.VERSION >= (5, 0)
+
+
+@csrf_protect
+async def awatchlist_toggle(request):
+    """Async version of ``watchlist_toggle``."""
+    try:
+        pk = int(request.POST["object_id"])
+        model_label = request.POST["model_label"]
+        requested = _get_requested_state(request)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest()
+    manager = await aget_manager(request)
+    try:
+        obj = await _aget_model_object(model_label, pk)
+    except (LookupError, ObjectDoesNotExist):
+        on_watchlist = False
+    else:
+        if requested is None:
+            on_watchlist = await manager.atoggle(obj)
+        else:
+            on_watchlist = await manager.aset_on_watchlist(obj, requested)
+    return manager.update_response(JsonResponse({"on_watchlist": on_watchlist, "count": await manager.acount()}))
+
+
+@csrf_protect
+async def awatchlist_remove(request):
+    """Async version of ``watchlist_remove``."""
+    try:
+        pk = int(request.POST["object_id"])
+        model_label = request.POST["model_label"]
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest()
+    manager = await aget_manager(request)
+    try:
+        await manager.aremove(await _aget_model_object(model_label, pk))
+    except (LookupError, ObjectDoesNotExist):
+        pass
+    return manager.update_response(JsonResponse({"count": await manager.acount()}))
+
+
+@csrf_protect
+async def awatchlist_remove_all(request):
+    """Async version of ``watchlist_remove_all``."""
+    try:
+        model = apps.get_model(request.POST["model_label"])
+    except (KeyError, LookupError, ValueError):
         return HttpResponseBadRequest()
-    get_manager(request).remove_model(model)
-    return JsonResponse({})
+    manager = await aget_manager(request)
+    await manager.aremove_model(model)
+    return manager.update_response(JsonResponse({"count": await manager.acount()}))
+
+
+@require_safe
+async def awatchlist_summary(request):
+    """Async version of ``watchlist_summary``."""
+    manager = await aget_manager(request)
+    etag = _make_etag(manager, await manager.aget_version())
+    if response := _get_not_modified_response(request, etag):
+        return response
+    return _add_etag(JsonResponse(await manager.asummary()), etag)
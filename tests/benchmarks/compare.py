@@ -0,0 +1,55 @@
+"""
+Compare two benchmark result files written with the --bench-json option.
+
+Usage:
+    python -m tests.benchmarks.compare old.json new.json [--threshold 1.2]
+
+Prints the best times of the benchmarks found in both files, and exits with
+status 1 if a benchmark got slower than `threshold` times its old time.
+"""
+
+import argparse
+import json
+import sys
+
+
+def compare(old, new, threshold):
+    """
+    Return the lines of the comparison report and the names of the benchmarks
+    that got slower than `threshold` times their old time.
+    """
+    names = [name for name in new["results"] if name in old["results"]]
+    if not names:
+        return ["No common benchmarks."], []
+    width = max(len(name) for name in names)
+    lines = [f"{'benchmark':<{width}}  {'old (ms)':>10}  {'new (ms)':>10}  ratio"]
+    regressions = []
+    for name in names:
+        old_best, new_best = old["results"][name]["best"], new["results"][name]["best"]
+        ratio = new_best / old_best if old_best else float("inf")
+        marker = ""
+        if ratio > threshold:
+            marker = "  <-- slower"
+            regressions.append(name)
+        lines.append(f"{name:<{width}}  {old_best * 1000:10.3f}  {new_best * 1000:10.3f}  {ratio:5.2f}{marker}")
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio above which a benchmark is a regression")
+    args = parser.parse_args(argv)
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    lines, regressions = compare(old, new, args.threshold)
+    print(f"old: {old['meta']}\nnew: {new['meta']}\n")
+    print("\n".join(lines))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
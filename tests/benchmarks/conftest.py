@@ -0,0 +1,99 @@
+import json
+import platform
+import sqlite3
+import time
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from statistics import mean
+
+import django
+import pytest
+
+# Timings recorded by the benchmark fixture, reported at the end of the session.
+_results = []
+
+
+def _record(name, timings, extra=None):
+    """Record the given timings (in seconds) under the given name."""
+    _results.append(
+        {"name": name, "best": min(timings), "mean": mean(timings), "rounds": len(timings), "extra": extra or {}}
+    )
+
+
+def _get_version():
+    try:
+        return version("mizdb-watchlist")
+    except PackageNotFoundError:  # pragma: no cover
+        return None
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("benchmarks")
+    width = max(len(result["name"]) for result in _results)
+    for result in _results:
+        extra = "  ".join(f"{k}={v}" for k, v in result.get("extra", {}).items())
+        terminalreporter.write_line(f"{result['name']:<{width}}  {result['best'] * 1000:10.3f} ms  {extra}")
+
+
+def pytest_sessionfinish(session):
+    """Write the results to the file given with the --bench-json option."""
+    path = session.config.getoption("--bench-json")
+    if not path or not _results:
+        return
+    data = {
+        "meta": {
+            "version": _get_version(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": {result["name"]: {k: v for k, v in result.items() if k != "name"} for result in _results},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+@pytest.fixture
+def benchmark():
+    """
+    Time the given callable and record the best time out of `rounds` rounds.
+
+    Returns the return value of the last call of the callable. Additional
+    figures (byte sizes, etc.) can be recorded with the `extra` argument. If
+    given, `setup` is called before every round, without being timed:
+
+        def test(benchmark):
+            data = benchmark("encode 1k", encode, items, extra={"bytes": 123})
+            benchmark("add 1k", manager.add, obj, setup=lambda: manager.remove(obj))
+    """
+
+    def inner(name, func, *args, rounds=5, extra=None, setup=None, **kwargs):
+        timings = []
+        result = None
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            timings.append(time.perf_counter() - start)
+        _record(name, timings, extra)
+        return result
+
+    return inner
+
+
+@pytest.fixture
+def record_benchmark():
+    """
+    Record timings that were not taken by the benchmark fixture.
+
+    Use this for timings measured elsewhere, e.g. in the browser. The timings
+    are in seconds:
+
+        def test(record_benchmark):
+            record_benchmark("init 5k buttons", [0.012, 0.011], extra={"buttons": 5000})
+    """
+    return _record
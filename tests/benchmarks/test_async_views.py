@@ -0,0 +1,39 @@
+"""Compare the throughput of the sync and the async views under an ASGI client."""
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import include, path
+
+from mizdb_watchlist.views import ASYNC_VIEWS_SUPPORTED
+
+if not ASYNC_VIEWS_SUPPORTED:
+    pytest.skip("the async views require Django 5.0+", allow_module_level=True)
+
+pytestmark = [pytest.mark.bench, pytest.mark.django_db, pytest.mark.urls(__name__)]
+
+urlpatterns = [
+    path("sync/", include(("mizdb_watchlist.urls", "watchlist"), namespace="sync")),
+    path("async/", include(("mizdb_watchlist.async_urls", "watchlist"), namespace="async")),
+]
+
+REQUESTS = 200
+
+
+@pytest.fixture
+def async_client(user):
+    client = AsyncClient()
+    client.force_login(user)
+    return client
+
+
+@pytest.mark.parametrize("views", ["sync", "async"])
+def test_toggle_throughput(benchmark, async_client, person, views):
+    data = {"object_id": person.pk, "model_label": person._meta.label_lower}
+
+    async def run():
+        for _ in range(REQUESTS):
+            response = await async_client.post(f"/{views}/toggle/", data)
+            assert response.status_code == 200
+
+    benchmark(f"{views} toggle x{REQUESTS}", async_to_sync(run), rounds=3)
@@ -0,0 +1,67 @@
+"""Render time of the watchlist overview with and without cached model groups."""
+
+import itertools
+
+import pytest
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import include, path
+
+pytestmark = [pytest.mark.bench, pytest.mark.urls(__name__)]
+
+urlpatterns = [path("watchlist/", include("mizdb_watchlist.urls"))]
+
+GROUPS = 30
+ITEMS = 500
+
+
+def _context(cached):
+    """Return the context for the overview template with synthetic model groups."""
+    watchlist = {}
+    for group in range(GROUPS):
+        model_label = f"bench.model{group}"
+        items = [
+            {
+                "object_id": pk,
+                "object_repr": f"Object with a representation #{pk}",
+                "object_url": f"/bench/model{group}/{pk}/change/",
+                "model_label": model_label,
+            }
+            for pk in range(1, ITEMS + 1)
+        ]
+        watchlist[f"Model {group:02}"] = {
+            "model_items": items,
+            "changelist_url": f"/bench/model{group}/?on_watchlist=True",
+            "model_label": model_label,
+            "cache_key": f"bench:{model_label}:0" if cached else "",
+        }
+    context = {"watchlist": watchlist}
+    if cached:
+        context["watchlist_cache"] = {"alias": "default", "timeout": 300}
+    return context
+
+
+def test_fragment_cache(benchmark):
+    uncached = benchmark(
+        f"render {GROUPS}x{ITEMS} uncached",
+        render_to_string,
+        "mizdb_watchlist/watchlist.html",
+        _context(cached=False),
+    )
+
+    cache.clear()
+    context = _context(cached=True)
+    render_to_string("mizdb_watchlist/watchlist.html", context)  # warm up the cache
+    cached = benchmark(f"render {GROUPS}x{ITEMS} cached", render_to_string, "mizdb_watchlist/watchlist.html", context)
+    assert cached.split() == uncached.split()
+
+    # One group changes between renders (e.g. after removing a Person):
+    counter = itertools.count(1)
+    first_group = context["watchlist"]["Model 00"]
+
+    def render_one_changed():
+        first_group["cache_key"] = f"bench:{first_group['model_label']}:{next(counter)}"
+        return render_to_string("mizdb_watchlist/watchlist.html", context)
+
+    benchmark(f"render {GROUPS}x{ITEMS} one group changed", render_one_changed)
+    cache.clear()
@@ -0,0 +1,68 @@
+"""Time watchlist.js takes to initialize toggle buttons: per button vs. delegation."""
+
+import os
+
+import pytest
+from django.http import HttpResponse
+from django.template import engines
+from django.urls import include, path, reverse
+from playwright.sync_api import expect
+
+from tests.testapp.models import Person
+
+# https://github.com/microsoft/playwright-python/issues/439
+os.environ.setdefault("DJANGO_ALLOW_ASYNC_UNSAFE", "true")
+
+pytestmark = [pytest.mark.bench, pytest.mark.pw, pytest.mark.django_db, pytest.mark.urls(__name__)]
+
+BUTTONS = 5000
+ROUNDS = 5
+
+PAGE = """{% load static mizdb_watchlist %}
+<!doctype html>
+<html lang="en">
+<head><script src="{% static 'mizdb_watchlist/js/watchlist.js' %}"></script></head>
+<body>
+  {% for person in object_list %}{% fast_toggle_button request person on_watchlist=False %}{% endfor %}
+</body>
+</html>
+"""
+
+# Time initializing every button individually, then delegating the clicks of
+# all buttons to the document body.
+TIMINGS = """() => {
+    const time = (func) => {
+        const start = performance.now()
+        func()
+        return performance.now() - start
+    }
+    return {
+        init: time(() => document.querySelectorAll('.watchlist-toggle-btn').forEach(
+            (btn) => window.WatchlistButton.initToggleButton(btn)
+        )),
+        delegate: time(() => window.WatchlistButton.delegate(document.body)),
+    }
+}"""
+
+
+def changelist(request):
+    context = {"object_list": Person.objects.all()}
+    return HttpResponse(engines["django"].from_string(PAGE).render(context, request))
+
+
+urlpatterns = [
+    path("person/", changelist, name="changelist"),
+    path("watchlist/", include("mizdb_watchlist.urls")),
+]
+
+
+def test_init_time(page, live_server, person_factory, record_benchmark):
+    Person.objects.bulk_create([person_factory.build() for _ in range(BUTTONS)])
+    timings = []
+    for _ in range(ROUNDS):
+        page.goto(live_server.url + reverse("changelist"))
+        expect(page.locator(".watchlist-toggle-btn")).to_have_count(BUTTONS)
+        timings.append(page.evaluate(TIMINGS))
+    # The browser measures milliseconds; the results are in seconds.
+    record_benchmark(f"init {BUTTONS} buttons", [t["init"] / 1000 for t in timings], extra={"buttons": BUTTONS})
+    record_benchmark(f"delegate {BUTTONS} buttons", [t["delegate"] / 1000 for t in timings], extra={"buttons": BUTTONS})
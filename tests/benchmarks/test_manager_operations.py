@@ -0,0 +1,114 @@
+"""
+Time the manager operations of SessionManager and ModelManager at different
+watchlist sizes.
+
+Run with `make bench`; add `--bench-json=PATH` to store the results for a
+comparison with `python -m tests.benchmarks.compare`.
+"""
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from mizdb_watchlist.manager import WATCHLIST_SESSION_KEY, ModelManager, SessionManager
+from mizdb_watchlist.models import Watchlist
+from tests.testapp.models import Person
+
+pytestmark = [pytest.mark.bench, pytest.mark.django_db]
+
+SIZES = [10, 1_000, 10_000, 100_000]
+
+# The number of objects added by the bulk_add benchmark.
+BULK_SIZE = 100
+
+
+def _label(size):
+    return f"{size // 1000}k" if size >= 1000 else str(size)
+
+
+@pytest.fixture
+def size():
+    return 10
+
+
+@pytest.fixture
+def persons(size):
+    """Create the objects on the watchlist and BULK_SIZE objects that are not."""
+    Person.objects.bulk_create(
+        [Person(first_name="Alice", last_name=f"Test{i}") for i in range(size + BULK_SIZE)], batch_size=10_000
+    )
+    objects = list(Person.objects.order_by("pk"))
+    return objects[:size], objects[size:]
+
+
+def _fill_session(manager, objects):
+    """Replace the watchlist with the given objects."""
+    time_added = timezone.now().isoformat()
+    manager.request.session[WATCHLIST_SESSION_KEY] = {
+        "testapp.person": [{"object_id": obj.pk, "object_repr": str(obj), "time_added": time_added} for obj in objects]
+    }
+
+
+def _fill_model(manager, objects):
+    """Replace the watchlist with the given objects."""
+    Watchlist.objects.filter(user=manager.user).delete()
+    content_type = ContentType.objects.get_for_model(Person)
+    Watchlist.objects.bulk_create(
+        [
+            Watchlist(user=manager.user, content_type=content_type, object_id=obj.pk, object_repr=str(obj))
+            for obj in objects
+        ],
+        batch_size=10_000,
+    )
+
+
+def _run(benchmark, manager, fill, persons, size):
+    watched, extra = persons
+    fill(manager, watched)
+    prefix = f"{type(manager).__name__} {{}} {_label(size)}"
+    queryset = Person.objects.all()
+    obj = watched[len(watched) // 2]
+    new_obj = extra[0]
+
+    assert benchmark(prefix.format("on_watchlist"), manager.on_watchlist, obj)
+    benchmark(prefix.format("as_dict"), manager.as_dict, rounds=3)
+    result = benchmark(prefix.format("annotate_queryset"), lambda: list(manager.annotate_queryset(queryset)), rounds=3)
+    assert sum(o.on_watchlist for o in result) == size
+    assert len(benchmark(prefix.format("filter"), lambda: list(manager.filter(queryset)), rounds=3)) == size
+    benchmark(prefix.format("add"), manager.add, new_obj, setup=lambda: manager.remove(new_obj))
+    benchmark(prefix.format("toggle"), manager.toggle, new_obj)
+    manager.remove(new_obj)
+
+    def remove_extra():
+        for o in extra:
+            manager.remove(o)
+
+    benchmark(prefix.format(f"bulk_add {BULK_SIZE}"), manager.bulk_add, extra, setup=remove_extra, rounds=3)
+    remove_extra()
+    benchmark(prefix.format("prune"), manager.prune, rounds=3)
+
+    benchmark(
+        prefix.format("remove_model"), manager.remove_model, Person, setup=lambda: fill(manager, watched), rounds=3
+    )
+    assert not manager.on_watchlist(obj)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("user", [None])
+@pytest.mark.usefixtures("add_session")
+def test_session_manager(benchmark, http_request, persons, size):
+    manager = SessionManager(http_request)
+    _run(benchmark, manager, _fill_session, persons, size)
+
+    watched, _extra = persons
+    _fill_session(manager, watched)
+    session = http_request.session
+    data = dict(session.items())
+    encoded = session.encode(data)
+    benchmark(f"SessionManager session encode {_label(size)}", session.encode, data, extra={"bytes": len(encoded)})
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_model_manager(benchmark, http_request, persons, size):
+    manager = ModelManager(http_request)
+    _run(benchmark, manager, _fill_model, persons, size)
@@ -0,0 +1,46 @@
+"""Byte size of the watchlist overview with inline icons and with the icon sprite."""
+
+import pytest
+from django.template.loader import render_to_string
+from django.urls import include, path
+
+pytestmark = [pytest.mark.bench, pytest.mark.urls(__name__)]
+
+urlpatterns = [path("watchlist/", include("mizdb_watchlist.urls"))]
+
+ITEMS = 5000
+
+# The markup of the remove button icon before the icon sprite was introduced:
+INLINE_ICON = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" '
+    'stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="feather feather-x">'
+    '<line x1="18" y1="6" x2="6" y2="18"></line><line x1="6" y1="6" x2="18" y2="18"></line></svg>'
+)
+ICON_REF = '<svg width="24" height="24" class="feather feather-x"><use href="#mizdb-watchlist-x"></use></svg>'
+
+
+def test_overview_size(benchmark):
+    items = [
+        {
+            "object_id": pk,
+            "object_repr": f"Person #{pk}",
+            "object_url": f"/person/{pk}/change/",
+            "model_label": "testapp.person",
+        }
+        for pk in range(1, ITEMS + 1)
+    ]
+    context = {"watchlist": {"Person": {"model_items": items, "model_label": "testapp.person"}}}
+    html = render_to_string("mizdb_watchlist/watchlist.html", context)
+    sprite = render_to_string("mizdb_watchlist/icons.svg")
+    assert html.count(ICON_REF) == ITEMS
+    inline_html = html.replace(sprite, "").replace(ICON_REF, INLINE_ICON)
+
+    sprite_size, inline_size = len(html.encode()), len(inline_html.encode())
+    benchmark(
+        f"overview {ITEMS} items",
+        render_to_string,
+        "mizdb_watchlist/watchlist.html",
+        context,
+        extra={"bytes_inline": inline_size, "bytes_sprite": sprite_size},
+    )
+    assert sprite_size < inline_size * 0.75
@@ -0,0 +1,32 @@
+"""Compare the session payload of SessionManager and CompactSessionManager."""
+
+import pytest
+from django.contrib.sessions.backends.db import SessionStore
+
+from mizdb_watchlist.manager import WATCHLIST_SESSION_KEY
+
+pytestmark = pytest.mark.bench
+
+
+def _session_watchlist(size):
+    """Return the watchlist data as stored by SessionManager."""
+    items = [{"object_id": pk, "object_repr": f"Object with a representation #{pk}"} for pk in range(1, size + 1)]
+    return {WATCHLIST_SESSION_KEY: {"testapp.person": items}}
+
+
+def _compact_watchlist(size):
+    """Return the watchlist data as stored by CompactSessionManager."""
+    return {WATCHLIST_SESSION_KEY: {"testapp.person": list(range(1, size + 1))}}
+
+
+@pytest.mark.parametrize("size", [1_000, 10_000])
+def test_session_encoding(benchmark, size):
+    session = SessionStore()
+    results = {}
+    for name, make_data in [("session", _session_watchlist), ("compact", _compact_watchlist)]:
+        data = make_data(size)
+        encoded = session.encode(data)
+        benchmark(f"encode {name} {size}", session.encode, data, extra={"bytes": len(encoded)})
+        assert benchmark(f"decode {name} {size}", session.decode, encoded) == data
+        results[name] = len(encoded)
+    assert results["compact"] < results["session"]
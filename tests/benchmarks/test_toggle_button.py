@@ -0,0 +1,29 @@
+"""Render time of a list of toggle buttons: inclusion tag vs. fast_toggle_button."""
+
+import pytest
+from django.template import engines
+from django.urls import include, path
+
+from tests.testapp.models import Person
+
+pytestmark = [pytest.mark.bench, pytest.mark.django_db, pytest.mark.urls(__name__)]
+
+urlpatterns = [path("watchlist/", include("mizdb_watchlist.urls"))]
+
+BUTTONS = 2000
+
+TEMPLATE = (
+    "{% load mizdb_watchlist %}{% for obj in objects %}{% TAG request obj on_watchlist=obj.on_watchlist %}{% endfor %}"
+)
+
+
+@pytest.mark.parametrize("tag", ["toggle_button", "fast_toggle_button"])
+def test_toggle_button(benchmark, rf, admin_user, tag):
+    request = rf.get("/")
+    request.user = admin_user
+    objects = [Person(pk=pk, first_name="Alice", last_name=str(pk)) for pk in range(1, BUTTONS + 1)]
+    for obj in objects:
+        obj.on_watchlist = obj.pk % 2 == 0
+    template = engines["django"].from_string(TEMPLATE.replace("TAG", tag))
+    html = benchmark(f"render {BUTTONS} {tag}", template.render, {"request": request, "objects": objects})
+    assert html.count("<button") == BUTTONS
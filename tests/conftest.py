@@ -1,11 +1,34 @@
 import pytest
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
 
 from mizdb_watchlist.models import Watchlist
-from tests.factories import CompanyFactory, PersonFactory
+from tests.factories import BookFactory, CompanyFactory, PersonFactory
 from tests.testapp.models import Company, Person
 
 
+def pytest_addoption(parser):
+    parser.addoption("--bench", action="store_true", default=False, help="run the benchmarks")
+    parser.addoption("--bench-json", default=None, metavar="PATH", help="write the benchmark results to PATH")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip the benchmarks unless the --bench option was given."""
+    if config.getoption("--bench"):
+        return
+    skip_bench = pytest.mark.skip(reason="need --bench option to run")
+    for item in items:
+        if "bench" in item.keywords:
+            item.add_marker(skip_bench)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Clear the cache so that cached watchlist counts do not leak between tests."""
+    yield
+    caches[DEFAULT_CACHE_ALIAS].clear()
+
+
 def _try_getfixturevalue(request, name):
     """
     Try to return the value of the fixture given by `name`. If `name` is not the
@@ -51,6 +74,12 @@ def person_ct():
     return ContentType.objects.get_for_model(Person)
 
 
+@pytest.fixture
+def book_factory():
+    """Return the factory for the Book model."""
+    return BookFactory
+
+
 @pytest.fixture
 def company_factory():
     """Return the factory for the Company model."""
@@ -76,6 +105,19 @@ def fill_watchlist(add_to_watchlist, person, company):
     return person, company
 
 
+@pytest.fixture
+def on_watchlist_model(watchlist_model):
+    """Return whether the given object is on the model watchlist."""
+
+    def inner(obj):
+        return watchlist_model.objects.filter(
+            object_id=obj.pk,
+            content_type=ContentType.objects.get_for_model(obj),
+        ).exists()
+
+    return inner
+
+
 @pytest.fixture
 def add_to_watchlist(watchlist_model, user):
     """Create a Watchlist model object for the given model object."""
@@ -1,6 +1,6 @@
 import factory
 
-from tests.testapp.models import Company, Person
+from tests.testapp.models import Book, Company, Person
 
 
 class PersonFactory(factory.django.DjangoModelFactory):
@@ -18,3 +18,12 @@ class CompanyFactory(factory.django.DjangoModelFactory):
 
     id = factory.Sequence(lambda n: n + 100)
     name = factory.Faker("company")
+
+
+class BookFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Book
+
+    id = factory.Sequence(lambda n: n + 1000)
+    title = factory.Faker("sentence", nb_words=3)
+    author = factory.SubFactory(PersonFactory)
@@ -3,7 +3,6 @@ import re
 from operator import itemgetter
 
 import pytest
-from django.contrib.contenttypes.models import ContentType
 from django.contrib.sessions.backends.db import SessionStore
 from django.urls import reverse
 from playwright.sync_api import expect
@@ -44,19 +43,6 @@ def get_url(live_server):
 ################################################################################
 
 
-@pytest.fixture
-def on_watchlist_model(watchlist_model):
-    """Return whether the given object is on the model watchlist."""
-
-    def inner(obj):
-        return watchlist_model.objects.filter(
-            object_id=obj.pk,
-            content_type=ContentType.objects.get_for_model(obj),
-        ).exists()
-
-    return inner
-
-
 @pytest.fixture
 def get_session_cookie(context):
     """Return the cookie with the session id."""
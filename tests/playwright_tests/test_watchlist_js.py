@@ -0,0 +1,314 @@
+import pytest
+from django.http import HttpResponse
+from django.template import engines
+from django.urls import include, path
+from playwright.sync_api import expect
+
+from mizdb_watchlist.manager import WATCHLIST_COOKIE_NAME
+from tests.testapp.models import Person
+
+PAGE = """{% load static mizdb_watchlist %}
+<!doctype html>
+<html lang="en">
+<head>
+  <script src="{% static 'mizdb_watchlist/js/watchlist.js' %}"></script>
+  {% if script %}<script src="{% static script %}"></script>{% endif %}
+</head>
+<body>
+  {% csrf_token %}
+  {% watchlist_icons %}
+  <ul id="list">
+  {% for person in object_list %}
+    <li>{{ person }} {% fast_toggle_button request person on_watchlist=False %}</li>
+  {% endfor %}
+  </ul>
+</body>
+</html>
+"""
+
+
+def changelist(request):
+    """Render a toggle button for each Person and load the requested script."""
+    context = {"object_list": Person.objects.all(), "script": request.GET.get("script")}
+    return HttpResponse(engines["django"].from_string(PAGE).render(context, request))
+
+
+urlpatterns = [
+    path("person/", changelist, name="changelist"),
+    path("watchlist/", include("mizdb_watchlist.urls")),
+]
+
+pytestmark = [pytest.mark.django_db, pytest.mark.urls(__name__), pytest.mark.pw]
+
+
+@pytest.fixture
+def persons(person_factory):
+    return person_factory.create_batch(3)
+
+
+@pytest.fixture
+def changelist_url(get_url):
+    def inner(script=""):
+        return get_url("changelist") + f"?script={script}" if script else get_url("changelist")
+
+    return inner
+
+
+@pytest.mark.usefixtures("session_login")
+def test_delegated_toggle(page, persons, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_on):
+    page.goto(changelist_url("mizdb_watchlist/js/watchlist_delegate.js"))
+    button = get_toggle_button(page).first
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_on(button)
+    assert on_watchlist_model(persons[0])
+
+
+@pytest.mark.usefixtures("session_login")
+def test_delegated_toggle_dynamic_button(
+    page, persons, person_factory, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_on
+):
+    """Assert that buttons inserted after the page was loaded are handled."""
+    other = person_factory()
+    page.goto(changelist_url("mizdb_watchlist/js/watchlist_delegate.js"))
+    page.evaluate(
+        """(objectId) => {
+            const item = document.querySelector('#list li').cloneNode(true)
+            item.querySelector('button').dataset.objectId = objectId
+            item.id = 'dynamic'
+            document.getElementById('list').append(item)
+        }""",
+        other.pk,
+    )
+    button = get_toggle_button(page.locator("#dynamic"))
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_on(button)
+    assert on_watchlist_model(other)
+    assert not on_watchlist_model(persons[0])
+
+
+@pytest.mark.usefixtures("session_login")
+@pytest.mark.parametrize("script", ["mizdb_watchlist/js/watchlist_init.js", "mizdb_watchlist/js/watchlist_delegate.js"])
+def test_toggle_updates_all_buttons_of_object(
+    page, persons, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_on, script
+):
+    """Assert that a toggle updates every button of the object on the page."""
+    page.goto(changelist_url(script))
+    page.evaluate(
+        """() => {
+            const item = document.querySelector('#list li').cloneNode(true)
+            item.id = 'duplicate'
+            document.getElementById('list').append(item)
+            window.WatchlistButton.initToggleButton(item.querySelector('button'))
+        }"""
+    )
+    button = get_toggle_button(page).first
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_on(button)
+    assert_toggled_on(get_toggle_button(page.locator("#duplicate")))
+    assert on_watchlist_model(persons[0])
+
+
+@pytest.mark.usefixtures("session_login")
+def test_delegated_toggle_initialized_button(
+    page, persons, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_on
+):
+    """
+    Assert that a click on an individually initialized button is not handled a
+    second time by the delegated listener.
+    """
+    page.goto(changelist_url("mizdb_watchlist/js/watchlist_init.js"))
+    page.evaluate("window.WatchlistButton.delegate(document)")
+    button = get_toggle_button(page).first
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    page.wait_for_load_state("networkidle")
+    assert_toggled_on(button)
+    assert on_watchlist_model(persons[0])
+
+
+@pytest.mark.usefixtures("session_login")
+@pytest.mark.parametrize("script", ["mizdb_watchlist/js/watchlist_init.js", "mizdb_watchlist/js/watchlist_delegate.js"])
+def test_toggle_double_click(
+    page, persons, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_off, script
+):
+    """
+    Assert that the server ends up in the state that the user intended after
+    clicking the button twice in a row.
+    """
+    requests = []
+    page.on("request", lambda request: requests.append(request) if "toggle" in request.url else None)
+    page.goto(changelist_url(script))
+    button = get_toggle_button(page).first
+    button.dblclick()
+    assert_toggled_off(button)
+    page.wait_for_load_state("networkidle")
+    assert_toggled_off(button)
+    assert not on_watchlist_model(persons[0])
+    assert len(requests) <= 2
+
+
+@pytest.mark.usefixtures("session_login")
+def test_tab_sync(context, page, persons, changelist_url, get_toggle_button, assert_toggled_on, assert_toggled_off):
+    """
+    Assert that a toggle in one tab updates the button of the same object in
+    another tab, without a request by the other tab.
+    """
+    other_page = context.new_page()
+    other_requests = []
+    for p in (page, other_page):
+        p.goto(changelist_url("mizdb_watchlist/js/watchlist_init.js"))
+    other_page.on("request", lambda request: other_requests.append(request))
+    button, other_button = get_toggle_button(page).first, get_toggle_button(other_page).first
+    assert_toggled_off(other_button)
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_on(other_button)
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_off(other_button)
+    assert not other_requests
+
+
+@pytest.mark.usefixtures("session_login")
+def test_tab_sync_storage_event_fallback(
+    context, persons, changelist_url, get_toggle_button, assert_toggled_on, assert_toggled_off
+):
+    """
+    Assert that the tabs are synced through 'storage' events of the local
+    storage if BroadcastChannel is not available.
+    """
+    context.add_init_script("delete window.BroadcastChannel")
+    page = context.new_page()
+    other_page = context.new_page()
+    other_requests = []
+    for p in (page, other_page):
+        p.goto(changelist_url("mizdb_watchlist/js/watchlist_init.js"))
+    assert other_page.evaluate("typeof window.BroadcastChannel") == "undefined"
+    other_page.on("request", lambda request: other_requests.append(request))
+    button, other_button = get_toggle_button(page).first, get_toggle_button(other_page).first
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_on(other_button)
+    with page.expect_response(lambda response: "toggle" in response.url):
+        button.click()
+    assert_toggled_off(other_button)
+    assert not other_requests
+
+
+@pytest.mark.usefixtures("session_login")
+@pytest.mark.parametrize("script", ["mizdb_watchlist/js/watchlist_init.js", "mizdb_watchlist/js/watchlist_delegate.js"])
+def test_toggle_optimistic(
+    page, persons, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_on, script
+):
+    """Assert that the button is updated before the response arrives."""
+    page.goto(changelist_url(script))
+    with page.expect_response(lambda response: "toggle" in response.url):
+        toggled = page.evaluate(
+            """() => {
+                const btn = document.querySelector('.watchlist-toggle-btn')
+                btn.click()
+                return btn.classList.contains('on-watchlist')
+            }"""
+        )
+    assert toggled
+    assert_toggled_on(get_toggle_button(page).first)
+    assert on_watchlist_model(persons[0])
+
+
+@pytest.mark.usefixtures("session_login")
+@pytest.mark.parametrize("script", ["mizdb_watchlist/js/watchlist_init.js", "mizdb_watchlist/js/watchlist_delegate.js"])
+def test_toggle_optimistic_rollback(
+    page, persons, changelist_url, on_watchlist_model, get_toggle_button, assert_toggled_off, script
+):
+    """Assert that the buttons are reset if the toggle request fails."""
+    page.route("**/watchlist/toggle/", lambda route: route.fulfill(status=500))
+    page.goto(changelist_url(script))
+    page.evaluate(
+        """() => {
+            const item = document.querySelector('#list li').cloneNode(true)
+            item.id = 'duplicate'
+            document.getElementById('list').append(item)
+            window.WatchlistButton.initToggleButton(item.querySelector('button'))
+        }"""
+    )
+    with page.expect_response(lambda response: "toggle" in response.url):
+        toggled = page.evaluate(
+            """() => {
+                const btn = document.querySelector('.watchlist-toggle-btn')
+                btn.click()
+                return btn.classList.contains('on-watchlist')
+            }"""
+        )
+    assert toggled
+    assert_toggled_off(get_toggle_button(page).first)
+    assert_toggled_off(get_toggle_button(page.locator("#duplicate")))
+    assert not on_watchlist_model(persons[0])
+
+
+@pytest.fixture
+def client_storage(settings):
+    """Store the watchlists of anonymous users on the client."""
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+
+
+@pytest.fixture
+def get_watchlist_cookie(context):
+    """Return the value of the watchlist cookie, or None if there is none."""
+
+    def inner():
+        return next((c["value"] for c in context.cookies() if c["name"] == WATCHLIST_COOKIE_NAME), None)
+
+    return inner
+
+
+@pytest.mark.usefixtures("client_storage")
+@pytest.mark.parametrize("script", ["mizdb_watchlist/js/watchlist_init.js", "mizdb_watchlist/js/watchlist_delegate.js"])
+def test_client_storage_toggle(
+    page,
+    persons,
+    person_label,
+    changelist_url,
+    get_url,
+    get_toggle_button,
+    get_watchlist_cookie,
+    assert_toggled_on,
+    assert_toggled_off,
+    script,
+):
+    """
+    Assert that toggle buttons in client-side storage mode update the watchlist
+    cookie without making requests, and that the server reads the cookie.
+    """
+    requests = []
+    page.on("request", lambda request: requests.append(request) if "toggle" in request.url else None)
+    page.goto(changelist_url(script))
+    button = get_toggle_button(page).first
+    expect(button).to_have_attribute("data-storage", "client")
+    button.click()
+    assert_toggled_on(button)
+    assert get_watchlist_cookie() == f"{person_label}:{persons[0].pk}"
+    assert page.request.get(get_url("watchlist:summary")).json() == {person_label: 1}
+    button.click()
+    assert_toggled_off(button)
+    assert get_watchlist_cookie() == ""
+    assert page.request.get(get_url("watchlist:summary")).json() == {}
+    assert not requests
+
+
+@pytest.mark.usefixtures("client_storage")
+def test_client_storage_initial_state(
+    context, page, live_server, persons, person_label, changelist_url, get_url, get_toggle_button, assert_toggled_on
+):
+    """
+    Assert that the toggle buttons are initialized from the watchlist cookie,
+    and that the server ignores the items of labels that do not refer to
+    watchable models.
+    """
+    value = f"foo:1|auth.user:1|{person_label}:{persons[1].pk}"
+    context.add_cookies([{"name": WATCHLIST_COOKIE_NAME, "value": value, "url": live_server.url}])
+    page.goto(changelist_url("mizdb_watchlist/js/watchlist_init.js"))
+    assert_toggled_on(get_toggle_button(page).nth(1))
+    assert page.request.get(get_url("watchlist:summary")).json() == {person_label: 1}
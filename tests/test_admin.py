@@ -2,6 +2,7 @@ from unittest.mock import patch
 
 import pytest
 from django.contrib import admin
+from django.db.models import F
 from django.urls import include, path, reverse
 
 from mizdb_watchlist.admin import WatchlistAdmin, WatchlistMixin
@@ -62,6 +63,47 @@ class TestWatchlistAdmin:
         mock_each_context.assert_called()
 
 
+@pytest.fixture
+def enable_etag():
+    with patch.object(WatchlistAdmin, "watchlist_etag", True):
+        yield
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("enable_etag")
+def test_watchlist_not_modified(http_request, model_admin, mock_get_watchlist_context):
+    """Assert that the watchlist view answers conditional requests with 304."""
+    etag = model_admin.get_watchlist_etag(http_request)
+    http_request.META["HTTP_IF_NONE_MATCH"] = etag
+    response = model_admin.watchlist(http_request)
+    assert response.status_code == 304
+    mock_get_watchlist_context.assert_not_called()
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("login_user", "enable_etag")
+def test_watchlist_conditional_get(client):
+    """
+    Assert that the watchlist view of the admin site can be revalidated by the
+    browser, and that it is not modified if the watchlist did not change.
+    """
+    response = client.get(reverse("test_admin:watchlist"))
+    assert response.status_code == 200
+    assert "no-store" not in response["Cache-Control"]
+    response = client.get(reverse("test_admin:watchlist"), headers={"if-none-match": response["ETag"]})
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures("login_user")
+def test_watchlist_no_etag_by_default(client):
+    """Assert that the watchlist view only sends an ETag if enabled."""
+    response = client.get(reverse("test_admin:watchlist"))
+    assert response.status_code == 200
+    assert not response.has_header("ETag")
+    assert "no-store" in response["Cache-Control"]
+
+
 @pytest.fixture
 def add_watchlist_annotations():
     return True
@@ -99,3 +141,31 @@ class TestModelAdminMixin:
         queryset = view.get_queryset(http_request)
         assert person_on_watchlist in queryset
         assert person_not_on_watchlist in queryset
+
+    def test_get_queryset_add_watchlist_added(self, view, http_request):
+        view.order_by_watchlist_added = True
+        assert "watchlist_added" in view.get_queryset(http_request).query.annotations
+
+    def test_get_ordering(self, view, http_request):
+        view.ordering = ["last_name"]
+        assert view.get_ordering(http_request) == ["last_name"]
+        view.watched_first = True
+        view.order_by_watchlist_added = True
+        assert view.get_ordering(http_request) == [
+            F("on_watchlist").desc(),
+            F("watchlist_added").desc(nulls_last=True),
+            "last_name",
+        ]
+
+    @pytest.mark.parametrize("add_watchlist_annotations", [False])
+    def test_get_ordering_no_annotations(self, view, http_request, add_watchlist_annotations):
+        view.watched_first = True
+        assert view.get_ordering(http_request) == []
+
+    def test_changelist_watched_first(self, view, http_request, person_factory, add_to_watchlist):
+        person_factory(), person_factory()
+        watched = person_factory()
+        add_to_watchlist(watched)
+        view.watched_first = True
+        changelist = view.get_changelist_instance(http_request)
+        assert list(changelist.get_queryset(http_request))[0] == watched
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from mizdb_watchlist.models import SessionWatchlist
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def add_session_item(person):
+    """Create a session watchlist item for a session with the given expiry."""
+
+    def inner(session_key, expire_in):
+        Session.objects.create(session_key=session_key, session_data="", expire_date=timezone.now() + expire_in)
+        return SessionWatchlist.objects.create(
+            session_key=session_key,
+            content_type=ContentType.objects.get_for_model(person),
+            object_id=person.pk,
+            object_repr=str(person),
+        )
+
+    return inner
+
+
+def test_clearwatchlistsessions(add_session_item):
+    active = add_session_item("active", timedelta(days=1))
+    expired = add_session_item("expired", timedelta(days=-1))
+    call_command("clearwatchlistsessions")
+    assert SessionWatchlist.objects.filter(pk=active.pk).exists()
+    assert not SessionWatchlist.objects.filter(pk=expired.pk).exists()
+
+
+def test_clearwatchlistsessions_deleted_session(add_session_item):
+    item = add_session_item("deleted", timedelta(days=1))
+    Session.objects.filter(session_key="deleted").delete()
+    call_command("clearwatchlistsessions")
+    assert not SessionWatchlist.objects.filter(pk=item.pk).exists()
+
+
+def test_clearwatchlistsessions_cache_backend(settings, add_session_item):
+    settings.SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+    item = add_session_item("not-in-cache", timedelta(days=1))
+    call_command("clearwatchlistsessions")
+    assert not SessionWatchlist.objects.filter(pk=item.pk).exists()
+
+
+def test_clearwatchlistsessions_signed_cookies(settings, add_session_item):
+    settings.SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+    item = add_session_item("signed", timedelta(days=1))
+    with pytest.raises(CommandError):
+        call_command("clearwatchlistsessions")
+    assert SessionWatchlist.objects.filter(pk=item.pk).exists()
@@ -0,0 +1,110 @@
+import logging
+
+import pytest
+from django.template import Context, Template, engines
+
+from mizdb_watchlist.debug import (
+    COUNT_ATTR,
+    FallbackLookupError,
+    assert_no_fallback_lookups,
+    capture_fallback_lookups,
+    record_fallback_lookup,
+)
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def threshold():
+    return 1
+
+
+@pytest.fixture
+def action():
+    return "warn"
+
+
+@pytest.fixture(autouse=True)
+def debug_settings(settings, threshold, action):
+    settings.MIZDB_WATCHLIST = {"fallback_lookup_threshold": threshold, "fallback_lookup_action": action}
+
+
+@pytest.fixture
+def render_buttons(http_request):
+    """Render a toggle button for each of the given objects."""
+
+    def inner(objects, prefetch=False):
+        template = engines["django"].from_string(
+            "{% load mizdb_watchlist %}"
+            + ("{% watchlist_prefetch objects %}" if prefetch else "")
+            + "{% for obj in objects %}{% toggle_button request obj url='/toggle/' %}{% endfor %}"
+        )
+        return template.render({"request": http_request, "objects": objects})
+
+    return inner
+
+
+def test_record_fallback_lookup_counts(http_request, person):
+    record_fallback_lookup(http_request, person)
+    assert getattr(http_request, COUNT_ATTR) == 1
+
+
+@pytest.mark.parametrize("threshold", [None])
+def test_record_fallback_lookup_no_threshold(http_request, person):
+    """Assert that the lookups are not counted if no threshold is set."""
+    record_fallback_lookup(http_request, person)
+    assert not hasattr(http_request, COUNT_ATTR)
+
+
+def test_record_fallback_lookup_warns(http_request, person, caplog):
+    """Assert that a warning is logged once the threshold is exceeded."""
+    with caplog.at_level(logging.WARNING, logger="mizdb_watchlist.debug"):
+        record_fallback_lookup(http_request, person, "foo.html")
+        assert not caplog.records
+        record_fallback_lookup(http_request, person, "foo.html")
+        record_fallback_lookup(http_request, person, "foo.html")
+    assert len(caplog.records) == 1
+    assert "testapp.person" in caplog.records[0].message
+    assert "foo.html" in caplog.records[0].message
+
+
+@pytest.mark.parametrize("action", ["raise"])
+def test_record_fallback_lookup_raises(http_request, person):
+    record_fallback_lookup(http_request, person)
+    with pytest.raises(FallbackLookupError, match="testapp.person"):
+        record_fallback_lookup(http_request, person)
+
+
+@pytest.mark.parametrize("threshold", [0])
+@pytest.mark.parametrize("action", ["raise"])
+def test_toggle_button_raises_with_template_name(http_request, person):
+    """Assert that the error raised by toggle_button names the template."""
+    template = engines["django"].from_string("{% load mizdb_watchlist %}{% toggle_button request obj url='/toggle/' %}")
+    template.template.name = "person_list.html"
+    with pytest.raises(FallbackLookupError, match="person_list.html"):
+        template.render({"request": http_request, "obj": person})
+
+
+def test_toggle_button_on_watchlist_given(http_request, person):
+    """Assert that no lookup is recorded if on_watchlist was passed in."""
+    template = Template("{% load mizdb_watchlist %}{% toggle_button request obj url='/toggle/' on_watchlist=True %}")
+    with capture_fallback_lookups() as lookups:
+        template.render(Context({"request": http_request, "obj": person}))
+    assert not lookups
+
+
+def test_capture_fallback_lookups(render_buttons, person, company):
+    with capture_fallback_lookups() as lookups:
+        render_buttons([person, company])
+    assert lookups == [("testapp.person", person.pk, None), ("testapp.company", company.pk, None)]
+
+
+def test_assert_no_fallback_lookups(render_buttons, person, company):
+    with assert_no_fallback_lookups():
+        render_buttons([person, company], prefetch=True)
+
+
+def test_assert_no_fallback_lookups_fails(render_buttons, person):
+    with pytest.raises(AssertionError, match="1 fallback lookup"):
+        with assert_no_fallback_lookups():
+            render_buttons([person])
@@ -0,0 +1,149 @@
+import pytest
+from django.http import Http404
+
+from mizdb_watchlist.instrumentation import (
+    Collector,
+    InMemoryCollector,
+    get_collector,
+    instrument,
+    manager_operation,
+)
+from mizdb_watchlist.manager import ModelManager, SessionManager, get_manager
+from mizdb_watchlist.views import watchlist_metrics
+
+pytestmark = [pytest.mark.django_db]
+
+
+class ListCollector(Collector):
+    def __init__(self):
+        self.records = []
+
+    def record(self, manager, operation, duration, queries, rows):
+        self.records.append((operation, queries, rows))
+
+
+@pytest.fixture
+def instrumentation():
+    return True
+
+
+@pytest.fixture(autouse=True)
+def instrumentation_settings(settings, instrumentation):
+    settings.MIZDB_WATCHLIST = {"instrumentation": instrumentation}
+
+
+@pytest.fixture
+def collector():
+    return get_collector()
+
+
+@pytest.fixture
+def manager(http_request):
+    return get_manager(http_request)
+
+
+@pytest.mark.parametrize("instrumentation", [False])
+def test_disabled(manager, collector):
+    """Assert that the manager class is not replaced if instrumentation is disabled."""
+    assert type(manager) is ModelManager
+    assert collector is None
+
+
+def test_instrumented_manager_class(manager):
+    assert isinstance(manager, ModelManager)
+    assert type(manager) is not ModelManager
+    assert type(manager).__name__ == "ModelManager"
+    assert instrument(ModelManager) is type(manager)
+
+
+def test_records_operations(manager, collector, person, company):
+    manager.add(person)
+    manager.on_watchlist(person)
+    manager.bulk_add([company])
+    totals = collector.get_totals()
+    assert set(totals) == {("ModelManager", "add"), ("ModelManager", "on_watchlist"), ("ModelManager", "bulk_add")}
+    add = totals[("ModelManager", "add")]
+    assert add["calls"] == 1
+    assert add["seconds"] > 0
+    assert add["queries"] >= 2  # the existence check and the insert
+
+
+def test_nested_operations_not_recorded(manager, collector, person):
+    """Assert that operations called by other operations are not recorded."""
+    manager.toggle(person)
+    assert set(collector.get_totals()) == {("ModelManager", "toggle")}
+
+
+def test_lazy_queryset_operations_not_recorded(manager, collector, person, person_model):
+    """
+    Assert that annotate_queryset and filter, which only build lazy querysets,
+    are not recorded.
+    """
+    list(manager.annotate_queryset(person_model.objects.all()))
+    list(manager.filter(person_model.objects.all()))
+    assert not collector.get_totals()
+
+
+def test_records_rows_deleted(manager, collector, person_factory, person_model):
+    manager.bulk_add(person_factory.create_batch(3))
+    manager.remove(person_model.objects.first())
+    assert collector.get_totals()[("ModelManager", "remove")]["rows"] == 1
+
+
+@pytest.mark.parametrize("user", [None])
+@pytest.mark.usefixtures("add_session")
+def test_session_manager(manager, collector, person):
+    assert isinstance(manager, SessionManager)
+    manager.add(person)
+    assert collector.get_totals()[("SessionManager", "add")]["queries"] == 0
+
+
+@pytest.mark.parametrize("instrumentation", [f"{__name__}.ListCollector"])
+def test_custom_collector(manager, collector, person):
+    assert isinstance(collector, ListCollector)
+    manager.toggle(person)
+    assert len(collector.records) == 1
+    assert collector.records[0][0] == "toggle"
+
+
+def test_signal(manager, person):
+    received = []
+
+    def receiver(sender, operation, **kwargs):
+        received.append((sender, operation))
+
+    manager_operation.connect(receiver)
+    try:
+        manager.on_watchlist(person)
+    finally:
+        manager_operation.disconnect(receiver)
+    assert received == [(type(manager), "on_watchlist")]
+
+
+def test_export_prometheus(manager, collector, person):
+    manager.add(person)
+    text = collector.export_prometheus()
+    assert "# TYPE mizdb_watchlist_operation_calls_total counter" in text
+    assert 'mizdb_watchlist_operation_calls_total{manager="ModelManager",operation="add"} 1' in text
+    assert 'mizdb_watchlist_operation_rows_total{manager="ModelManager",operation="add"}' in text
+
+
+def test_in_memory_collector_reset(manager, collector, person):
+    manager.add(person)
+    collector.reset()
+    assert collector.get_totals() == {}
+    assert isinstance(collector, InMemoryCollector)
+
+
+def test_metrics_view(http_request, manager, person):
+    manager.add(person)
+    response = watchlist_metrics(http_request)
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain")
+    assert b'operation="add"' in response.content
+
+
+@pytest.mark.parametrize("instrumentation", [False])
+def test_metrics_view_disabled(http_request):
+    with pytest.raises(Http404):
+        watchlist_metrics(http_request)
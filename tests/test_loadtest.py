@@ -0,0 +1,54 @@
+"""Tests for the loadtest command of the demo project."""
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends.db import SessionStore
+
+from mizdb_watchlist.manager import SessionManager, SessionModelManager
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def command(settings):
+    # The command imports the models of the demo app.
+    settings.INSTALLED_APPS = [*settings.INSTALLED_APPS, "demo.app"]
+    from demo.app.management.commands.loadtest import Command
+
+    return Command()
+
+
+@pytest.fixture
+def session_key(client):
+    session = client.session
+    session.save()
+    return session.session_key
+
+
+@pytest.fixture
+def add_items(rf, session_key, person_factory):
+    """Add persons to the watchlist of the session with the given manager class."""
+
+    def inner(manager_class):
+        request = rf.get("/")
+        request.session = SessionStore(session_key=session_key)
+        manager = manager_class(request)
+        persons = person_factory.create_batch(2)
+        for person in persons:
+            manager.add(person)
+        request.session.save()
+        return {person.pk for person in persons}
+
+    return inner
+
+
+@pytest.mark.parametrize("manager_class", [SessionManager, SessionModelManager])
+def test_get_session_watchlist(settings, command, session_key, add_items, person_model, manager_class):
+    """
+    Assert that the command reads the watchlist of an anonymous user from
+    where the configured manager stores it.
+    """
+    settings.MIZDB_WATCHLIST = {"manager": {"session": f"mizdb_watchlist.manager.{manager_class.__name__}"}}
+    pks = add_items(manager_class)
+    content_type = ContentType.objects.get_for_model(person_model)
+    assert command._get_session_watchlist(session_key, content_type) == pks
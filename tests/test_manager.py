@@ -2,16 +2,30 @@ from operator import itemgetter
 from typing import Union
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import login
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.http import HttpResponse
+from django.utils.dateparse import parse_datetime
 
 from mizdb_watchlist.manager import (
+    WATCHLIST_COOKIE_NAME,
     WATCHLIST_SESSION_KEY,
+    ClientManager,
+    CompactSessionManager,
     ModelManager,
     SessionManager,
+    SessionModelManager,
     _get_manager_from_settings,
+    aget_manager,
     get_manager,
 )
+from mizdb_watchlist.models import SessionWatchlist
+from tests.testapp.models import Book, PersonProxy
 
 pytestmark = pytest.mark.django_db
 
@@ -189,6 +203,30 @@ class TestSessionManager:
         manager.remove(person)
         assert person.pk not in session_pks(http_request)
 
+    def test_count(self, manager, person_model, person_label, company):
+        manager.add(company)
+        assert manager.count() == 2
+        assert manager.count(person_model) == 1
+        assert manager.get_counts() == {person_label: 1, company._meta.label_lower: 1}
+
+    def test_get_version(self, manager, person, company):
+        version = manager.get_version()
+        assert manager.get_version() == version
+        manager.add(company)
+        assert manager.get_version() != version
+        manager.remove(company)
+        assert manager.get_version() == version
+
+    def test_get_model_versions(self, manager, person_label, company):
+        versions = manager.get_model_versions()
+        manager.add(company)
+        new_versions = manager.get_model_versions()
+        assert new_versions[person_label] == versions[person_label]
+        assert company._meta.label_lower in new_versions
+
+    def test_summary(self, manager, person_label):
+        assert manager.summary() == {person_label: 1}
+
     def test_removing_last_item_removes_model_watchlist(self, manager, person, session_pks):
         """
         Assert that removing the last item of a model watchlist also removes
@@ -209,6 +247,24 @@ class TestSessionManager:
         queryset = manager.annotate_queryset(queryset)
         assert not queryset.get(pk=person.pk).on_watchlist
 
+    @pytest.mark.parametrize("watchlist_items", [[]])
+    def test_add_stores_time_added(self, manager, person, person_model, watchlist_items):
+        manager.add(person)
+        assert parse_datetime(manager.get_model_watchlist(person_model)[0]["time_added"])
+
+    @pytest.mark.parametrize("watchlist_items", [[]])
+    def test_annotate_queryset_added(self, manager, person_model, person, person_factory, watchlist_items):
+        other = person_factory()
+        legacy = person_factory()
+        manager.add(person)
+        # Items stored by older versions do not have a timestamp:
+        manager.get_model_watchlist(person_model).append({"object_id": legacy.pk, "object_repr": str(legacy)})
+        queryset = manager.annotate_queryset(person_model.objects.all(), added=True)
+        time_added = manager.get_model_watchlist(person_model)[0]["time_added"]
+        assert queryset.get(pk=person.pk).watchlist_added == parse_datetime(time_added)
+        assert queryset.get(pk=other.pk).watchlist_added is None
+        assert queryset.get(pk=legacy.pk).watchlist_added is None
+
     def test_add_model_watchlist(self, manager, person_model, person_label):
         manager._add_model_watchlist(person_model)
         assert person_label in manager.get_watchlist()
@@ -299,6 +355,19 @@ class TestModelManager:
         queryset = manager.annotate_queryset(queryset)
         assert not queryset.get(pk=person.pk).on_watchlist
 
+    def test_annotate_queryset_added(self, manager, fill_watchlist, person_factory, person_model, person_watchlist):
+        person = fill_watchlist[0]
+        other = person_factory()
+        queryset = manager.annotate_queryset(person_model.objects.all(), added=True)
+        assert queryset.get(pk=person.pk).watchlist_added == person_watchlist.get(object_id=person.pk).time_added
+        assert queryset.get(pk=other.pk).watchlist_added is None
+
+    def test_annotate_queryset_added_single_query(
+        self, manager, fill_watchlist, person_model, django_assert_num_queries
+    ):
+        with django_assert_num_queries(1):
+            list(manager.annotate_queryset(person_model.objects.all(), added=True))
+
     def test_as_dict(self, manager, fill_watchlist, person_label, person):
         as_dict = manager.as_dict()
         assert person_label in as_dict
@@ -307,6 +376,12 @@ class TestModelManager:
         assert model_watchlist[0]["object_id"] == person.pk
         assert model_watchlist[0]["object_repr"] == str(person)
 
+    def test_as_dict_num_queries(self, manager, person_factory, django_assert_num_queries):
+        """Assert that the number of queries does not depend on the number of items."""
+        manager.bulk_add(person_factory.create_batch(5))
+        with django_assert_num_queries(3):  # the content type ids, the content type, the items
+            manager.as_dict()
+
     def test_prune_models(self, watchlist_model, manager, fill_watchlist, user, person_ct):
         ct = ContentType.objects.create(app_label="foo", model="bar")
         watchlist_model.objects.create(user=user, content_type=ct, object_id=0, object_repr="foo")
@@ -368,3 +443,712 @@ class TestModelManager:
         filtered_queryset = manager.filter(queryset)
         assert person in filtered_queryset
         assert new1 not in filtered_queryset
+
+    def test_count(self, manager, fill_watchlist, person_model, person_factory):
+        manager.add(person_factory())
+        assert manager.count() == 3
+        assert manager.count(person_model) == 2
+
+    def test_get_counts_cached(self, manager, fill_watchlist, person_label, company, django_assert_num_queries):
+        """Assert that the counts are only queried once and then read from the cache."""
+        expected = {person_label: 1, company._meta.label_lower: 1}
+        with django_assert_num_queries(1):
+            assert manager.get_counts() == expected
+        with django_assert_num_queries(0):
+            assert manager.get_counts() == expected
+
+    def test_counts_updated(self, manager, person, company, person_factory, person_model, django_assert_num_queries):
+        """
+        Assert that the mutating methods discard the cached counts, so that the
+        counts are counted again once.
+        """
+        assert manager.count() == 0
+        manager.add(person)
+        manager.bulk_add([company, person_factory()])
+        with django_assert_num_queries(1):
+            assert manager.count() == 3
+            assert manager.count(person_model) == 2
+        manager.remove(person)
+        with django_assert_num_queries(1):
+            assert manager.count(person_model) == 1
+            assert manager.count() == 2
+        manager.remove_model(person_model)
+        with django_assert_num_queries(1):
+            assert manager.get_counts() == {company._meta.label_lower: 1}
+            assert manager.count() == 1
+
+    def test_counts_unchanged_keep_cache(self, manager, person, person_model, django_assert_num_queries):
+        """Assert that operations that change nothing keep the cached counts."""
+        manager.add(person)
+        manager.count()
+        manager.remove(person_model(pk=0))
+        manager.bulk_add([person])
+        with django_assert_num_queries(0):
+            assert manager.count() == 1
+
+    def test_counts_proxy_model(self, manager, person, person_model):
+        """Assert that the items of a proxy model are counted as the concrete model."""
+        manager.add(PersonProxy.objects.get(pk=person.pk))
+        assert manager.count(PersonProxy) == 1
+        assert manager.count(person_model) == 1
+
+    def test_counts_prune(self, manager, person, person_factory, person_model):
+        stale = person_factory()
+        manager.bulk_add([person, stale])
+        assert manager.count(person_model) == 2
+        stale.delete()
+        manager.prune()
+        assert manager.count(person_model) == 1
+
+    def test_get_version(self, manager, person, company):
+        """Assert that the version changes with every change to the watchlist."""
+        versions = [manager.get_version()]
+        manager.add(person)
+        versions.append(manager.get_version())
+        manager.add(company)
+        versions.append(manager.get_version())
+        manager.remove(person)
+        versions.append(manager.get_version())
+        manager.add(person)
+        versions.append(manager.get_version())
+        assert len(set(versions)) == len(versions)
+        assert manager.get_version() == versions[-1]
+
+    def test_get_model_versions(self, manager, fill_watchlist, person_factory, person_label, company):
+        versions = manager.get_model_versions()
+        assert set(versions) == {person_label, company._meta.label_lower}
+        manager.add(person_factory())
+        new_versions = manager.get_model_versions()
+        assert new_versions[person_label] != versions[person_label]
+        assert new_versions[company._meta.label_lower] == versions[company._meta.label_lower]
+
+    def test_summary(self, manager, fill_watchlist, person_label, company, django_assert_num_queries):
+        """Assert that the summary is computed with a single GROUP BY query."""
+        with django_assert_num_queries(1) as queries:
+            assert manager.summary() == {person_label: 1, company._meta.label_lower: 1}
+        assert "GROUP BY" in queries.captured_queries[0]["sql"]
+        assert "object_repr" not in queries.captured_queries[0]["sql"]
+
+    def test_counts_cache_setting(self, settings, manager, fill_watchlist, person_label):
+        """Assert that the counts are stored in the cache declared in the settings."""
+        settings.CACHES = {
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "watchlist": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "watchlist"},
+        }
+        settings.MIZDB_WATCHLIST = {"cache": "watchlist"}
+        manager.get_counts()
+        try:
+            assert caches["watchlist"].get(manager._get_cache_key("counts"))[person_label] == 1
+        finally:
+            caches["watchlist"].clear()
+
+
+@pytest.mark.usefixtures("add_session")
+@pytest.mark.parametrize("manager_class", [CompactSessionManager])
+@pytest.mark.parametrize("user", [None])
+class TestCompactSessionManager:
+    @pytest.fixture
+    def watchlist_items(self, person) -> list:
+        """Default items for the session watchlist."""
+        return [person.pk]
+
+    @pytest.fixture
+    def session_data(self, person_label, watchlist_items) -> dict:
+        return {WATCHLIST_SESSION_KEY: {person_label: watchlist_items}}
+
+    @pytest.fixture
+    def session_pks(self, http_request, person_label):
+        """Return the primary keys stored in the session watchlist."""
+
+        def inner() -> list[int]:
+            return http_request.session[WATCHLIST_SESSION_KEY].get(person_label, [])
+
+        return inner
+
+    def test_on_watchlist(self, manager, person):
+        assert manager.on_watchlist(person)
+
+    @pytest.mark.parametrize("watchlist_items", [[]])
+    def test_not_on_watchlist(self, manager, person, watchlist_items):
+        assert not manager.on_watchlist(person)
+
+    @pytest.mark.parametrize("watchlist_items", [[]])
+    def test_add_keeps_pks_sorted(self, manager, person_factory, session_pks, watchlist_items):
+        persons = [person_factory(id=pk) for pk in (30, 10, 20)]
+        for obj in persons:
+            manager.add(obj)
+        assert session_pks() == [10, 20, 30]
+
+    def test_add_already_on_watchlist(self, manager, person, session_pks):
+        manager.add(person)
+        assert session_pks().count(person.pk) == 1
+
+    def test_remove(self, manager, person, session_pks):
+        manager.remove(person)
+        assert person.pk not in session_pks()
+
+    def test_remove_object_id_not_on_watchlist(self, manager, person_model, person, session_pks):
+        manager.remove_object_id(manager.get_model_watchlist(person_model), -1)
+        assert session_pks() == [person.pk]
+
+    @pytest.mark.parametrize("watchlist_items", [[]])
+    def test_add_max_items(self, settings, manager, person_factory, session_pks, watchlist_items):
+        settings.MIZDB_WATCHLIST = {"session_max_items": 1}
+        new1 = person_factory()
+        new2 = person_factory()
+        assert manager.toggle(new1)
+        assert not manager.toggle(new2)
+        assert session_pks() == [new1.pk]
+
+    @pytest.mark.parametrize("watchlist_items", [[]])
+    def test_set_on_watchlist_max_items(self, settings, manager, person_factory, session_pks, watchlist_items):
+        """Assert that set_on_watchlist returns False if the watchlist is full."""
+        settings.MIZDB_WATCHLIST = {"session_max_items": 1}
+        new1 = person_factory()
+        new2 = person_factory()
+        assert manager.set_on_watchlist(new1, True)
+        assert not manager.set_on_watchlist(new2, True)
+        assert session_pks() == [new1.pk]
+
+    def test_as_dict_resolves_object_repr(self, manager, person_label, person):
+        assert manager.as_dict() == {person_label: [{"object_id": person.pk, "object_repr": str(person)}]}
+
+    def test_as_dict_skips_unknown_models_and_objects(self, manager, http_request, person_label, person):
+        http_request.session[WATCHLIST_SESSION_KEY]["foo.bar"] = [1]
+        http_request.session[WATCHLIST_SESSION_KEY][person_label].append(-1)
+        assert manager.as_dict() == {person_label: [{"object_id": person.pk, "object_repr": str(person)}]}
+
+    @pytest.mark.parametrize("watchlist_items", [[{"object_id": 42, "object_repr": "foo"}, {"object_id": 1}]])
+    def test_get_watchlist_converts_legacy_watchlist(self, manager, http_request, session_pks, watchlist_items):
+        manager.get_watchlist()
+        assert session_pks() == [1, 42]
+        assert http_request.session.modified
+
+    def test_annotate_queryset(self, manager, person_model, person_factory, person):
+        other = person_factory()
+        queryset = manager.annotate_queryset(person_model.objects.all())
+        assert queryset.get(pk=person.pk).on_watchlist
+        assert not queryset.get(pk=other.pk).on_watchlist
+
+    def test_annotate_queryset_added(self, manager, person_model, person):
+        """The compact watchlist does not store the time items were added."""
+        queryset = manager.annotate_queryset(person_model.objects.all(), added=True)
+        assert queryset.get(pk=person.pk).watchlist_added is None
+
+    def test_prune_model_objects(self, manager, person_model, person, watchlist_items):
+        watchlist_items.insert(0, 0)
+        manager._prune_model_objects()
+        assert manager.get_model_watchlist(person_model) == [person.pk]
+
+
+@pytest.mark.usefixtures("add_session")
+@pytest.mark.parametrize("manager_class", [SessionModelManager])
+@pytest.mark.parametrize("user", [None])
+class TestSessionModelManager:
+    @pytest.fixture
+    def session_watchlist(self, http_request, person_ct):
+        """Return the items of the request session's watchlist for the Person model."""
+
+        def inner():
+            return SessionWatchlist.objects.filter(session_key=http_request.session.session_key, content_type=person_ct)
+
+        return inner
+
+    @pytest.fixture
+    def add_to_session_watchlist(self, http_request):
+        """Add the given object to the request session's watchlist."""
+
+        def inner(obj, session_key=None):
+            if session_key is None:
+                if not http_request.session.session_key:
+                    http_request.session.save()
+                session_key = http_request.session.session_key
+            return SessionWatchlist.objects.create(
+                session_key=session_key,
+                content_type=ContentType.objects.get_for_model(obj),
+                object_id=obj.pk,
+                object_repr=str(obj),
+            )
+
+        return inner
+
+    def test_get_watchlist_no_session_key(self, manager, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            assert not manager.get_watchlist()
+
+    def test_add(self, manager, http_request, person, session_watchlist):
+        manager.add(person)
+        assert http_request.session.session_key
+        assert http_request.session.modified
+        assert session_watchlist().filter(object_id=person.pk).exists()
+
+    def test_add_already_on_watchlist(self, manager, person, add_to_session_watchlist, session_watchlist):
+        add_to_session_watchlist(person)
+        manager.add(person)
+        assert session_watchlist().filter(object_id=person.pk).count() == 1
+
+    def test_on_watchlist(self, manager, person, add_to_session_watchlist):
+        add_to_session_watchlist(person)
+        assert manager.on_watchlist(person)
+
+    def test_on_watchlist_other_session(self, manager, person, add_to_session_watchlist):
+        add_to_session_watchlist(person, session_key="other")
+        assert not manager.on_watchlist(person)
+
+    def test_remove(self, manager, person, add_to_session_watchlist, session_watchlist):
+        add_to_session_watchlist(person)
+        manager.remove(person)
+        assert not session_watchlist().exists()
+
+    def test_toggle(self, manager, person, session_watchlist):
+        assert manager.toggle(person)
+        assert session_watchlist().filter(object_id=person.pk).exists()
+        assert not manager.toggle(person)
+        assert not session_watchlist().exists()
+
+    def test_annotate_queryset(self, manager, person_model, person_factory, person, add_to_session_watchlist):
+        other = person_factory()
+        add_to_session_watchlist(person)
+        add_to_session_watchlist(other, session_key="other")
+        queryset = manager.annotate_queryset(person_model.objects.all())
+        assert queryset.get(pk=person.pk).on_watchlist
+        assert not queryset.get(pk=other.pk).on_watchlist
+
+    def test_annotate_queryset_no_session_key(self, manager, person_model, person):
+        queryset = manager.annotate_queryset(person_model.objects.all())
+        assert not queryset.get(pk=person.pk).on_watchlist
+
+    def test_annotate_queryset_added(self, manager, person_model, person, person_factory):
+        other = person_factory()
+        manager.add(person)
+        queryset = manager.annotate_queryset(person_model.objects.all(), added=True)
+        assert queryset.get(pk=person.pk).watchlist_added
+        assert queryset.get(pk=other.pk).watchlist_added is None
+
+    def test_as_dict(self, manager, person_label, person, add_to_session_watchlist):
+        add_to_session_watchlist(person)
+        assert manager.as_dict() == {person_label: [{"object_id": person.pk, "object_repr": str(person)}]}
+
+    def test_bulk_add(self, manager, person_factory, session_watchlist):
+        new1 = person_factory()
+        new2 = person_factory()
+        manager.bulk_add([new1, new2])
+        assert session_watchlist().count() == 2
+
+    def test_remove_model(self, manager, person_model, person, add_to_session_watchlist, session_watchlist):
+        add_to_session_watchlist(person)
+        manager.remove_model(person_model)
+        assert not session_watchlist().exists()
+
+    def test_count_no_session_key(self, manager, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            assert manager.count() == 0
+
+    def test_counts_cached_per_session(self, manager, person, person_factory, add_to_session_watchlist):
+        add_to_session_watchlist(person)
+        add_to_session_watchlist(person_factory(), session_key="other")
+        assert manager.count() == 1
+        assert manager._get_cache_key("counts").endswith(manager.request.session.session_key)
+        manager.toggle(person)
+        assert manager.count() == 0
+
+    def test_signed_cookies_session_engine(self, settings, manager_class, http_request):
+        settings.SESSION_ENGINE = "django.contrib.sessions.backends.signed_cookies"
+        with pytest.raises(ImproperlyConfigured):
+            manager_class(http_request)
+
+    def test_login_moves_items(
+        self, settings, manager_class, http_request, admin_user, person, add_to_session_watchlist
+    ):
+        manager_path = f"{manager_class.__module__}.{manager_class.__name__}"
+        settings.MIZDB_WATCHLIST = {"manager": {"session": manager_path}}
+        item = add_to_session_watchlist(person)
+        old_key = http_request.session.session_key
+        http_request.COOKIES[settings.SESSION_COOKIE_NAME] = old_key
+        login(http_request, admin_user)
+        assert http_request.session.session_key != old_key
+        item.refresh_from_db()
+        assert item.session_key == http_request.session.session_key
+
+
+@pytest.mark.usefixtures("add_session")
+@pytest.mark.parametrize(
+    "manager_class, user",
+    [
+        (SessionManager, None),
+        (CompactSessionManager, None),
+        (ModelManager, "admin_user"),
+        (SessionModelManager, None),
+    ],
+)
+class TestAnnotateRelations:
+    @pytest.fixture
+    def books(self, manager, book_factory, company_factory):
+        """
+        Create two books. The author and the publisher's parent of the first
+        book are on the watchlist.
+        """
+        watched_parent = company_factory()
+        watched_book = book_factory(publisher=company_factory(parent=watched_parent))
+        other_book = book_factory(publisher=company_factory(parent=company_factory()))
+        manager.add(watched_book.author)
+        manager.add(watched_parent)
+        return watched_book, other_book
+
+    def test_annotate_relations(self, manager, books, django_assert_num_queries):
+        watched_book, other_book = books
+        queryset = manager.annotate_queryset(Book.objects.all(), relations=["author", "publisher__parent"])
+        with django_assert_num_queries(1):
+            annotated = {book.pk: book for book in queryset}
+        assert annotated[watched_book.pk].author__on_watchlist
+        assert annotated[watched_book.pk].publisher__parent__on_watchlist
+        assert not annotated[other_book.pk].author__on_watchlist
+        assert not annotated[other_book.pk].publisher__parent__on_watchlist
+        assert not annotated[watched_book.pk].on_watchlist
+
+    def test_annotate_relations_null(self, manager, books, book_factory):
+        book = book_factory(publisher=None)
+        queryset = manager.annotate_queryset(Book.objects.all(), relations=["publisher__parent"])
+        assert not queryset.get(pk=book.pk).publisher__parent__on_watchlist
+
+    def test_annotate_relations_filter(self, manager, books):
+        watched_book, _other_book = books
+        queryset = manager.annotate_queryset(Book.objects.all(), relations=["author"])
+        assert list(queryset.filter(author__on_watchlist=True)) == [watched_book]
+
+    @pytest.mark.parametrize("path", ["title", "author__book", "author__foo"])
+    def test_annotate_relations_invalid_path(self, manager, path):
+        with pytest.raises((ValueError, FieldDoesNotExist)):
+            manager.annotate_queryset(Book.objects.all(), relations=[path])
+
+
+@pytest.mark.usefixtures("add_session")
+@pytest.mark.parametrize(
+    "manager_class, user",
+    [
+        (SessionManager, None),
+        (CompactSessionManager, None),
+        (ClientManager, None),
+        (ModelManager, "admin_user"),
+        (SessionModelManager, None),
+    ],
+)
+class TestMembership:
+    @pytest.fixture
+    def objects(self, manager, person_factory, company_factory, book_factory):
+        """Return a mixed list of objects; every other object is on the watchlist."""
+        objects = [person_factory(), person_factory(), company_factory(), company_factory(), book_factory()]
+        for obj in objects[::2]:
+            manager.add(obj)
+        return objects
+
+    def test_membership(self, manager, objects):
+        membership = manager.membership(objects)
+        assert membership == {(obj._meta.label_lower, obj.pk): i % 2 == 0 for i, obj in enumerate(objects)}
+
+    def test_membership_empty(self, manager, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            assert manager.membership([]) == {}
+
+    def test_annotate_objects(self, manager, objects):
+        annotated = manager.annotate_objects(iter(objects))
+        assert annotated == objects
+        assert [obj.on_watchlist for obj in annotated] == [True, False, True, False, True]
+
+    def test_membership_num_queries(self, manager, objects, django_assert_max_num_queries):
+        """The number of queries must not depend on the number of objects or models."""
+        manager.get_counts()  # session managers may resolve their storage first
+        with django_assert_max_num_queries(1):
+            manager.membership(objects)
+
+
+@pytest.mark.usefixtures("add_session")
+@pytest.mark.parametrize(
+    "manager_class, user",
+    [
+        (SessionManager, None),
+        (CompactSessionManager, None),
+        (ClientManager, None),
+        (ModelManager, "admin_user"),
+        (SessionModelManager, None),
+    ],
+)
+class TestSetOnWatchlist:
+    def test_set_on_watchlist(self, manager, person):
+        assert manager.set_on_watchlist(person, True)
+        assert manager.set_on_watchlist(person, True)
+        assert manager.on_watchlist(person)
+        assert manager.count() == 1
+        assert not manager.set_on_watchlist(person, False)
+        assert not manager.set_on_watchlist(person, False)
+        assert not manager.on_watchlist(person)
+
+    def test_aset_on_watchlist(self, manager, person):
+        assert async_to_sync(manager.aset_on_watchlist)(person, True)
+        assert async_to_sync(manager.aset_on_watchlist)(person, True)
+        assert manager.on_watchlist(person)
+        assert not async_to_sync(manager.aset_on_watchlist)(person, False)
+        assert not manager.on_watchlist(person)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("", {}),
+        ("testapp.person:3-1-2", {"testapp.person": [1, 2, 3]}),
+        ("testapp.person:1|testapp.company:2-3", {"testapp.person": [1], "testapp.company": [2, 3]}),
+        ("testapp.person:1|testapp.company:foo|:2", {"testapp.person": [1]}),
+    ],
+)
+def test_client_manager_decode(value, expected):
+    assert ClientManager._decode(value) == expected
+
+
+@pytest.mark.parametrize("label", ["foo", "foo.bar", "testapp.person.foo"])
+def test_client_manager_decode_malformed_label(label):
+    """Assert that _decode drops items with labels that are not model labels."""
+    assert ClientManager._decode(f"{label}:1|testapp.person:2") == {"testapp.person": [2]}
+
+
+@pytest.mark.parametrize("label", ["auth.user", "auth.group", "sessions.session", "mizdb_watchlist.watchlist"])
+def test_client_manager_decode_unwatchable_model(label):
+    """Assert that _decode drops items of models that are not watchable."""
+    assert ClientManager._decode(f"{label}:1|testapp.person:2") == {"testapp.person": [2]}
+
+
+def test_client_manager_decode_normalizes_label():
+    assert ClientManager._decode("testapp.Person:1") == {"testapp.person": [1]}
+
+
+def test_client_manager_encode():
+    watchlist = {"testapp.person": [1, 2], "testapp.company": [], "foo.bar": [3]}
+    assert ClientManager._encode(watchlist) == "testapp.person:1-2|foo.bar:3"
+
+
+@pytest.mark.parametrize("manager_class", [ClientManager])
+@pytest.mark.parametrize("user", [None])
+class TestClientManager:
+    @pytest.fixture
+    def cookie(self, person_label, person):
+        """The value of the watchlist cookie."""
+        return f"{person_label}:{person.pk}"
+
+    @pytest.fixture
+    def manager(self, manager_class, http_request, cookie):
+        http_request.COOKIES[WATCHLIST_COOKIE_NAME] = cookie
+        return manager_class(http_request)
+
+    def test_on_watchlist(self, manager, person):
+        assert manager.on_watchlist(person)
+
+    @pytest.mark.parametrize("cookie", [""])
+    def test_not_on_watchlist(self, manager, person, cookie):
+        assert not manager.on_watchlist(person)
+
+    def test_annotate_queryset(self, manager, person_model, person_factory, person):
+        other = person_factory()
+        queryset = manager.annotate_queryset(person_model.objects.all())
+        assert queryset.get(pk=person.pk).on_watchlist
+        assert not queryset.get(pk=other.pk).on_watchlist
+
+    def test_update_response(self, manager, person_label, person, person_factory):
+        other = person_factory()
+        manager.add(other)
+        response = manager.update_response(HttpResponse())
+        expected = f"{person_label}:{'-'.join(map(str, sorted([person.pk, other.pk])))}"
+        assert response.cookies[WATCHLIST_COOKIE_NAME].value == expected
+
+    def test_update_response_not_modified(self, manager, person):
+        manager.on_watchlist(person)
+        response = manager.update_response(HttpResponse())
+        assert WATCHLIST_COOKIE_NAME not in response.cookies
+
+    def test_does_not_access_session(self, manager, http_request, person, person_factory):
+        """Assert that the manager does not require a session."""
+        assert not hasattr(http_request, "session")
+        manager.toggle(person)
+        manager.add(person_factory())
+        assert manager.get_watchlist()
+
+
+def test_aget_manager_auser(http_request, user):
+    """Assert that aget_manager resolves the user with request.auser()."""
+
+    async def auser():
+        return user
+
+    http_request.user = None
+    http_request.auser = auser
+    manager = async_to_sync(aget_manager)(http_request)
+    assert isinstance(manager, ModelManager)
+    assert manager.user == user
+
+
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_aget_manager_anonymous(http_request, user):
+    assert isinstance(async_to_sync(aget_manager)(http_request), SessionManager)
+
+
+@pytest.mark.parametrize("manager_class", [ModelManager, SessionModelManager])
+@pytest.mark.usefixtures("add_session")
+class TestModelManagerAsync:
+    @pytest.fixture
+    def model_watchlist(self, manager, person_model):
+        """Return the manager's watchlist items for the Person model."""
+
+        def inner():
+            return manager.get_model_watchlist(person_model)
+
+        return inner
+
+    def test_aadd(self, manager, person, model_watchlist):
+        async_to_sync(manager.aadd)(person)
+        assert model_watchlist().filter(object_id=person.pk).count() == 1
+        async_to_sync(manager.aadd)(person)
+        assert model_watchlist().filter(object_id=person.pk).count() == 1
+
+    def test_aon_watchlist(self, manager, person):
+        assert not async_to_sync(manager.aon_watchlist)(person)
+        manager.add(person)
+        assert async_to_sync(manager.aon_watchlist)(person)
+
+    def test_aremove(self, manager, person, model_watchlist):
+        manager.add(person)
+        async_to_sync(manager.aremove)(person)
+        assert not model_watchlist().exists()
+
+    def test_atoggle(self, manager, person, model_watchlist):
+        assert async_to_sync(manager.atoggle)(person)
+        assert model_watchlist().filter(object_id=person.pk).exists()
+        assert not async_to_sync(manager.atoggle)(person)
+        assert not model_watchlist().exists()
+
+    def test_abulk_add(self, manager, person_factory, person_model, person, model_watchlist):
+        manager.add(person)
+        new = person_factory()
+        async_to_sync(manager.abulk_add)(person_model.objects.all())
+        assert sorted(manager.pks(model_watchlist())) == sorted([person.pk, new.pk])
+
+    def test_abulk_add_empty(self, manager, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            async_to_sync(manager.abulk_add)([])
+
+    def test_abulk_add_num_queries(
+        self, manager, person, person_factory, company_factory, django_assert_max_num_queries
+    ):
+        """Assert that the number of queries does not grow with the objects."""
+        # Add an item first, so that session managers have created the session.
+        async_to_sync(manager.aadd)(person)
+        objects = [*person_factory.create_batch(10), *company_factory.create_batch(10)]
+        # Per model: the existing items and the content type. Plus the insert.
+        with django_assert_max_num_queries(5):
+            async_to_sync(manager.abulk_add)(objects)
+        assert async_to_sync(manager.acount)() == 21
+
+    def test_abulk_add_duplicates(self, manager, person, model_watchlist):
+        async_to_sync(manager.abulk_add)([person, person])
+        assert model_watchlist().count() == 1
+
+    def test_aremove_model(self, manager, person, company, person_model, model_watchlist):
+        manager.bulk_add([person, company])
+        async_to_sync(manager.aremove_model)(person_model)
+        assert not model_watchlist().exists()
+        assert manager.on_watchlist(company)
+
+    def test_aas_dict(self, manager, person, company):
+        manager.bulk_add([person, company])
+        assert async_to_sync(manager.aas_dict)() == manager.as_dict()
+
+    def test_aprune(self, manager, person, person_factory, model_watchlist):
+        stale = person_factory()
+        manager.bulk_add([person, stale])
+        stale.delete()
+        async_to_sync(manager.aprune)()
+        assert manager.pks(model_watchlist()) == [person.pk]
+
+    def test_aprune_stale_model(self, manager):
+        ct = ContentType.objects.create(app_label="foo", model="bar")
+        manager.model.objects.create(**manager._get_owner_kwargs(), content_type=ct, object_id=0, object_repr="foo")
+        async_to_sync(manager.aprune)()
+        assert not manager.get_watchlist().filter(content_type=ct).exists()
+
+    def test_acount(self, manager, person, company, person_factory, person_model):
+        async_to_sync(manager.aadd)(person)
+        async_to_sync(manager.abulk_add)([company, person_factory()])
+        assert async_to_sync(manager.acount)() == 3
+        assert async_to_sync(manager.acount)(person_model) == 2
+        async_to_sync(manager.aremove)(person)
+        assert async_to_sync(manager.acount)(person_model) == 1
+        async_to_sync(manager.aremove_model)(person_model)
+        assert async_to_sync(manager.aget_counts)() == manager.get_counts() == {company._meta.label_lower: 1}
+
+    def test_aget_version(self, manager, person):
+        version = async_to_sync(manager.aget_version)()
+        assert version == manager.get_version()
+        manager.add(person)
+        assert async_to_sync(manager.aget_version)() == manager.get_version() != version
+
+
+@pytest.mark.parametrize("manager_class", [SessionManager, CompactSessionManager])
+@pytest.mark.parametrize("user", [None])
+@pytest.mark.usefixtures("add_session")
+class TestSessionManagerAsync:
+    def test_atoggle(self, manager, person):
+        assert async_to_sync(manager.atoggle)(person)
+        assert async_to_sync(manager.aon_watchlist)(person)
+        assert not async_to_sync(manager.atoggle)(person)
+        assert not async_to_sync(manager.aon_watchlist)(person)
+
+    def test_aload_unloaded_session(self, manager, http_request, person):
+        """
+        Assert that the async methods load the session data before the
+        synchronous methods read it, so that those do not query the session
+        store inside the event loop.
+        """
+        manager.add(person)
+        http_request.session.save()
+        http_request.session = SessionStore(session_key=http_request.session.session_key)
+        assert async_to_sync(manager.aon_watchlist)(person)
+
+    def test_aadd_aremove(self, manager, person):
+        async_to_sync(manager.aadd)(person)
+        assert manager.on_watchlist(person)
+        async_to_sync(manager.aremove)(person)
+        assert not manager.on_watchlist(person)
+
+    def test_abulk_add(self, manager, person_factory, person_model):
+        new1 = person_factory()
+        new2 = person_factory()
+        async_to_sync(manager.abulk_add)(person_model.objects.all())
+        assert manager.on_watchlist(new1)
+        assert manager.on_watchlist(new2)
+
+    def test_aremove_model(self, manager, person, person_model):
+        manager.add(person)
+        async_to_sync(manager.aremove_model)(person_model)
+        assert not manager.get_model_watchlist(person_model)
+        # Removing a model that is not on the watchlist should not fail:
+        async_to_sync(manager.aremove_model)(person_model)
+
+    def test_aas_dict(self, manager, person, person_label):
+        manager.add(person)
+        as_dict = async_to_sync(manager.aas_dict)()
+        assert as_dict[person_label][0]["object_id"] == person.pk
+
+    def test_aprune(self, manager, person, person_factory, person_model):
+        stale = person_factory()
+        manager.bulk_add([person, stale])
+        stale.delete()
+        async_to_sync(manager.aprune)()
+        assert manager.pks(manager.get_model_watchlist(person_model)) == [person.pk]
+
+    def test_acount(self, manager, person, person_model):
+        assert async_to_sync(manager.acount)() == 0
+        manager.add(person)
+        assert async_to_sync(manager.acount)(person_model) == 1
+
+    def test_asummary_aget_version(self, manager, person, person_label):
+        version = async_to_sync(manager.aget_version)()
+        manager.add(person)
+        assert async_to_sync(manager.aget_version)() != version
+        assert async_to_sync(manager.asummary)() == {person_label: 1}
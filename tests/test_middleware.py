@@ -0,0 +1,123 @@
+import re
+
+import pytest
+from django.http import HttpResponse
+from django.template import engines
+
+from mizdb_watchlist.middleware import TIMINGS_ATTR, ServerTimingMiddleware, server_timed, server_timing
+from mizdb_watchlist.views import WatchlistViewMixin, watchlist_remove_all, watchlist_toggle
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture
+def request_data(person):
+    return {"object_id": person.pk, "model_label": person._meta.label_lower}
+
+
+@pytest.fixture
+def middleware():
+    def inner(view):
+        return ServerTimingMiddleware(view)
+
+    return inner
+
+
+def get_entries(response):
+    """Return the Server-Timing entries of the response, keyed by name."""
+    entries = {}
+    for entry in response["Server-Timing"].split(", "):
+        name, *params = entry.split(";")
+        entries[name] = params
+    return entries
+
+
+@pytest.mark.usefixtures("login_user", "ignore_csrf_protection")
+@pytest.mark.parametrize("request_method", ["POST"])
+def test_toggle(http_request, middleware):
+    response = middleware(watchlist_toggle)(http_request)
+    entries = get_entries(response)
+    assert set(entries) == {"watchlist-toggle"}
+    duration, desc = entries["watchlist-toggle"]
+    assert re.fullmatch(r"dur=\d+\.\d{3}", duration)
+    assert re.fullmatch(r'desc="[1-9]\d* queries"', desc)
+
+
+@pytest.mark.usefixtures("login_user", "ignore_csrf_protection")
+@pytest.mark.parametrize("request_method", ["POST"])
+def test_remove_all(http_request, middleware):
+    response = middleware(watchlist_remove_all)(http_request)
+    assert set(get_entries(response)) == {"watchlist-remove-all"}
+
+
+def test_membership(http_request, middleware, person, company):
+    """Assert that the lookups of the toggle buttons are added to one entry."""
+    template = engines["django"].from_string(
+        "{% load mizdb_watchlist %}{% for obj in objects %}{% toggle_button request obj url='/toggle/' %}{% endfor %}"
+    )
+
+    def view(request):
+        return HttpResponse(template.render({"request": request, "objects": [person, company]}))
+
+    entries = get_entries(middleware(view)(http_request))
+    assert set(entries) == {"watchlist-membership"}
+
+
+@pytest.mark.usefixtures("login_user")
+def test_overview(http_request, middleware, fill_watchlist):
+    """Assert that the overview and its parts are timed with their own entries."""
+
+    class Overview(WatchlistViewMixin):
+        def get_object_url(self, request, model, pk):
+            return f"/{pk}/"
+
+        def get_changelist_url(self, request, model):
+            return ""
+
+    def view(request):
+        Overview().get_watchlist_context(request)
+        return HttpResponse()
+
+    entries = get_entries(middleware(view)(http_request))
+    assert set(entries) == {"watchlist-overview", "watchlist-prune", "watchlist-as-dict", "watchlist-urls"}
+
+
+def test_server_timed_method(http_request, middleware):
+    """Assert that server_timed finds the request of a method."""
+
+    class View:
+        @server_timed("watchlist-toggle")
+        def get(self, request):
+            return HttpResponse()
+
+    def view(request):
+        return View().get(request)
+
+    assert set(get_entries(middleware(view)(http_request))) == {"watchlist-toggle"}
+
+
+def test_no_timings(http_request, middleware):
+    """Assert that no header is added if the watchlist did not do any work."""
+    response = middleware(lambda request: HttpResponse())(http_request)
+    assert not response.has_header("Server-Timing")
+
+
+def test_existing_header(http_request, middleware):
+    """Assert that the entries are appended to an existing Server-Timing header."""
+
+    def view(request):
+        with server_timing(request, "watchlist-toggle"):
+            pass
+        response = HttpResponse()
+        response["Server-Timing"] = "db;dur=1"
+        return response
+
+    response = middleware(view)(http_request)
+    assert response["Server-Timing"].startswith("db;dur=1, watchlist-toggle;dur=")
+
+
+def test_server_timing_without_middleware(http_request, person):
+    """Assert that server_timing does nothing without the middleware."""
+    with server_timing(http_request, "watchlist-toggle"):
+        person.refresh_from_db()
+    assert not hasattr(http_request, TIMINGS_ATTR)
@@ -0,0 +1,161 @@
+import pytest
+from django.contrib.sessions.backends.db import SessionStore
+from django.http import HttpResponse
+from django.template import engines
+
+pytest.importorskip("debug_toolbar")
+
+from debug_toolbar.toolbar import DebugToolbar  # noqa: E402
+
+from mizdb_watchlist.manager import ModelManager, get_manager  # noqa: E402
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.fixture(autouse=True)
+def panel_settings(settings):
+    settings.DEBUG_TOOLBAR_PANELS = ["mizdb_watchlist.panels.WatchlistPanel"]
+
+
+@pytest.fixture
+def record(http_request):
+    """Process the request with the given view and return the panel."""
+
+    def inner(view):
+        toolbar = DebugToolbar(http_request, view)
+        panel = toolbar.get_panel_by_id("WatchlistPanel")
+        panel.enable_instrumentation()
+        try:
+            response = toolbar.process_request(http_request)
+        finally:
+            panel.disable_instrumentation()
+        panel.generate_stats(http_request, response)
+        return panel
+
+    return inner
+
+
+@pytest.fixture
+def render_buttons(person, company):
+    def inner(request, prefetch=False):
+        template = engines["django"].from_string(
+            "{% load mizdb_watchlist %}"
+            + ("{% watchlist_prefetch objects %}" if prefetch else "")
+            + "{% for obj in objects %}{% toggle_button request obj url='/toggle/' %}{% endfor %}"
+        )
+        return HttpResponse(template.render({"request": request, "objects": [person, company]}))
+
+    return inner
+
+
+def test_managers(record, render_buttons):
+    """Assert that the panel lists every manager created during the request."""
+    stats = record(render_buttons).get_stats()
+    assert len(stats["managers"]) == 2
+    assert all("render_buttons" not in manager["caller"] for manager in stats["managers"])
+    assert "mizdb_watchlist.py" in stats["managers"][0]["caller"]
+
+
+def test_fallback_checks(record, render_buttons):
+    stats = record(render_buttons).get_stats()
+    assert stats["check_counts"] == {"annotation": 0, "prefetch": 0, "fallback": 2}
+    assert [check["model"] for check in stats["checks"]] == ["testapp.person", "testapp.company"]
+    assert any("2 toggle button(s)" in warning for warning in stats["warnings"])
+
+
+def test_prefetch_checks(record, render_buttons):
+    stats = record(lambda request: render_buttons(request, prefetch=True)).get_stats()
+    assert stats["check_counts"] == {"annotation": 0, "prefetch": 2, "fallback": 0}
+
+
+def test_annotation_checks(record, person):
+    template = engines["django"].from_string(
+        "{% load mizdb_watchlist %}{% toggle_button request obj url='/toggle/' on_watchlist=True %}"
+    )
+    stats = record(lambda request: HttpResponse(template.render({"request": request, "obj": person}))).get_stats()
+    assert stats["check_counts"]["annotation"] == 1
+    assert not stats["operations"]
+
+
+def test_operations(record, person):
+    """
+    Assert that the operations are recorded with their SQL, even if the
+    instrumentation setting is not set.
+    """
+
+    def view(request):
+        get_manager(request).toggle(person)
+        return HttpResponse()
+
+    stats = record(view).get_stats()
+    (operation,) = stats["operations"]
+    assert operation["operation"] == "toggle"
+    assert operation["queries"] == len(operation["sql"]) > 0
+    assert any("INSERT" in sql for sql in operation["sql"])
+
+
+def test_prune(record, fill_watchlist):
+    def view(request):
+        get_manager(request).prune()
+        return HttpResponse()
+
+    stats = record(view).get_stats()
+    assert [prune["manager"] for prune in stats["prunes"]] == ["ModelManager"]
+
+
+def test_instrumentation_reset(record, http_request):
+    """Assert that the managers are no longer instrumented after the request."""
+    record(lambda request: HttpResponse())
+    assert type(get_manager(http_request)) is ModelManager
+
+
+@pytest.mark.parametrize("user", [None])
+@pytest.mark.usefixtures("add_session")
+def test_session_written_on_get(record, http_request, person):
+    http_request.session.modified = False
+
+    def view(request):
+        get_manager(request).add(person)
+        return HttpResponse()
+
+    stats = record(view).get_stats()
+    assert stats["session_read"] > 0
+    assert stats["session_written"] > stats["session_read"]
+    assert any("session was written on a GET request" in warning for warning in stats["warnings"])
+
+
+@pytest.mark.parametrize("user", [None])
+def test_session_read_does_not_load_session(record, http_request, person):
+    """Assert that the panel does not read a session that the request did not read."""
+    http_request.session = SessionStore()
+    template = engines["django"].from_string(
+        "{% load mizdb_watchlist %}{% toggle_button request obj url='/toggle/' on_watchlist=True %}"
+    )
+
+    def view(request):
+        get_manager(request)
+        return HttpResponse(template.render({"request": request, "obj": person}))
+
+    stats = record(view).get_stats()
+    assert stats["session_read"] is None
+    assert not http_request.session.accessed
+
+
+def test_other_requests_ignored(record, rf, person):
+    """Assert that managers of other requests are not recorded."""
+
+    def view(request):
+        other = rf.get("/")
+        other.user = request.user
+        get_manager(other).toggle(person)
+        return HttpResponse()
+
+    stats = record(view).get_stats()
+    assert not stats["managers"]
+    assert not stats["operations"]
+
+
+def test_content(record, render_buttons):
+    content = record(render_buttons).content
+    assert "Fallback lookups" in content
+    assert "testapp.person" in content
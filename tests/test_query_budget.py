@@ -0,0 +1,207 @@
+"""
+Pin the number of queries made by the watchlist views and template tags.
+
+Each page is requested with a watchlist of 1 and of 10 items, and must make
+exactly the number of queries in BUDGETS in both cases: a change that makes
+the number of queries depend on the number of watchlist items fails these
+tests. Pages are requested by an anonymous user (with the session watchlist)
+and by an authenticated user (with the Watchlist model). The admin pages are
+only available to staff users and are only requested by the authenticated
+user.
+"""
+
+import pytest
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.http import HttpResponse
+from django.template import engines
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.views.generic import ListView, TemplateView
+
+from mizdb_watchlist.actions import add_to_watchlist
+from mizdb_watchlist.admin import WatchlistAdmin
+from mizdb_watchlist.admin import WatchlistMixin as AdminWatchlistMixin
+from mizdb_watchlist.manager import WATCHLIST_SESSION_KEY
+from mizdb_watchlist.models import Watchlist
+from mizdb_watchlist.views import WatchlistMixin, WatchlistViewMixin, annotate_view_queryset
+from tests.testapp.models import Person
+
+ANONYMOUS = "anonymous"
+AUTHENTICATED = "authenticated"
+
+# The number of toggle buttons on the toggle button pages.
+BUTTONS = 100
+
+# The number of queries per page and user type.
+BUDGETS = {
+    "toggle": {ANONYMOUS: 5, AUTHENTICATED: 6},
+    "remove": {ANONYMOUS: 5, AUTHENTICATED: 5},
+    "remove_all": {ANONYMOUS: 4, AUTHENTICATED: 4},
+    "overview": {ANONYMOUS: 2, AUTHENTICATED: 9},
+    "changelist": {ANONYMOUS: 2, AUTHENTICATED: 3},
+    "buttons_annotated": {ANONYMOUS: 2, AUTHENTICATED: 3},
+    # One query per button with the Watchlist model:
+    "buttons": {ANONYMOUS: 2, AUTHENTICATED: 3 + BUTTONS},
+    "admin_overview": {AUTHENTICATED: 9},
+    "admin_changelist": {AUTHENTICATED: 5},
+    "admin_action": {AUTHENTICATED: 7},
+}
+
+
+class Changelist(WatchlistMixin, ListView):
+    model = Person
+    template_name = "changelist.html"
+
+
+class WatchlistView(WatchlistViewMixin, TemplateView):
+    template_name = "watchlist.html"
+
+
+def dummy_view(*_args, **_kwargs):
+    return HttpResponse()
+
+
+def buttons_view(request, annotated=False):
+    """Render a toggle button for each Person object."""
+    queryset = Person.objects.all()[:BUTTONS]
+    if annotated:
+        queryset = annotate_view_queryset(request, Person.objects.all())[:BUTTONS]
+        button = "{% toggle_button request obj url='/toggle/' on_watchlist=obj.on_watchlist %}"
+    else:
+        button = "{% toggle_button request obj url='/toggle/' %}"
+    template = engines["django"].from_string(
+        "{% load mizdb_watchlist %}{% for obj in objects %}" + button + "{% endfor %}"
+    )
+    return HttpResponse(template.render({"request": request, "objects": queryset}))
+
+
+class PersonAdmin(AdminWatchlistMixin, admin.ModelAdmin):
+    actions = [add_to_watchlist]
+
+
+site = admin.AdminSite(name="budget_admin")
+site.register(Watchlist, WatchlistAdmin)
+site.register(Person, PersonAdmin)
+
+
+class URLConf:
+    app_name = "test"
+    urlpatterns = [
+        path("person/", Changelist.as_view(), name="testapp_person_changelist"),
+        path("person/<int:pk>/change/", dummy_view, name="testapp_person_change"),
+        path("watchlist/", WatchlistView.as_view(), name="watchlist"),
+    ]
+
+
+urlpatterns = [
+    path("", include(URLConf)),
+    path("admin/", site.urls),
+    path("mizdb_watchlist/", include("mizdb_watchlist.urls")),
+    path("buttons/", buttons_view),
+    path("buttons/annotated/", buttons_view, {"annotated": True}),
+]
+
+pytestmark = [pytest.mark.django_db, pytest.mark.urls(__name__)]
+
+
+@pytest.fixture(params=[1, 10])
+def watchlist_size(request):
+    """The number of items on the watchlist."""
+    return request.param
+
+
+@pytest.fixture(params=[ANONYMOUS, AUTHENTICATED])
+def user_type(request):
+    return request.param
+
+
+@pytest.fixture
+def persons(person_factory):
+    return person_factory.create_batch(BUTTONS)
+
+
+@pytest.fixture
+def watched(client, user, user_type, persons, watchlist_size):
+    """Put the first `watchlist_size` persons on the watchlist of the client's user."""
+    objects = persons[:watchlist_size]
+    if user_type == AUTHENTICATED:
+        client.force_login(user)
+        content_type = ContentType.objects.get_for_model(Person)
+        Watchlist.objects.bulk_create(
+            [Watchlist(user=user, content_type=content_type, object_id=p.pk, object_repr=str(p)) for p in objects]
+        )
+    else:
+        session = client.session
+        time_added = timezone.now().isoformat()
+        session[WATCHLIST_SESSION_KEY] = {
+            "testapp.person": [{"object_id": p.pk, "object_repr": str(p), "time_added": time_added} for p in objects]
+        }
+        session.save()
+    return objects
+
+
+@pytest.fixture
+def assert_budget(user_type):
+    """Assert that the given request makes exactly the budgeted number of queries."""
+
+    def inner(name, request_func):
+        with CaptureQueriesContext(connection) as queries:
+            response = request_func()
+        assert response.status_code in (200, 302)
+        budget = BUDGETS[name][user_type]
+        assert len(queries) == budget, (
+            f"{name} ({user_type}) made {len(queries)} queries, the budget is {budget}:\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries)
+        )
+
+    return inner
+
+
+def test_toggle(client, watched, assert_budget):
+    data = {"object_id": watched[0].pk, "model_label": "testapp.person"}
+    assert_budget("toggle", lambda: client.post("/mizdb_watchlist/toggle/", data))
+
+
+def test_remove(client, watched, assert_budget):
+    data = {"object_id": watched[0].pk, "model_label": "testapp.person"}
+    assert_budget("remove", lambda: client.post("/mizdb_watchlist/remove/", data))
+
+
+def test_remove_all(client, watched, assert_budget):
+    assert_budget("remove_all", lambda: client.post("/mizdb_watchlist/remove_all/", {"model_label": "testapp.person"}))
+
+
+def test_overview(client, watched, assert_budget):
+    assert_budget("overview", lambda: client.get("/watchlist/"))
+
+
+def test_changelist(client, watched, assert_budget):
+    assert_budget("changelist", lambda: client.get("/person/"))
+
+
+def test_toggle_buttons_annotated(client, watched, assert_budget):
+    assert_budget("buttons_annotated", lambda: client.get("/buttons/annotated/"))
+
+
+def test_toggle_buttons(client, watched, assert_budget):
+    """Without annotations, every button looks up the status by itself."""
+    assert_budget("buttons", lambda: client.get("/buttons/"))
+
+
+@pytest.mark.parametrize("user_type", [AUTHENTICATED])
+def test_admin_overview(client, watched, assert_budget):
+    assert_budget("admin_overview", lambda: client.get("/admin/mizdb_watchlist/watchlist/_watchlist/"))
+
+
+@pytest.mark.parametrize("user_type", [AUTHENTICATED])
+def test_admin_changelist(client, watched, assert_budget):
+    assert_budget("admin_changelist", lambda: client.get("/admin/testapp/person/"))
+
+
+@pytest.mark.parametrize("user_type", [AUTHENTICATED])
+def test_admin_action(client, persons, watched, assert_budget):
+    data = {"action": "add_to_watchlist", "_selected_action": [p.pk for p in persons[:20]]}
+    assert_budget("admin_action", lambda: client.post("/admin/testapp/person/", data))
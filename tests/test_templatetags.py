@@ -1,9 +1,22 @@
+import re
 from unittest.mock import Mock, patch
 
 import pytest
-from django.urls import NoReverseMatch
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.template import Context, Template
+from django.urls import NoReverseMatch, include, path
 
-from mizdb_watchlist.templatetags.mizdb_watchlist import toggle_button
+from mizdb_watchlist.templatetags.mizdb_watchlist import (
+    PREFETCH_ATTR,
+    SPRITE_ATTR,
+    toggle_button,
+    watchlist_link,
+    watchlist_prefetch,
+)
+from tests.testapp.models import Company, Person
+
+urlpatterns = [path("watchlist/", include("mizdb_watchlist.urls"))]
 
 pytestmark = [pytest.mark.django_db]
 
@@ -15,6 +28,42 @@ def test_toggle_button(http_request, person):
     assert result["text"] == "foo"
     assert result["toggle_url"] == "bar"
     assert result["on_watchlist"]
+    assert not result["client_side"]
+
+
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_toggle_button_client_side(settings, http_request, person, user):
+    """
+    Assert that toggle_button flags the button as client-side if the watchlist
+    is stored by the client.
+    """
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+    result = toggle_button(http_request, person, url="bar", on_watchlist=False)
+    assert result["client_side"]
+
+
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_toggle_button_client_side_max_items(settings, http_request, person, user):
+    """
+    Assert that toggle_button passes the maximum number of items to the
+    client, which enforces it.
+    """
+    settings.MIZDB_WATCHLIST = {
+        "manager": {"session": "mizdb_watchlist.manager.ClientManager"},
+        "session_max_items": 5,
+    }
+    result = toggle_button(http_request, person, url="bar", on_watchlist=False)
+    assert result["max_items"] == 5
+
+
+def test_toggle_button_on_watchlist_given(http_request, person):
+    """
+    Assert that toggle_button does not create a manager if the 'on_watchlist'
+    parameter is given.
+    """
+    with patch("mizdb_watchlist.templatetags.mizdb_watchlist.get_manager") as get_manager_mock:
+        toggle_button(http_request, person, url="bar", on_watchlist=True)
+        get_manager_mock.assert_not_called()
 
 
 @patch("mizdb_watchlist.templatetags.mizdb_watchlist.reverse")
@@ -47,3 +96,176 @@ def test_toggle_button_no_reverse_match(http_request, person):
         reverse_mock.side_effect = NoReverseMatch()
         result = toggle_button(http_request, person, text="foo", url=None, on_watchlist=True)
         assert result["toggle_url"] == ""
+
+
+def test_watchlist_link(http_request):
+    result = watchlist_link({"request": http_request}, "foo", icon=False)
+    assert result == {"view_name": "foo", "icon": False, "count": False, "watchlist_count": None}
+
+
+def test_watchlist_link_count(http_request, fill_watchlist):
+    """Assert that watchlist_link includes the number of watchlist items."""
+    result = watchlist_link({"request": http_request}, "foo", count=True)
+    assert result["watchlist_count"] == 2
+
+
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_watchlist_link_count_does_not_modify_session(http_request):
+    """
+    Assert that reading the number of items of an empty session watchlist does
+    not modify the session.
+    """
+    http_request.session = SessionStore()
+    assert watchlist_link({"request": http_request}, "foo", count=True)["watchlist_count"] == 0
+    assert not http_request.session.modified
+
+
+@pytest.mark.urls("mizdb_watchlist.urls")
+def test_watchlist_link_renders_count(http_request, fill_watchlist):
+    template = Template("{% load mizdb_watchlist %}{% watchlist_link 'foo' count=True %}")
+    html = template.render(Context({"request": http_request}))
+    assert '<span class="watchlist-count">2</span>' in html
+
+
+def test_watchlist_prefetch(http_request, fill_watchlist, person_factory, book_factory):
+    """Assert that watchlist_prefetch stores the membership on the request."""
+    person, company = fill_watchlist
+    other_person, book = person_factory(), book_factory()
+    assert watchlist_prefetch({"request": http_request}, [person, other_person]) == ""
+    watchlist_prefetch({"request": http_request}, [company, book])
+    assert getattr(http_request, PREFETCH_ATTR) == {
+        (person._meta.label_lower, person.pk): True,
+        (other_person._meta.label_lower, other_person.pk): False,
+        (company._meta.label_lower, company.pk): True,
+        (book._meta.label_lower, book.pk): False,
+    }
+
+
+def test_watchlist_prefetch_request_argument(http_request, fill_watchlist):
+    """Assert that watchlist_prefetch uses the request passed in as argument."""
+    person, _company = fill_watchlist
+    watchlist_prefetch({}, [person], request=http_request)
+    assert getattr(http_request, PREFETCH_ATTR) == {(person._meta.label_lower, person.pk): True}
+
+
+def test_watchlist_prefetch_no_request(person):
+    """Assert that watchlist_prefetch does nothing if there is no request."""
+    assert watchlist_prefetch({}, [person]) == ""
+
+
+def test_toggle_button_uses_prefetched(http_request, person):
+    """Assert that toggle_button reads the prefetched membership."""
+    setattr(http_request, PREFETCH_ATTR, {(person._meta.label_lower, person.pk): True})
+    with patch("mizdb_watchlist.templatetags.mizdb_watchlist.get_manager") as get_manager_mock:
+        result = toggle_button(http_request, person, url="bar")
+        get_manager_mock.return_value.on_watchlist.assert_not_called()
+    assert result["on_watchlist"]
+
+
+@pytest.mark.urls("mizdb_watchlist.urls")
+def test_watchlist_prefetch_num_queries(
+    http_request, fill_watchlist, person_factory, company_factory, django_assert_num_queries
+):
+    """
+    Assert that the toggle buttons of a prefetched object list do not query the
+    database.
+    """
+    person_factory.create_batch(5)
+    company_factory.create_batch(5)
+    object_list = [*Person.objects.all(), *Company.objects.all()]
+    template = Template(
+        "{% load mizdb_watchlist %}{% watchlist_prefetch object_list %}"
+        "{% for obj in object_list %}{% toggle_button request obj url='/toggle/' %}{% endfor %}"
+    )
+    with django_assert_num_queries(1):
+        html = template.render(Context({"request": http_request, "object_list": object_list}))
+    assert html.count("on-watchlist") == 2
+
+
+def _normalize(html):
+    """Collapse the whitespace of the given button markup."""
+    return re.sub(r"\s+>", ">", " ".join(html.split()))
+
+
+@pytest.mark.urls(__name__)
+@pytest.mark.parametrize("on_watchlist", [True, False])
+@pytest.mark.parametrize("text, classes", [("", ""), ("<b>Watch</b>", "btn-sm")])
+def test_fast_toggle_button(http_request, person, on_watchlist, text, classes):
+    """Assert that fast_toggle_button renders the same markup as toggle_button."""
+    context = Context({"request": http_request, "obj": person, "on_watchlist": on_watchlist, "text": text})
+    args = f"request obj text=text on_watchlist=on_watchlist classes='{classes}'"
+    expected = Template("{% load mizdb_watchlist %}{% toggle_button " + args + " %}").render(context)
+    html = Template("{% load mizdb_watchlist %}{% fast_toggle_button " + args + " %}").render(context)
+    assert "/watchlist/toggle/" in html
+    assert _normalize(html) == _normalize(expected)
+
+
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_fast_toggle_button_client_side(settings, http_request, person, user):
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+    template = Template(
+        "{% load mizdb_watchlist %}{% fast_toggle_button request obj url='/toggle/' on_watchlist=False %}"
+    )
+    assert 'data-storage="client"' in template.render(Context({"request": http_request, "obj": person}))
+
+
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_fast_toggle_button_client_side_max_items(settings, http_request, person, user):
+    """Assert that fast_toggle_button renders the same markup as toggle_button."""
+    settings.MIZDB_WATCHLIST = {
+        "manager": {"session": "mizdb_watchlist.manager.ClientManager"},
+        "session_max_items": 5,
+    }
+    context = Context({"request": http_request, "obj": person})
+    args = "request obj url='/toggle/' on_watchlist=False"
+    expected = Template("{% load mizdb_watchlist %}{% toggle_button " + args + " %}").render(context)
+    html = Template("{% load mizdb_watchlist %}{% fast_toggle_button " + args + " %}").render(context)
+    assert 'data-max-items="5"' in html
+    assert _normalize(html) == _normalize(expected)
+
+
+@pytest.mark.urls("mizdb_watchlist.urls")  # not included under the 'watchlist' namespace
+def test_fast_toggle_button_no_reverse_match(http_request, person):
+    """Assert that fast_toggle_button renders nothing if there is no toggle URL."""
+    template = Template("{% load mizdb_watchlist %}{% fast_toggle_button request obj on_watchlist=True %}")
+    assert template.render(Context({"request": http_request, "obj": person})) == ""
+
+
+def test_fast_toggle_button_prefetched(http_request, fill_watchlist, django_assert_num_queries):
+    person, company = fill_watchlist
+    template = Template(
+        "{% load mizdb_watchlist %}{% watchlist_prefetch objects %}"
+        "{% for obj in objects %}{% fast_toggle_button request obj url='/toggle/' %}{% endfor %}"
+    )
+    with django_assert_num_queries(1):
+        html = template.render(Context({"request": http_request, "objects": [person, company]}))
+    assert html.count("on-watchlist") == 2
+
+
+def test_watchlist_icons(http_request):
+    """Assert that watchlist_icons renders the sprite only once per request."""
+    template = Template("{% load mizdb_watchlist %}{% watchlist_icons %}")
+    html = template.render(Context({"request": http_request}))
+    assert '<symbol id="mizdb-watchlist-bookmark"' in html
+    assert getattr(http_request, SPRITE_ATTR)
+    assert template.render(Context({"request": http_request})) == ""
+
+
+def test_watchlist_icons_no_request():
+    template = Template("{% load mizdb_watchlist %}{% watchlist_icons %}")
+    assert "<symbol" in template.render(Context())
+    assert "<symbol" in template.render(Context())
+
+
+@pytest.mark.parametrize("tag", ["toggle_button", "fast_toggle_button"])
+def test_toggle_button_icon_sprite(http_request, person, tag):
+    """
+    Assert that the toggle buttons reference the icon sprite if the sprite was
+    rendered before them.
+    """
+    context = Context({"request": http_request, "obj": person})
+    button = Template("{% load mizdb_watchlist %}{% " + tag + " request obj url='/toggle/' on_watchlist=True %}")
+    assert "<path" in button.render(context)
+    html = Template("{% load mizdb_watchlist %}{% watchlist_icons %}").render(context) + button.render(context)
+    assert html.count("<path") == 1  # only the path of the sprite's symbol
+    assert '<use href="#mizdb-watchlist-bookmark">' in html
@@ -1,28 +1,50 @@
 import json
+from datetime import timedelta
 from unittest.mock import Mock, patch
 
 import pytest
+from asgiref.sync import async_to_sync
 from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.models import Session
 from django.http import HttpResponse
 from django.urls import NoReverseMatch, include, path, reverse
+from django.utils import timezone
 from django.views import View
-from django.views.generic import ListView
+from django.views.generic import ListView, TemplateView
 
-from mizdb_watchlist.manager import ANNOTATION_FIELD
+from mizdb_watchlist.manager import ANNOTATION_FIELD, WATCHLIST_COOKIE_NAME, get_manager
+from mizdb_watchlist.models import Watchlist
 from mizdb_watchlist.views import (
+    ASYNC_VIEWS_SUPPORTED,
     WatchlistMixin,
     WatchlistViewMixin,
+    awatchlist_remove,
+    awatchlist_remove_all,
+    awatchlist_toggle,
     watchlist_remove,
     watchlist_remove_all,
     watchlist_toggle,
 )
-from tests.testapp.models import Company, Person
+from tests.testapp.models import Book, Company, Person
 
 
 class WatchlistView(WatchlistViewMixin, View):
     pass
 
 
+class CachedWatchlistView(WatchlistViewMixin, TemplateView):
+    template_name = "mizdb_watchlist/watchlist.html"
+    cache_watchlist_groups = True
+
+
+class ETagWatchlistView(WatchlistViewMixin, View):
+    watchlist_etag = True
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse("watchlist")
+
+
 def dummy_view(*_args):
     return HttpResponse("This is a dummy view for tests")
 
@@ -34,6 +56,7 @@ class URLConf:
     app_name = "test"  # Set the namespace for requests on these URLs
     urlpatterns = [
         path("watchlist/", WatchlistView.as_view(), name="watchlist"),
+        path("cached_watchlist/", CachedWatchlistView.as_view(), name="cached_watchlist"),
         path("person/<int:pk>/change/", dummy_view, name="testapp_person_change"),
         path("person/", dummy_view, name="testapp_person_changelist"),
     ]
@@ -44,9 +67,14 @@ urlpatterns = [
     path("", include(URLConf)),
     path("watchlist/", include("mizdb_watchlist.urls")),
 ]
+if ASYNC_VIEWS_SUPPORTED:
+    urlpatterns.append(path("async_watchlist/", include("mizdb_watchlist.async_urls", namespace="async_watchlist")))
 
 pytestmark = [pytest.mark.django_db, pytest.mark.urls(__name__)]
 
+requires_async_views = pytest.mark.skipif(not ASYNC_VIEWS_SUPPORTED, reason="the async views require Django 5.0+")
+ASYNC_SUMMARY = pytest.param("async_watchlist:summary", marks=requires_async_views)
+
 
 class TestWatchlistViewMixin:
     @pytest.fixture
@@ -84,7 +112,7 @@ class TestWatchlistViewMixin:
     def test_get_changelist_url_fails_silently(self, view, wsgi_request):
         assert view.get_changelist_url(wsgi_request, Company) == ""
 
-    def test_get_watchlist_calls_as_dict(self, view, mock_get_manager, wsgi_request):
+    def test_get_watchlist_calls_as_dict(self, view, wsgi_request, mock_get_manager):
         """Assert that get_watchlist calls manager.as_dict()."""
         as_dict_mock = Mock()
         mock_get_manager.return_value.as_dict = as_dict_mock
@@ -135,6 +163,178 @@ class TestWatchlistViewMixin:
         assert not context["watchlist"]
 
 
+@pytest.mark.usefixtures("login_user")
+class TestCachedWatchlistGroups:
+    @pytest.fixture
+    def get_model_items_mock(self):
+        """Mock get_model_items to record which model groups were built."""
+        with patch.object(
+            CachedWatchlistView,
+            "get_model_items",
+            autospec=True,
+            side_effect=CachedWatchlistView.get_model_items,
+        ) as m:
+            yield m
+
+    @pytest.fixture
+    def built_groups(self, get_model_items_mock):
+        """Return the labels of the model groups that were built since the last call."""
+
+        def inner():
+            labels = [call.args[3] for call in get_model_items_mock.call_args_list]
+            get_model_items_mock.reset_mock()
+            return labels
+
+        return inner
+
+    def test_groups_cached(self, client, fill_watchlist, person_label, built_groups):
+        url = reverse("test:cached_watchlist")
+        response = client.get(url)
+        assert sorted(built_groups()) == sorted([person_label, "testapp.company"])
+        cached_response = client.get(url)
+        assert not built_groups()
+        # Compare the watchlist HTML without the (masked) CSRF token:
+        html, cached_html = response.content.decode(), cached_response.content.decode()
+        assert cached_html[cached_html.index('<div id="watchlist">') :] == html[html.index('<div id="watchlist">') :]
+
+    def test_only_changed_group_rendered(
+        self, client, fill_watchlist, person_factory, add_to_watchlist, person_label, built_groups
+    ):
+        person, company = fill_watchlist
+        other = person_factory()
+        add_to_watchlist(other)
+        url = reverse("test:cached_watchlist")
+        client.get(url)
+        built_groups()
+
+        Watchlist.objects.filter(object_id=person.pk, content_type__model="person").delete()
+        response = client.get(url)
+        assert built_groups() == [person_label]
+        assert str(person) not in response.content.decode()
+        assert str(other) in response.content.decode()
+        assert str(company) in response.content.decode()
+
+    def test_cache_keys_differ_per_user(self, client, fill_watchlist, django_user_model, built_groups):
+        url = reverse("test:cached_watchlist")
+        client.get(url)
+        built_groups()
+        client.force_login(django_user_model.objects.create_user(username="other"))
+        response = client.get(url)
+        assert not built_groups()
+        assert str(fill_watchlist[0]) not in response.content.decode()
+
+    def test_empty_group_skipped(self, client, fill_watchlist, person_label, built_groups):
+        """
+        Assert that a model group without items is not included in the
+        overview, even if its items are built lazily.
+        """
+
+        def get_object_url(view, request, model, pk):
+            if model._meta.label_lower == person_label:
+                raise NoReverseMatch
+            return f"/{pk}/"
+
+        with patch.object(CachedWatchlistView, "get_object_url", get_object_url):
+            response = client.get(reverse("test:cached_watchlist"))
+        assert list(response.context["watchlist"]) == ["Company"]
+        assert built_groups() == ["testapp.company"]
+
+    def test_context_not_cached_by_default(self, http_request):
+        view = WatchlistView()
+        view.request = http_request
+        assert "watchlist_cache" not in view.get_watchlist_context(http_request)
+
+
+@pytest.mark.usefixtures("login_user")
+def test_overview_icon_sprite(client, fill_watchlist):
+    """Assert that the remove buttons of the overview reference the icon sprite."""
+    html = client.get(reverse("test:cached_watchlist")).content.decode()
+    assert html.count('<symbol id="mizdb-watchlist-x"') == 1
+    assert html.count('<use href="#mizdb-watchlist-x">') == 2
+    assert "<line" not in html.split("</svg>", 1)[1]
+
+
+@pytest.mark.usefixtures("add_session")
+class TestWatchlistETag:
+    @pytest.fixture
+    def view(self):
+        return ETagWatchlistView.as_view()
+
+    @pytest.fixture
+    def etag(self, view, http_request):
+        """Return the ETag of the response to an unconditional request."""
+        return view(http_request)["ETag"]
+
+    def test_sends_etag(self, view, http_request):
+        response = view(http_request)
+        assert response.status_code == 200
+        assert response["ETag"]
+        assert "no-cache" in response["Cache-Control"]
+
+    def test_not_modified(self, view, http_request, etag):
+        http_request.META["HTTP_IF_NONE_MATCH"] = etag
+        with patch.object(ETagWatchlistView, "get") as get_mock:
+            response = view(http_request)
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        get_mock.assert_not_called()
+
+    def test_modified(self, view, http_request, etag, person):
+        get_manager(http_request).add(person)
+        http_request.META["HTTP_IF_NONE_MATCH"] = etag
+        response = view(http_request)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_etag_depends_on_user(self, view, http_request, etag, django_user_model):
+        http_request.META["HTTP_IF_NONE_MATCH"] = etag
+        http_request.user = django_user_model.objects.create_user(username="other")
+        assert view(http_request).status_code == 200
+
+    def test_watchlist_etag_disabled(self, view, http_request):
+        with patch.object(ETagWatchlistView, "watchlist_etag", False):
+            response = view(http_request)
+        assert not response.has_header("ETag")
+        assert "no-store" in response["Cache-Control"]
+
+
+@pytest.mark.usefixtures("login_user")
+class TestWatchlistSummary:
+    @pytest.fixture(params=["watchlist:summary", ASYNC_SUMMARY])
+    def url(self, request):
+        return reverse(request.param)
+
+    def test_summary(self, client, url, fill_watchlist, person_label, company):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.json() == {person_label: 1, company._meta.label_lower: 1}
+        assert response["ETag"]
+
+    def test_summary_not_modified(self, client, url, fill_watchlist):
+        etag = client.get(url)["ETag"]
+        assert client.get(url, headers={"if-none-match": etag}).status_code == 304
+
+    def test_summary_modified(self, client, url, fill_watchlist, person_factory, add_to_watchlist):
+        etag = client.get(url)["ETag"]
+        add_to_watchlist(person_factory())
+        assert client.get(url, headers={"if-none-match": etag}).status_code == 200
+
+    def test_summary_post_not_allowed(self, client, url):
+        assert client.post(url).status_code == 405
+
+
+@pytest.mark.parametrize("url_name", ["watchlist:summary", ASYNC_SUMMARY])
+def test_summary_anonymous_does_not_save_session(client, url_name, settings):
+    """
+    Assert that a GET request of an anonymous user does not save the session
+    or set a session cookie.
+    """
+    response = client.get(reverse(url_name))
+    assert response.json() == {}
+    assert settings.SESSION_COOKIE_NAME not in response.cookies
+    assert not Session.objects.exists()
+
+
 @pytest.fixture
 def request_data(request, object_id, person_label):
     # Overwrites the default data for the http_request fixture.
@@ -154,6 +354,11 @@ class TestWatchlistToggle:
         assert response.status_code == 200
         assert json.loads(response.content)["on_watchlist"]
 
+    def test_watchlist_toggle_count(self, http_request, fill_watchlist):
+        """Assert that the response includes the number of watchlist items."""
+        response = watchlist_toggle(http_request)
+        assert json.loads(response.content)["count"] == 1
+
     def test_watchlist_toggle_already_on_watchlist(self, http_request, fill_watchlist):
         response = watchlist_toggle(http_request)
         assert response.status_code == 200
@@ -169,18 +374,93 @@ class TestWatchlistToggle:
         response = watchlist_toggle(http_request)
         assert response.status_code == 400
 
-    @pytest.mark.parametrize("person_label", ["foo.bar"])
+    @pytest.mark.parametrize("person_label", ["foo.bar", "foo"])
     def test_watchlist_toggle_unknown_model(self, http_request, person_label):
         response = watchlist_toggle(http_request)
         assert response.status_code == 200
         assert not json.loads(response.content)["on_watchlist"]
 
+    @pytest.mark.parametrize("person_label", ["auth.user"])
+    def test_watchlist_toggle_unwatchable_model(self, http_request, user, person_label, object_id):
+        """Assert that objects of models that are not watchable are not added."""
+        http_request.POST = http_request.POST.copy()
+        http_request.POST["object_id"] = user.pk
+        response = watchlist_toggle(http_request)
+        assert response.status_code == 200
+        assert not json.loads(response.content)["on_watchlist"]
+        assert not get_manager(http_request).as_dict()
+
     @pytest.mark.parametrize("object_id", [-1])
     def test_watchlist_toggle_object_does_not_exist(self, http_request, object_id):
         response = watchlist_toggle(http_request)
         assert response.status_code == 200
         assert not json.loads(response.content)["on_watchlist"]
 
+    @pytest.mark.parametrize("requested", ["true", "false"])
+    def test_watchlist_toggle_requested_state(self, http_request, person, on_watchlist_model, requested):
+        """
+        Assert that the toggle view applies the state requested with the
+        'on_watchlist' parameter, no matter how often it is requested.
+        """
+        http_request.POST = http_request.POST.copy()
+        http_request.POST["on_watchlist"] = requested
+        for _ in range(2):
+            response = watchlist_toggle(http_request)
+            assert json.loads(response.content)["on_watchlist"] == (requested == "true")
+            assert on_watchlist_model(person) == (requested == "true")
+
+    def test_watchlist_toggle_invalid_requested_state(self, http_request):
+        http_request.POST = http_request.POST.copy()
+        http_request.POST["on_watchlist"] = "foo"
+        assert watchlist_toggle(http_request).status_code == 400
+
+
+@pytest.mark.usefixtures("ignore_csrf_protection")
+@pytest.mark.parametrize("request_method", ["POST"])
+@pytest.mark.parametrize("user", [AnonymousUser()])
+def test_watchlist_toggle_client_manager_sets_cookie(settings, http_request, person_label, person, user):
+    """
+    Assert that the toggle view sends the updated watchlist cookie if the
+    watchlist is stored by the client.
+    """
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+    response = watchlist_toggle(http_request)
+    assert json.loads(response.content)["on_watchlist"]
+    assert response.cookies[WATCHLIST_COOKIE_NAME].value == f"{person_label}:{person.pk}"
+
+
+def test_overview_client_manager_sets_pruned_cookie(settings, client, person_label, person):
+    """
+    Assert that the overview sends the updated watchlist cookie if pruning
+    removed items of a watchlist that is stored by the client.
+    """
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+    client.cookies[WATCHLIST_COOKIE_NAME] = f"{person_label}:{person.pk}-0"
+    response = client.get(reverse("test:cached_watchlist"))
+    assert response.cookies[WATCHLIST_COOKIE_NAME].value == f"{person_label}:{person.pk}"
+
+
+@pytest.mark.parametrize("cookie", ["foo:1", "foo.bar:1", "testapp.person.foo:1"])
+def test_overview_client_manager_malformed_label(settings, client, person_label, person, cookie):
+    """Assert that the overview ignores cookie items with malformed model labels."""
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+    client.cookies[WATCHLIST_COOKIE_NAME] = f"{cookie}|{person_label}:{person.pk}"
+    response = client.get(reverse("test:cached_watchlist"))
+    assert response.status_code == 200
+    assert str(person) in response.content.decode()
+
+
+def test_overview_client_manager_unwatchable_model(settings, client, admin_user):
+    """
+    Assert that the overview does not list objects of models that are not
+    watchable, even if the watchlist cookie names them.
+    """
+    settings.MIZDB_WATCHLIST = {"manager": {"session": "mizdb_watchlist.manager.ClientManager"}}
+    client.cookies[WATCHLIST_COOKIE_NAME] = f"auth.user:{admin_user.pk}"
+    response = client.get(reverse("test:cached_watchlist"))
+    assert response.status_code == 200
+    assert admin_user.username not in response.content.decode()
+
 
 @pytest.mark.usefixtures("login_user", "ignore_csrf_protection")
 @pytest.mark.parametrize("request_method", ["POST"])
@@ -189,6 +469,10 @@ class TestWatchlistRemove:
         response = watchlist_remove(http_request)
         assert response.status_code == 200
 
+    def test_watchlist_remove_count(self, http_request, fill_watchlist):
+        response = watchlist_remove(http_request)
+        assert json.loads(response.content)["count"] == 1
+
     @pytest.mark.parametrize("request_data", [{}])
     def test_watchlist_remove_missing_parameters(self, http_request, request_data):
         response = watchlist_remove(http_request)
@@ -222,12 +506,58 @@ class TestWatchlistRemoveAll:
         response = watchlist_remove_all(http_request)
         assert response.status_code == 400
 
-    @pytest.mark.parametrize("person_label", ["foo.bar"])
+    @pytest.mark.parametrize("person_label", ["foo.bar", "foo"])
     def test_watchlist_remove_all_unknown_model(self, http_request, person_label):
         response = watchlist_remove_all(http_request)
         assert response.status_code == 400
 
 
+@pytest.mark.usefixtures("login_user", "ignore_csrf_protection")
+@pytest.mark.parametrize("request_method", ["POST"])
+@requires_async_views
+class TestAsyncViews:
+    def test_awatchlist_toggle(self, http_request, person, on_watchlist_model):
+        response = async_to_sync(awatchlist_toggle)(http_request)
+        assert response.status_code == 200
+        assert json.loads(response.content)["on_watchlist"]
+        assert json.loads(response.content)["count"] == 1
+        assert on_watchlist_model(person)
+
+    def test_awatchlist_toggle_already_on_watchlist(self, http_request, fill_watchlist, person, on_watchlist_model):
+        response = async_to_sync(awatchlist_toggle)(http_request)
+        assert not json.loads(response.content)["on_watchlist"]
+        assert not on_watchlist_model(person)
+
+    def test_awatchlist_toggle_requested_state(self, http_request, fill_watchlist, person, on_watchlist_model):
+        http_request.POST = http_request.POST.copy()
+        http_request.POST["on_watchlist"] = "true"
+        response = async_to_sync(awatchlist_toggle)(http_request)
+        assert json.loads(response.content)["on_watchlist"]
+        assert on_watchlist_model(person)
+
+    @pytest.mark.parametrize("object_id", [-1])
+    def test_awatchlist_toggle_object_does_not_exist(self, http_request, object_id):
+        response = async_to_sync(awatchlist_toggle)(http_request)
+        assert not json.loads(response.content)["on_watchlist"]
+
+    @pytest.mark.parametrize("request_data", [{}])
+    def test_async_views_missing_parameters(self, http_request, request_data):
+        for view in (awatchlist_toggle, awatchlist_remove, awatchlist_remove_all):
+            assert async_to_sync(view)(http_request).status_code == 400
+
+    def test_awatchlist_remove(self, http_request, fill_watchlist, person, on_watchlist_model):
+        response = async_to_sync(awatchlist_remove)(http_request)
+        assert response.status_code == 200
+        assert not on_watchlist_model(person)
+
+    def test_awatchlist_remove_all(self, http_request, fill_watchlist, person, company, on_watchlist_model):
+        response = async_to_sync(awatchlist_remove_all)(http_request)
+        assert response.status_code == 200
+        assert json.loads(response.content)["count"] == 1  # the company
+        assert not on_watchlist_model(person)
+        assert on_watchlist_model(company)
+
+
 @pytest.fixture
 def add_watchlist_annotations():
     return True
@@ -237,6 +567,10 @@ class DummyListView(WatchlistMixin, ListView):
     queryset = Person.objects.all()
 
 
+class DummyBookListView(WatchlistMixin, ListView):
+    queryset = Book.objects.all()
+
+
 class TestListViewMixin:
     @pytest.fixture
     def view(self, http_request, add_watchlist_annotations):
@@ -266,3 +600,39 @@ class TestListViewMixin:
         queryset = view.get_queryset()
         assert person_on_watchlist in queryset
         assert person_not_on_watchlist in queryset
+
+    def test_get_queryset_add_watchlist_added(self, view):
+        view.add_watchlist_added = True
+        assert "watchlist_added" in view.get_queryset().query.annotations
+
+    def test_get_queryset_watchlist_relations(self, http_request, book_factory, add_to_watchlist):
+        watched, other = book_factory(), book_factory()
+        add_to_watchlist(watched.author)
+        view = DummyBookListView()
+        view.request = http_request
+        view.watchlist_relations = ["author"]
+        queryset = view.get_queryset()
+        assert queryset.get(pk=watched.pk).author__on_watchlist
+        assert not queryset.get(pk=other.pk).author__on_watchlist
+
+    def test_get_queryset_watched_first(self, view, person_factory, add_to_watchlist, django_assert_num_queries):
+        person_factory(), person_factory()
+        watched = person_factory()
+        add_to_watchlist(watched)
+        view.watched_first = True
+        with django_assert_num_queries(1):
+            result = list(view.get_queryset())
+        assert result[0] == watched
+        # The default ordering of the queryset is applied after the watchlist ordering:
+        assert result[1:] == list(Person.objects.exclude(pk=watched.pk))
+
+    def test_get_queryset_order_by_watchlist_added(self, view, person_factory, add_to_watchlist, watchlist_model):
+        first, second, _third = person_factory(), person_factory(), person_factory()
+        add_to_watchlist(second)
+        add_to_watchlist(first)
+        # Make sure 'first' was added after 'second':
+        watchlist_model.objects.filter(object_id=first.pk).update(time_added=timezone.now() + timedelta(minutes=1))
+        view.order_by_watchlist_added = True
+        queryset = view.get_queryset()
+        assert "watchlist_added" in queryset.query.annotations
+        assert list(queryset)[:2] == [first, second]
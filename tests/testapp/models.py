@@ -14,8 +14,14 @@ class Person(models.Model):
         ordering = ["last_name", "first_name"]
 
 
+class PersonProxy(Person):
+    class Meta:
+        proxy = True
+
+
 class Company(models.Model):
     name = models.CharField(max_length=50)
+    parent = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True)
 
     class Meta:
         verbose_name = "Company"
@@ -24,3 +30,17 @@ class Company(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class Book(models.Model):
+    title = models.CharField(max_length=100)
+    author = models.ForeignKey(Person, on_delete=models.CASCADE)
+    publisher = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Book"
+        verbose_name_plural = "Books"
+        ordering = ["title"]
+
+    def __str__(self):
+        return self.title